@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Benchmark of import time with budget.
+
+Import time of statements is measured with `python -X importtime`
+in fresh interpreters: minimum over runs of cumulative time of
+top level imports, without imports done by interpreter startup.
+Exit status is 1 if any statement is over its budget, so script
+can be used in CI to catch regressions of import cost.
+
+$ python benchmarks/bench_import.py --runs 20 --scale 2
+
+"""
+
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+budgets = [
+    # statement, budget in milliseconds
+    ('import pyspaces', 10),
+    ('import pyspaces.cli', 25),
+    ('from pyspaces import setns', 25),
+    ('from pyspaces import Container', 80),
+]
+"""Budgets of import time on developer hardware"""
+
+
+def importtime(statement):
+    """Return cumulative import time of top level modules.
+
+    Args:
+      statement (str): python code
+
+    Return:
+      dict: module name and cumulative time in microseconds
+
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        stderr=subprocess.STDOUT, env=env,
+    ).decode()
+    result = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        # nested imports are indented
+        if not name[1:].startswith(' '):
+            result[name.strip()] = int(cumulative)
+    return result
+
+def measure(statement, runs=10):
+    """Return minimal import time of statement in milliseconds."""
+    startup = set(importtime('pass'))
+    best = None
+    for i in range(runs):
+        times = importtime(statement)
+        total = sum(v for k, v in times.items() if k not in startup)
+        best = total if best is None else min(best, total)
+    return best / 1e3
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=10,
+                        help='runs of every statement, default is 10')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiplier of budgets for slow hardware')
+    parser.add_argument('--output', help='write JSON into file')
+    args = parser.parse_args()
+
+    results = {}
+    failed = False
+    for statement, budget in budgets:
+        ms = measure(statement, args.runs)
+        budget *= args.scale
+        results[statement] = {'ms': ms, 'budget_ms': budget,
+                              'ok': ms <= budget}
+        failed = failed or ms > budget
+    data = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(data + '\n')
+    else:
+        print(data)
+    sys.exit(1 if failed else 0)
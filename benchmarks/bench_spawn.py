@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Benchmark of spawn, inject and setns latency.
+
+Measure start-to-exit latency and throughput of `Container`
+for every combination of namespaces from `args_aliases.na`,
+with and without uid_map and map_zero, of exec mode,
+of `Chroot`, `Inject`
+and `setns` context manager, and of `os.fork` and `subprocess`
+baselines. Results are written as JSON, so different versions
+of pyspaces can be compared on the same hardware.
+
+Combinations that can not be started by current user
+are reported with error instead of latency.
+
+$ python benchmarks/bench_spawn.py --count 200 --output spawn.json
+
+"""
+
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+from itertools import combinations
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pyspaces
+from pyspaces import Container, ContainerSpec, Chroot, Inject, setns
+from pyspaces.args_aliases import na
+from pyspaces.timing import clock, Histogram
+
+
+def summary(histogram, total):
+    """Return latency in milliseconds and throughput per second."""
+    result = {
+        'count': histogram.count,
+        'throughput_per_s': histogram.count / total if total else None,
+        'mean_ms': histogram.mean() * 1e3,
+        'min_ms': histogram.min / 1e3,
+        'max_ms': histogram.max / 1e3,
+    }
+    for p in (50, 90, 99):
+        result['p%d_ms' % p] = histogram.percentile(p) * 1e3
+    return result
+
+def measure(func, count, warmup=5):
+    """Call func count times after warmup.
+
+    Return:
+      dict: summary of latency or error
+
+    """
+    try:
+        for i in range(warmup):
+            func()
+        histogram = Histogram()
+        start = clock()
+        for i in range(count):
+            t = clock()
+            func()
+            histogram.record(clock() - t)
+        return summary(histogram, clock() - start)
+    except Exception as e:
+        return {'error': '%s: %s' % (type(e).__name__, e)}
+
+def join(process):
+    """Join process and check its exitcode."""
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError('exitcode %s' % process.exitcode)
+
+def spawn_cases():
+    """Yield name and kwargs of Container for every combination.
+
+    Mappings are only combined with user namespace.
+
+    """
+    for r in range(len(na) + 1):
+        for names in combinations(na, r):
+            kwargs = dict((na[ns]['aliases'][1], True) for ns in names)
+            name = '+'.join(names) or 'none'
+            yield name, kwargs
+            if 'user' in names:
+                yield name + '/uid_map', dict(kwargs, uid_map=True)
+                yield name + '/map_zero', dict(kwargs, map_zero=True)
+
+def bench_spawn(count, only=None):
+    """Latency of Container start and join for every case."""
+    result = {}
+    for name, kwargs in spawn_cases():
+        if only and name not in only:
+            continue
+        result[name] = measure(lambda: join(
+            Container(target=os._exit, args=(0,), **kwargs)), count)
+    return result
+
+def bench_exec(count):
+    """Latency of executing true with os.execvp target and exec_argv."""
+    return {
+        'target os.execvp': measure(lambda: join(
+            Container(target=os.execvp, args=('true', ['true']))), count),
+        'exec_argv': measure(lambda: join(
+            Container(exec_argv=['true'])), count),
+        'exec_argv user+uts/map_zero': measure(lambda: join(
+            Container(exec_argv=['true'], newuser=True, newuts=True,
+                      map_zero=True)), count),
+    }
+
+def bench_spec(count):
+    """Time of creation of not started containers in microseconds."""
+    count *= 100
+    kwargs = dict(newuser=True, newuts=True, newnet=True, map_zero=True)
+    spec = ContainerSpec(**kwargs)
+    start = clock()
+    for i in range(count):
+        Container(target=os._exit, args=(0,), **kwargs)
+    init = (clock() - start) / count * 1e6
+    start = clock()
+    for i in range(count):
+        spec.spawn(os._exit, (0,))
+    spawn = (clock() - start) / count * 1e6
+    return {'Container.__init__': init, 'ContainerSpec.spawn': spawn}
+
+def bench_chroot(count, rootfs='/'):
+    """Latency of Chroot start and join."""
+    return measure(lambda: join(
+        Chroot(rootfs, target=os._exit, args=(0,), map_zero=True)), count)
+
+def bench_inject(count):
+    """Latency of Inject start and join for every namespace."""
+    result = {}
+    # namespaces of target are owned by new user namespace,
+    # so current user can enter them
+    target = Container(target=time.sleep, args=(3600,), all=True, map_zero=True)
+    target.start()
+    try:
+        for ns in na:
+            kwargs = {ns: True}
+            if ns != 'user':
+                kwargs['user'] = True
+            result['+'.join(sorted(kwargs))] = measure(lambda: join(
+                Inject(target.pid, os._exit, (0,), **kwargs)), count)
+    finally:
+        target.kill()
+        target.join()
+    return result
+
+def enter(pid, ns):
+    """Enter namespace of pid and restore current one."""
+    with setns(pid, 0, '/proc', ns):
+        pass
+
+def bench_setns(count):
+    """Latency of entering and leaving namespaces with setns.
+
+    Measured in forked child: user namespace of parent
+    can not be entered again from child user namespace.
+
+    """
+    result = {}
+    target = Container(target=time.sleep, args=(3600,), all=True, map_zero=True)
+    target.start()
+    try:
+        for ns in na:
+            if ns == 'user':
+                continue
+            r, w = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(r)
+                data = measure(lambda: enter(target.pid, ns), count)
+                os.write(w, json.dumps(data).encode())
+                os._exit(0)
+            os.close(w)
+            data = b''
+            chunk = os.read(r, 65536)
+            while chunk:
+                data += chunk
+                chunk = os.read(r, 65536)
+            os.close(r)
+            os.waitpid(pid, 0)
+            result[ns] = json.loads(data.decode())
+    finally:
+        target.kill()
+        target.join()
+    return result
+
+def bench_baselines(count):
+    """Latency of os.fork and subprocess."""
+    def fork():
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0)
+        os.waitpid(pid, 0)
+    return {
+        'os.fork': measure(fork, count),
+        'subprocess true': measure(
+            lambda: subprocess.check_call(['true']), count),
+        'subprocess python': measure(
+            lambda: subprocess.check_call([sys.executable, '-S', '-c', '']),
+            max(count // 10, 1)),
+    }
+
+def environment():
+    """Describe pyspaces version and hardware."""
+    return {
+        'pyspaces': pyspaces.__version__,
+        'python': platform.python_version(),
+        'kernel': platform.release(),
+        'machine': platform.machine(),
+        'cpus': os.sysconf('SC_NPROCESSORS_ONLN'),
+        'uid': os.getuid(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--count', type=int, default=100,
+                        help='iterations of every case, default is 100')
+    parser.add_argument('--only', action='append',
+                        help='measure only this spawn case, e.g. user+uts')
+    parser.add_argument('--rootfs', default='/',
+                        help='root for Chroot, default is /')
+    parser.add_argument('--output', help='write JSON into file')
+    args = parser.parse_args()
+
+    results = {
+        'environment': environment(),
+        'count': args.count,
+        'spawn': bench_spawn(args.count, args.only),
+        'exec': bench_exec(args.count),
+        'create_us': bench_spec(args.count),
+        'chroot': bench_chroot(args.count, args.rootfs),
+        'inject': bench_inject(args.count),
+        'setns': bench_setns(args.count),
+        'baselines': bench_baselines(args.count),
+    }
+    data = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(data + '\n')
+    else:
+        print(data)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Benchmark of stacks for cloned children.
+
+Compare zeroed `create_string_buffer` stacks, which were used
+by `cloning.Clone` before, with mmap stacks from `StackPool`:
+time of allocation, RSS of allocated stacks and latency of
+container start and join.
+
+$ python benchmarks/bench_stack.py
+
+"""
+
+
+import os
+import sys
+import json
+import time
+from ctypes import create_string_buffer
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pyspaces import cloning, Container
+
+
+def rss():
+    """Return resident set size of current process in bytes."""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+def bench_alloc(count=1000):
+    """Time of allocation of one stack in microseconds."""
+    start = time.time()
+    for i in range(count):
+        create_string_buffer(cloning.STACK_SIZE)
+    buffers = (time.time() - start) / count * 1e6
+    pool = cloning.StackPool()
+    start = time.time()
+    for i in range(count):
+        pool.release(pool.acquire())
+    pooled = (time.time() - start) / count * 1e6
+    pool.clear()
+    return {'create_string_buffer': buffers, 'StackPool': pooled}
+
+def bench_rss(count=100):
+    """RSS of count allocated stacks in bytes."""
+    before = rss()
+    buffers = [create_string_buffer(cloning.STACK_SIZE) for i in range(count)]
+    buffers_rss = rss() - before
+    del buffers
+    before = rss()
+    stacks = [cloning.Stack() for i in range(count)]
+    stacks_rss = rss() - before
+    del stacks
+    return {'create_string_buffer': buffers_rss, 'StackPool': stacks_rss}
+
+def bench_container(count=200):
+    """Latency of container start and join in milliseconds."""
+    result = {}
+    for name, limit in (('no reuse', 0), ('StackPool', 64)):
+        cloning.stacks = cloning.StackPool(limit)
+        start = time.time()
+        for i in range(count):
+            c = Container(target=os._exit, args=(0,))
+            c.start()
+            c.join()
+        result[name] = (time.time() - start) / count * 1e3
+        cloning.stacks.clear()
+    return result
+
+
+if __name__ == '__main__':
+    print(json.dumps({
+        'alloc_us': bench_alloc(),
+        'rss_bytes': bench_rss(),
+        'container_ms': bench_container(),
+    }, indent=2, sort_keys=True))
@@ -19,8 +19,75 @@ __email__ = "filipp.s.frizzy@gmail.com"
 __status__ = "Development"
 __version__ = '1.4'
 
-__all__ = ["cloning", "process", "libc", "cli", "setns", "args_aliases"]
+__all__ = ["cloning", "process", "libc", "cli", "setns", "args_aliases",
+           "pool", "aio", "launch", "idmap", "timing", "spawn", "spec",
+           "netlink", "mount", "cgroup", "sched", "capture",
+           "result", "registry", "reaper"]
 
 
-from .process import Container, Chroot, Inject
-from .setns import setns
\ No newline at end of file
+import sys
+
+# public names and their modules, imported on first access:
+# process imports multiprocessing and cloning, that is most
+# of the import time of pyspaces
+_lazy = {
+    'Container': 'process',
+    'Chroot': 'process',
+    'Inject': 'process',
+    'InjectWorker': 'process',
+    'setns': 'setns',
+    'ContainerPool': 'pool',
+    'NamespacePool': 'pool',
+    'launch_many': 'launch',
+    'ilaunch_many': 'launch',
+    'IdAllocator': 'idmap',
+    'histograms': 'timing',
+    'run': 'spawn',
+    'ContainerSpec': 'spec',
+    'RtNetlink': 'netlink',
+    'NamespaceRegistry': 'registry',
+}
+
+if sys.version_info >= (3, 5):
+    from types import ModuleType
+
+    def import_module(name, package):
+        """Import submodule without importing importlib."""
+        return __import__(package + name, fromlist=['__name__'])
+
+    class _Package(ModuleType):
+        """Module of package with lazily imported names."""
+        def __getattr__(self, name):
+            module = _lazy.get(name)
+            if module is None:
+                raise AttributeError("module %r has no attribute %r" %
+                                     (self.__name__, name))
+            value = getattr(import_module('.' + module, self.__name__), name)
+            self.__dict__[name] = value
+            return value
+
+        def __dir__(self):
+            return sorted(set(self.__dict__) | set(_lazy))
+
+        # import of submodule setns sets it as attribute of package,
+        # but pyspaces.setns has always been the function
+        @property
+        def setns(self):
+            return import_module('.setns', self.__name__).setns
+
+        @setns.setter
+        def setns(self, value):
+            pass
+
+    sys.modules[__name__].__class__ = _Package
+else:
+    from .process import Container, Chroot, Inject, InjectWorker
+    from .setns import setns
+    from .pool import ContainerPool, NamespacePool
+    from .launch import launch_many, ilaunch_many
+    from .idmap import IdAllocator
+    from .timing import histograms
+    from .spawn import run
+    from .spec import ContainerSpec
+    from .netlink import RtNetlink
+    from .registry import NamespaceRegistry
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""This is part of [pyspaces](https://github.com/Friz-zy/pyspaces)
+
+License: MIT or BSD or Apache 2.0
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Helpers for asyncio: exit of process is watched by event loop
+through its pidfd or, if kernel or python doesn't support
+pidfd, through SIGCHLD handler, without thread per process.
+
+Imported lazily by `Container` and `Inject` methods.
+
+"""
+
+
+import os
+import signal
+import asyncio
+from weakref import WeakKeyDictionary
+
+
+_watchers = WeakKeyDictionary()
+_previous = WeakKeyDictionary()
+
+
+def get_pidfd(process):
+    """Return pidfd of started process.
+
+    Use pidfd created by clone if any,
+    else open new one with os.pidfd_open.
+
+    Args:
+      process (Process): started process
+
+    Return:
+      tuple: pidfd or None and True if pidfd
+        was opened and should be closed
+
+    """
+    pidfd = getattr(process._popen, 'pidfd', None)
+    if pidfd is not None:
+        return pidfd, False
+    try:
+        return os.pidfd_open(process.pid), True
+    except (AttributeError, OSError):
+        return None, False
+
+def add_sigchld_watcher(loop, check):
+    """Execute check on SIGCHLD.
+
+    Handler is set on first watcher of loop, previous
+    handler of SIGCHLD set by signal.signal is called
+    after watchers. Handler set by add_signal_handler
+    of event loop can not be chained, other callbacks
+    should be added as watchers instead.
+
+    Args:
+      loop (AbstractEventLoop): event loop
+      check (callable): callback without arguments
+
+    Raises:
+      RuntimeError: SIGCHLD is handled by event loop
+
+    """
+    checks = _watchers.get(loop)
+    if checks is None:
+        handler = signal.getsignal(signal.SIGCHLD)
+        module = getattr(handler, '__module__', None) or ''
+        if module.split('.')[0] == 'asyncio':
+            raise RuntimeError('SIGCHLD is handled by event loop')
+        checks = _watchers[loop] = set()
+        def on_sigchld():
+            for c in list(checks):
+                c()
+            if callable(handler):
+                handler(signal.SIGCHLD, None)
+        loop.add_signal_handler(signal.SIGCHLD, on_sigchld)
+        _previous[loop] = handler
+    checks.add(check)
+
+def remove_sigchld_watcher(loop, check):
+    """Stop executing check on SIGCHLD.
+
+    Previous handler of SIGCHLD is restored
+    when no watchers of loop remain.
+
+    Args:
+      loop (AbstractEventLoop): event loop
+      check (callable): callback without arguments
+
+    """
+    checks = _watchers.get(loop)
+    if checks is None:
+        return
+    checks.discard(check)
+    if checks:
+        return
+    del _watchers[loop]
+    handler = _previous.pop(loop)
+    if loop.is_closed():
+        return
+    loop.remove_signal_handler(signal.SIGCHLD)
+    if handler is not None:
+        signal.signal(signal.SIGCHLD, handler)
+
+def start(process, loop=None):
+    """Start process and return future resolved with it.
+
+    Clone waits only for updating of UID and GID maps,
+    so process is started synchronously.
+
+    Args:
+      process (Process): process for starting
+      loop (AbstractEventLoop): event loop,
+        default is asyncio.get_event_loop()
+
+    Return:
+      Future: future resolved with process
+
+    """
+    loop = loop or asyncio.get_event_loop()
+    future = loop.create_future()
+    try:
+        process.start()
+    except Exception as e:
+        future.set_exception(e)
+    else:
+        future.set_result(process)
+    return future
+
+def wait(process, loop=None):
+    """Return future resolved with exitcode of process.
+
+    Cancellation of future kills the process,
+    it will be reaped by event loop later.
+    All calls for one process return the same future.
+
+    Args:
+      process (Process): started process
+      loop (AbstractEventLoop): event loop,
+        default is asyncio.get_event_loop()
+
+    Return:
+      Future: future resolved with exitcode
+
+    """
+    loop = loop or asyncio.get_event_loop()
+    future = getattr(process, '_exit_future', None)
+    if future is not None:
+        return future
+    future = loop.create_future()
+    if process.exitcode is not None:
+        future.set_result(process.exitcode)
+        process._exit_future = future
+        return future
+
+    pidfd, owned = get_pidfd(process)
+    if pidfd is not None:
+        def stop():
+            loop.remove_reader(pidfd)
+            if owned:
+                os.close(pidfd)
+    else:
+        def stop():
+            remove_sigchld_watcher(loop, check)
+
+    def check():
+        exitcode = process.exitcode
+        if exitcode is None:
+            return
+        stop()
+        if not future.done():
+            future.set_result(exitcode)
+
+    def kill(future):
+        if future.cancelled():
+            process.kill()
+
+    if pidfd is not None:
+        loop.add_reader(pidfd, check)
+    else:
+        add_sigchld_watcher(loop, check)
+        # process could exit before handler was set
+        loop.call_soon(check)
+    future.add_done_callback(kill)
+    process._exit_future = future
+    return future
+
+def aexit(process, exc_type=None, loop=None):
+    """Wait for process on exit from `async with` block.
+
+    Process is killed if block raised exception
+    or if returned future is cancelled.
+
+    Args:
+      process (Process): started process
+      exc_type (type): type of raised exception or None
+      loop (AbstractEventLoop): event loop,
+        default is asyncio.get_event_loop()
+
+    Return:
+      Future: future resolved with False
+
+    """
+    loop = loop or asyncio.get_event_loop()
+    if exc_type is not None and process.exitcode is None:
+        process.kill()
+    exit_future = wait(process, loop)
+    future = loop.create_future()
+    def done(exit_future):
+        if future.done():
+            return
+        if exit_future.cancelled():
+            future.cancel()
+        else:
+            future.set_result(False)
+    def cancel(future):
+        if future.cancelled():
+            exit_future.cancel()
+    exit_future.add_done_callback(done)
+    future.add_done_callback(cancel)
+    return future
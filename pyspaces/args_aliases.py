@@ -8,7 +8,7 @@ Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
 """
 
 
-from . import cloning as cl 
+from . import flags as cl
 from collections import OrderedDict
 
 
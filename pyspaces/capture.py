@@ -0,0 +1,634 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""This is part of [pyspaces](https://github.com/Friz-zy/pyspaces)
+
+License: MIT or BSD or Apache 2.0
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Capture of stdout and stderr of containers: one thread of
+the parent drains pipes of all containers with epoll into
+bounded ring buffers, so memory does not depend on output,
+or moves them into files and sockets with splice(2).
+
+    c = Container(target=f, capture=True)
+    c.start()
+    for line in c.capture.stdout:
+        print(line)
+
+    c = Container(target=f, forward=Forward('/var/log/f.log', 2 ** 20))
+
+"""
+
+
+import os
+import errno
+import select
+import threading
+from functools import partial
+from weakref import WeakValueDictionary
+from .libc import libc, get_errno, c_ssize_t
+from .timing import clock
+
+SPLICE_F_MOVE = 1
+SPLICE_F_NONBLOCK = 2
+
+splice = libc.splice
+splice.restype = c_ssize_t
+
+CHUNK = 65536
+"""Maximal size of one read from pipe"""
+
+overflows = ('oldest', 'newest', 'pause')
+"""Overflow policies: drop oldest data, drop new data
+or stop reading pipe until buffer is drained"""
+
+
+def wait_for(cond, predicate, timeout=None):
+    """Wait on held condition until predicate is true.
+
+    Return:
+      bool: value of predicate
+
+    """
+    deadline = None if timeout is None else clock() + timeout
+    while not predicate():
+        if deadline is None:
+            cond.wait()
+        else:
+            left = deadline - clock()
+            if left <= 0:
+                break
+            cond.wait(left)
+    return predicate()
+
+
+
+class Stream(object):
+    """Bounded ring buffer of one output of container."""
+    def __init__(self, name, size=CHUNK, overflow='oldest',
+                 on_chunk=None, on_line=None):
+        """Set size and consumers of stream.
+
+        Args:
+          name (str): 'stdout' or 'stderr'
+          size (int): size of buffer in bytes,
+            default is CHUNK
+          overflow (str): 'oldest', 'newest' or 'pause',
+            see overflows, default is 'oldest'
+          on_chunk (callable): function called by reader
+            thread with stream and data instead of buffering
+          on_line (callable): function called by reader
+            thread with stream and every line instead of
+            buffering, lines longer than size are split
+
+        Raises:
+          ValueError: unknown overflow policy
+
+        """
+        if overflow not in overflows:
+            raise ValueError('Unknown overflow policy: %s' % overflow)
+        self.name = name
+        self.size = size
+        self.overflow = overflow
+        self.on_chunk = on_chunk
+        self.on_line = on_line
+        self.buffer = bytearray()
+        self.partial = bytearray()
+        self.dropped = 0
+        self.total = 0
+        self.eof = False
+        self.paused = False
+        self.resume = None
+        self._cond = threading.Condition(threading.Lock())
+
+    def __repr__(self):
+        return '<Stream %s %d/%d bytes dropped=%d%s>' % (
+            self.name, len(self.buffer), self.size, self.dropped,
+            ' eof' if self.eof else '')
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def __iter__(self):
+        return self.lines()
+
+    def attach(self):
+        """Count pipe of child, nothing to do for buffer."""
+        pass
+
+    def pump(self, fd):
+        """Read ready pipe, called by reader thread.
+
+        Return:
+          bool: None at EOF, False if pipe should
+            not be read until buffer is drained
+
+        """
+        try:
+            data = os.read(fd, CHUNK)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return True
+            data = b''
+        if not data:
+            return None
+        return self.feed(data)
+
+    def feed(self, data):
+        """Add data read from pipe.
+
+        Called by reader thread.
+
+        Return:
+          bool: False if pipe should not
+            be read until buffer is drained
+
+        """
+        self.total += len(data)
+        if self.on_chunk is not None:
+            self.on_chunk(self, data)
+        if self.on_line is not None:
+            self.split(data)
+        if self.on_chunk is not None or self.on_line is not None:
+            return True
+        with self._cond:
+            free = self.size - len(self.buffer)
+            if len(data) > free:
+                if self.overflow == 'oldest':
+                    drop = min(len(data) - free, len(self.buffer))
+                    del self.buffer[:drop]
+                    self.dropped += drop
+                    if len(data) > self.size:
+                        self.dropped += len(data) - self.size
+                        data = data[-self.size:]
+                elif self.overflow == 'newest':
+                    self.dropped += len(data) - free
+                    data = data[:free]
+            self.buffer += data
+            self._cond.notify_all()
+            if self.overflow == 'pause' and len(self.buffer) >= self.size:
+                self.paused = True
+                return False
+        return True
+
+    def split(self, data):
+        """Pass complete lines of data to on_line."""
+        self.partial += data
+        while True:
+            end = self.partial.find(b'\n', 0, self.size) + 1
+            if not end:
+                if len(self.partial) < self.size:
+                    break
+                end = self.size
+            line = bytes(self.partial[:end])
+            del self.partial[:end]
+            self.on_line(self, line)
+
+    def close(self):
+        """Mark end of stream, called by reader thread."""
+        if self.on_line is not None and self.partial:
+            self.on_line(self, bytes(self.partial))
+            del self.partial[:]
+        with self._cond:
+            self.eof = True
+            self._cond.notify_all()
+
+    def take(self, end):
+        """Remove and return first bytes of buffer, lock is held."""
+        data = bytes(self.buffer[:end])
+        del self.buffer[:end]
+        if self.paused and len(self.buffer) < self.size:
+            self.paused = False
+            if self.resume is not None:
+                self.resume()
+        return data
+
+    def read(self, n=-1, timeout=None):
+        """Return buffered data.
+
+        Args:
+          n (int): maximal size, default is -1: all
+          timeout (float): seconds to wait for data,
+            default is None: until data or end of stream
+
+        Return:
+          bytes: data, b'' at the end of stream
+            or on timeout
+
+        """
+        with self._cond:
+            if not self.buffer and not self.eof:
+                self._cond.wait(timeout)
+            return self.take(len(self.buffer) if n < 0 else n)
+
+    def readline(self, timeout=None):
+        """Return next line.
+
+        Line longer than size of buffer is returned
+        in parts, last line may be without newline.
+
+        Args:
+          timeout (float): seconds to wait for line,
+            default is None: until line or end of stream
+
+        Return:
+          bytes: line, b'' at the end of stream
+            or on timeout
+
+        """
+        with self._cond:
+            while True:
+                end = self.buffer.find(b'\n') + 1
+                if end:
+                    return self.take(end)
+                if self.eof or len(self.buffer) >= self.size:
+                    return self.take(len(self.buffer))
+                if not self._cond.wait(timeout) and timeout is not None:
+                    return b''
+
+    def lines(self):
+        """Iterate over lines until the end of stream."""
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+    def chunks(self):
+        """Iterate over chunks until the end of stream."""
+        while True:
+            data = self.read()
+            if not data:
+                return
+            yield data
+
+    def wait(self, timeout=None):
+        """Wait for the end of stream.
+
+        Return:
+          bool: True if stream is closed
+
+        """
+        with self._cond:
+            return wait_for(self._cond, lambda: self.eof, timeout)
+
+
+class Reader(object):
+    """Thread that drains pipes of many containers with epoll."""
+    def __init__(self):
+        self.epoll = select.epoll()
+        self.streams = {}
+        self.thread = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.streams)
+
+    def register(self, fd, stream):
+        """Read pipe into stream until EOF.
+
+        Descriptor is closed by reader at EOF.
+
+        Args:
+          fd (int): read end of pipe
+          stream (Stream, Forward): consumer of the pipe,
+            attached to it before
+
+        """
+        stream.resume = partial(self.resume, fd)
+        with self._lock:
+            self.streams[fd] = stream
+            self.epoll.register(fd, select.EPOLLIN)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run,
+                                               name='pyspaces-capture')
+                self.thread.daemon = True
+                self.thread.start()
+
+    def resume(self, fd):
+        """Read paused pipe again."""
+        with self._lock:
+            if fd in self.streams:
+                self.epoll.modify(fd, select.EPOLLIN)
+
+    def drop(self, fd):
+        """Stop reading pipe and close it."""
+        with self._lock:
+            stream = self.streams.pop(fd, None)
+            if stream is None:
+                return
+            self.epoll.unregister(fd)
+            os.close(fd)
+        stream.close()
+
+    def run(self):
+        """Main loop of reader thread."""
+        while True:
+            try:
+                events = self.epoll.poll()
+            except (IOError, OSError) as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            for fd, event in events:
+                stream = self.streams.get(fd)
+                if stream is None:
+                    continue
+                result = stream.pump(fd)
+                if result is None:
+                    self.drop(fd)
+                elif not result:
+                    with self._lock:
+                        if fd in self.streams:
+                            # stream resumes reading when drained
+                            self.epoll.modify(fd, 0)
+                            if not stream.paused:
+                                self.epoll.modify(fd, select.EPOLLIN)
+
+
+readers = {}
+"""Readers of all containers, started on first use"""
+
+def get_reader(name='capture'):
+    """Return global reader.
+
+    Args:
+      name (str): 'capture' for buffers or 'forward'
+        for forwarding, so slow destination does not
+        stall buffers, default is 'capture'
+
+    """
+    reader = readers.get(name)
+    if reader is None:
+        reader = readers.setdefault(name, Reader())
+    return reader
+
+
+class Forward(object):
+    """Forwarding of output to file or socket with splice(2).
+
+    Data is moved from pipe to destination in kernel without
+    copying through python. File is rotated by size, several
+    pipes can be forwarded into one destination. File is
+    opened without O_APPEND, so containers writing into
+    one file should share its Forward, see `get_forward`.
+
+    """
+    def __init__(self, dest, max_bytes=None, backups=1):
+        """Set destination.
+
+        Args:
+          dest (str, int, fo): path of file, file descriptor
+            or object with fileno like socket, should be
+            blocking, descriptors are not closed
+          max_bytes (int): rotate file when it exceeds
+            size, default is None: no rotation
+          backups (int): number of rotated files
+            dest.1, dest.2 and so on, 0 truncates
+            file, default is 1
+
+        Raises:
+          ValueError: rotation of descriptor
+
+        """
+        self.path = dest if isinstance(dest, str) else None
+        if max_bytes and self.path is None:
+            raise ValueError('Only file given by path can be rotated')
+        self.dest = dest
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.fd = None
+        self.size = 0
+        self.bytes = 0
+        self.rotations = 0
+        self.copied = 0
+        self.sources = 0
+        self.eof = False
+        self.resume = None
+        self._cond = threading.Condition(threading.Lock())
+
+    def __repr__(self):
+        return '<Forward %s bytes=%d rotations=%d>' % (
+            self.path or self.dest, self.bytes, self.rotations)
+
+    def open(self):
+        """Open destination file if it is not open."""
+        if self.fd is not None:
+            return
+        if self.path is None:
+            fd = self.dest
+            self.fd = fd if isinstance(fd, int) else fd.fileno()
+            return
+        # splice(2) does not support files opened with O_APPEND
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_CREAT, 0o666)
+        self.size = os.lseek(self.fd, 0, os.SEEK_END)
+
+    def attach(self):
+        """Count pipe of child and open destination.
+
+        Raises:
+          OSError: file can not be opened
+
+        """
+        with self._cond:
+            self.sources += 1
+            self.eof = False
+            self.open()
+
+    def rotate(self):
+        """Move file to backup and open new one."""
+        os.close(self.fd)
+        self.fd = None
+        if self.backups:
+            for i in range(self.backups - 1, 0, -1):
+                old = '%s.%d' % (self.path, i)
+                if os.path.exists(old):
+                    os.rename(old, '%s.%d' % (self.path, i + 1))
+            os.rename(self.path, self.path + '.1')
+        else:
+            os.unlink(self.path)
+        self.open()
+        self.rotations += 1
+
+    def pump(self, fd):
+        """Move ready data from pipe, called by reader thread.
+
+        Return:
+          bool: None at EOF, True otherwise
+
+        """
+        if self.max_bytes and self.size >= self.max_bytes:
+            self.rotate()
+        length = CHUNK
+        if self.max_bytes:
+            length = min(length, max(self.max_bytes - self.size, 1))
+        n = splice(fd, None, self.fd, None, length,
+                   SPLICE_F_MOVE | SPLICE_F_NONBLOCK)
+        if n < 0:
+            e = get_errno()
+            if e in (errno.EAGAIN, errno.EINTR):
+                return True
+            if e != errno.EINVAL:
+                return None
+            # destination does not support splice
+            data = os.read(fd, length)
+            n = len(data)
+            while data:
+                data = data[os.write(self.fd, data):]
+            self.copied += n
+        if n == 0:
+            return None
+        self.size += n
+        self.bytes += n
+        return True
+
+    def close(self):
+        """Close destination after the last pipe."""
+        with self._cond:
+            self.sources = max(self.sources - 1, 0)
+            if self.sources > 0:
+                return
+            if self.path is not None and self.fd is not None:
+                os.close(self.fd)
+            self.fd = None
+            self.eof = True
+            self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        """Wait for the end of all pipes.
+
+        Return:
+          bool: True if all pipes are closed
+
+        """
+        with self._cond:
+            return wait_for(self._cond, lambda: self.eof, timeout)
+
+
+forwards = WeakValueDictionary()
+"""Forwards of files by real path"""
+
+_forwards_lock = threading.Lock()
+
+def get_forward(path):
+    """Return Forward of file shared by containers.
+
+    Args:
+      path (str): path of file
+
+    Return:
+      Forward: forwarding into file without rotation
+
+    """
+    key = os.path.realpath(path)
+    with _forwards_lock:
+        forward = forwards.get(key)
+        if forward is None:
+            forward = forwards[key] = Forward(path)
+        return forward
+
+
+class Capture(object):
+    """Captured stdout and stderr of one container."""
+    def __init__(self, size=CHUNK, overflow='oldest',
+                 on_chunk=None, on_line=None, reader=None, forward=None):
+        """Set buffers or destinations of streams.
+
+        Args:
+          size (int): size of buffer of every stream
+          overflow (str): overflow policy, see overflows
+          on_chunk, on_line (callable): consumers instead
+            of buffers, see Stream
+          reader (Reader): reader of pipes, default is
+            global reader of buffers or of forwarding
+          forward (str, int, fo, Forward, dict): destination
+            of both streams or dict with 'stdout' and 'stderr'
+            keys, path is forwarded with Forward shared by all
+            containers, see `get_forward`, default is None: buffers
+
+        """
+        if not isinstance(forward, dict):
+            forward = {'stdout': forward, 'stderr': forward}
+        sinks = {}
+        for name in ('stdout', 'stderr'):
+            dest = forward.get(name)
+            if dest is None:
+                sink = Stream(name, size, overflow, on_chunk, on_line)
+            elif isinstance(dest, Forward):
+                sink = dest
+            elif isinstance(dest, str):
+                sink = get_forward(dest)
+            else:
+                # the same destination of both streams
+                # is written through one Forward
+                for other in sinks.values():
+                    if isinstance(other, Forward) and other.dest is dest:
+                        sink = other
+                        break
+                else:
+                    sink = Forward(dest)
+            sinks[name] = sink
+        self.stdout = sinks['stdout']
+        self.stderr = sinks['stderr']
+        self.reader = reader
+        self.fds = None
+
+    def open(self):
+        """Create pipes and open destinations.
+
+        Called before the child is cloned.
+
+        Return:
+          tuple: write ends for stdout and stderr of child
+
+        Raises:
+          OSError: pipe or destination can not be opened
+
+        """
+        fds = []
+        attached = []
+        try:
+            for stream in (self.stdout, self.stderr):
+                fds.extend(os.pipe())
+                stream.attach()
+                attached.append(stream)
+        except:
+            for fd in fds:
+                os.close(fd)
+            for stream in attached:
+                stream.close()
+            raise
+        self.fds = (tuple(fds[:2]), tuple(fds[2:]))
+        return fds[1], fds[3]
+
+    def start(self):
+        """Close write ends and pass read ends to reader.
+
+        Called after the child is cloned.
+
+        """
+        for (r, w), stream in zip(self.fds, (self.stdout, self.stderr)):
+            os.close(w)
+            reader = self.reader
+            if reader is None:
+                if isinstance(stream, Forward):
+                    reader = get_reader('forward')
+                else:
+                    reader = get_reader()
+            reader.register(r, stream)
+        self.fds = None
+
+    def close(self):
+        """Close pipes that are not passed to reader."""
+        opened = self.fds is not None
+        if opened:
+            for fd in self.fds[0] + self.fds[1]:
+                os.close(fd)
+            self.fds = None
+        for stream in (self.stdout, self.stderr):
+            if opened or isinstance(stream, Stream):
+                stream.close()
+
+    def wait(self, timeout=None):
+        """Wait for the end of both streams."""
+        return self.stdout.wait(timeout) and self.stderr.wait(timeout)
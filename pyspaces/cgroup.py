@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""This is part of [pyspaces](https://github.com/Friz-zy/pyspaces)
+
+License: MIT or BSD or Apache 2.0
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Resource control of containers with cgroup v2: child cgroup
+is created under root, limits are written into its interface
+files and the child is added before it is released by Clone.
+
+    Container(target=f, cgroup={
+        'cpu.max': (50000, 100000),
+        'memory.max': 256 * 2 ** 20,
+        'pids.max': 64,
+        'io.max': '8:0 rbps=10485760 wbps=10485760',
+    })
+
+Root should be cgroup without processes, e.g. delegated
+by systemd, controllers of limits are enabled in it.
+
+"""
+
+
+import os
+import errno
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+"""Default root of cgroup v2 hierarchy"""
+
+stat_files = ('cpu.stat', 'memory.stat')
+"""Files saved as final stats on removal of cgroup"""
+
+
+def format_value(value):
+    """Return value of cgroup interface file.
+
+    None is 'max', tuple or list is joined
+    with spaces like (50000, 100000) for cpu.max.
+
+    """
+    if value is None:
+        return 'max'
+    if isinstance(value, (tuple, list)):
+        return ' '.join(format_value(v) for v in value)
+    return str(value)
+
+
+class Cgroup(object):
+    """Child cgroup of cgroup v2 root."""
+    def __init__(self, name, root=None, limits=None):
+        """Set path and limits.
+
+        Args:
+          name (str): name of cgroup relative to root
+          root (str): root of cgroup v2 hierarchy,
+            default is CGROUP_ROOT
+          limits (dict): interface file and value,
+            like {'memory.max': 2 ** 30}, default is {}
+
+        """
+        self.name = name
+        self.root = CGROUP_ROOT if root is None else root
+        self.path = os.path.join(self.root, name)
+        self.limits = dict(limits or {})
+        self.final = None
+
+    def __repr__(self):
+        return '<Cgroup %s>' % self.path
+
+    def write(self, name, value):
+        """Write value into interface file.
+
+        Args:
+          name (str): name of file like 'pids.max'
+          value (str): value, every line
+            is written separately
+
+        """
+        with open(os.path.join(self.path, name), 'w') as f:
+            for line in value.splitlines() or ['']:
+                f.write(line)
+                # kernel parses each write as one value
+                f.flush()
+
+    def read(self, name):
+        """Return content of interface file."""
+        with open(os.path.join(self.path, name)) as f:
+            return f.read()
+
+    def enable(self, controllers):
+        """Enable controllers for children of root.
+
+        Args:
+          controllers (set): names like 'cpu' and 'memory'
+
+        """
+        path = os.path.join(self.root, 'cgroup.subtree_control')
+        if not controllers or not os.path.exists(path):
+            return
+        with open(path) as f:
+            missing = set(controllers) - set(f.read().split())
+        if missing:
+            with open(path, 'w') as f:
+                f.write(' '.join('+' + c for c in sorted(missing)))
+
+    def create(self):
+        """Create cgroup and set limits.
+
+        Existing cgroup is reused.
+
+        Raises:
+          OSError: can not create cgroup or write limits
+
+        """
+        self.enable(set(k.split('.')[0] for k in self.limits))
+        try:
+            os.mkdir(self.path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        self.set(self.limits)
+
+    def set(self, limits):
+        """Write limits.
+
+        Args:
+          limits (dict): interface file and value
+
+        """
+        for name in sorted(limits):
+            self.write(name, format_value(limits[name]))
+        self.limits.update(limits)
+
+    def add(self, pid):
+        """Move process into cgroup.
+
+        Args:
+          pid (int): pid of process
+
+        """
+        self.write('cgroup.procs', str(pid))
+
+    def pids(self):
+        """Return pids of processes in cgroup."""
+        return [int(pid) for pid in self.read('cgroup.procs').split()]
+
+    def stat(self, name='cpu.stat'):
+        """Return flat keyed file like cpu.stat as dict.
+
+        Final values are returned after removal.
+
+        Args:
+          name (str): name of file, default is 'cpu.stat'
+
+        Return:
+          dict: key and int value, empty if file
+            does not exist
+
+        """
+        if self.final is not None:
+            return dict(self.final.get(name, {}))
+        try:
+            data = self.read(name)
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return {}
+        result = {}
+        for line in data.splitlines():
+            fields = line.split()
+            if len(fields) == 2 and fields[1].isdigit():
+                result[fields[0]] = int(fields[1])
+        return result
+
+    def remove(self):
+        """Save final stats and remove cgroup.
+
+        Return:
+          bool: False if cgroup still has processes
+            and is not removed
+
+        """
+        final = dict((name, self.stat(name)) for name in stat_files)
+        try:
+            os.rmdir(self.path)
+        except OSError as e:
+            if e.errno == errno.EBUSY:
+                return False
+            if e.errno != errno.ENOENT:
+                raise
+        self.final = final
+        return True
@@ -9,15 +9,68 @@ Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
 
 
 import os
+import sys
 import argparse
+from collections import OrderedDict
 from . import __version__
-from .setns import setns
-from .process import Container, Chroot
 
 
-def cli():
-    """Parse cli args."""
-    # parent parser for all
+# options shared by commands: flags and arguments of add_argument
+options = {
+    'all': (('--all', '-a'), dict(default=False,
+        action='store_true', help='Use all 6 namespaces')),
+    'ipc': (('--ipc', '-i'), dict(default=None,
+        action='store_true', help='New IPC namespace')),
+    'mnt': (('--mnt', '--fs', '-m'), dict(default=None,
+        action='store_true', help='New mount namespace')),
+    'net': (('--net', '-n'), dict(default=None,
+        action='store_true', help='New network namespace')),
+    'pid': (('--pid', '-p'), dict(default=None,
+        action='store_true', help='New PID namespace')),
+    'uts': (('--uts', '-u'), dict(default=None,
+        action='store_true', help='New UTS namespace')),
+    'user': (('--user', '-U'), dict(default=None,
+        action='store_true', help='New user namespace')),
+    'uid': (('--uid', '-M'), dict(default='',
+        help='Specify UID map for user namespace')),
+    'gid': (('--gid', '-G'), dict(default='',
+        help='Specify GID map for user namespace')),
+    'id': (('--id', '-z'), dict(default=False, action='store_true',
+        help='Map user\'s UID and GID to 0 in user namespace'
+             '(equivalent to: -M \'0 <uid> 1\' -G \'0 <gid> 1\')')),
+    'argv': (('argv',), dict(help='Command with args for executing.')),
+    'path': (('path',), dict(help='New root directory.')),
+    'target_pid': (('target_pid',), dict(help='Pid of target process.')),
+    'proc': (('--proc',), dict(default='/proc',
+        help='root directory of proc fs.')),
+}
+
+# commands: help, options in order of positional args, function name
+commands = OrderedDict()
+commands['chroot'] = ('Run program in new root and namespaces.',
+    ['all', 'uid', 'gid', 'id', 'ipc', 'net', 'pid', 'uts', 'path', 'argv'],
+    'chroot')
+commands['execute'] = ('Run program in new namespaces.',
+    ['argv', 'all', 'uid', 'gid', 'id', 'ipc', 'mnt', 'net', 'pid', 'user',
+     'uts'],
+    'execute')
+commands['inject'] = ('Run program in namespaces of another process.',
+    ['all', 'ipc', 'mnt', 'net', 'pid', 'user', 'uts', 'uid', 'gid', 'id',
+     'target_pid', 'argv', 'proc'],
+    'inject')
+
+
+def parser(names=None):
+    """Build parser only for given commands.
+
+    Args:
+      names (list): names of commands,
+        default is all commands
+
+    Return:
+      ArgumentParser: parser of cli
+
+    """
     p_main = argparse.ArgumentParser(
         formatter_class=argparse.RawTextHelpFormatter,
         prog='space',
@@ -27,109 +80,39 @@ def cli():
     p_main.add_argument('--verbose', '-v', action='store_true',
         default=False, help='Enables verbose mode.'
     )
+    subps = p_main.add_subparsers(metavar="<command>")
+    for name in names or commands:
+        help, opts, func = commands[name]
+        pe = subps.add_parser(name, help=help)
+        pe.add_argument('--verbose', '-v', action='store_true',
+            default=False, help='Enables verbose mode.'
+        )
+        for opt in opts:
+            flags, kwargs = options[opt]
+            pe.add_argument(*flags, **kwargs)
+        pe.set_defaults(func=globals()[func])
+    return p_main
 
-    # main parser for cli
-    p_case = argparse.ArgumentParser(add_help=False, parents=[p_main])
+def cli(argv=None):
+    """Parse cli args.
 
-    # additional parsers
-    p_all = argparse.ArgumentParser(add_help=False)
-    p_all.add_argument('--all', '-a', default=False,
-        action='store_true', help='Use all 6 namespaces'
-    )
-    p_ipc = argparse.ArgumentParser(add_help=False)
-    p_ipc.add_argument('--ipc', '-i', default=None,
-        action='store_true', help='New IPC namespace'
-    )
-    p_mount = argparse.ArgumentParser(add_help=False)
-    p_mount.add_argument('--mnt', '--fs', '-m', default=None,
-        action='store_true', help='New mount namespace'
-    )
-    p_net = argparse.ArgumentParser(add_help=False)
-    p_net.add_argument('--net', '-n', default=None,
-        action='store_true', help='New network namespace'
-    )
-    p_pid = argparse.ArgumentParser(add_help=False)
-    p_pid.add_argument('--pid', '-p', default=None,
-        action='store_true', help='New PID namespace'
-    )
-    p_uts = argparse.ArgumentParser(add_help=False)
-    p_uts.add_argument('--uts', '-u', default=None,
-        action='store_true', help='New UTS namespace'
-    )
-    p_user = argparse.ArgumentParser(add_help=False)
-    p_user.add_argument('--user', '-U', default=None,
-        action='store_true', help='New user namespace'
-    )
-    p_uid = argparse.ArgumentParser(add_help=False)
-    p_uid.add_argument('--uid', '-M', default='',
-        help='Specify UID map for user namespace'
-    )
-    p_gid = argparse.ArgumentParser(add_help=False)
-    p_gid.add_argument('--gid', '-G', default='',
-        help='Specify GID map for user namespace'
-    )
-    p_id = argparse.ArgumentParser(add_help=False)
-    p_id.add_argument('--id', '-z', default=False,
-        action='store_true',
-        help='Map user\'s UID and GID to 0 in user namespace'
-             '(equivalent to: -M \'0 <uid> 1\' -G \'0 <gid> 1\')'
-    )
-    p_argv = argparse.ArgumentParser(add_help=False)
-    p_argv.add_argument('argv',
-        help='Command with args for executing.',
-    )
+    Only parser of called command is built,
+    modules of pyspaces are imported by command.
 
-    subps = p_case.add_subparsers(metavar="<command>")
-    # chroot
-    pe = subps.add_parser('chroot', add_help=False,
-        parents=[p_main,
-            p_all, p_uid, p_gid, p_id,
-            p_ipc, p_net, p_pid, p_uts,
-        ],
-        help='Run program in new root and namespaces.'
-    )
-    pe.add_argument('path',
-        help='New root directory.',
-    )
-    # add argv not as parent parser because of
-    # sequence of positional args
-    pe.add_argument('argv',
-        help='Command with args for executing.',
-    )
-    pe.set_defaults(func=chroot)
-    # execute
-    pe = subps.add_parser('execute', add_help=False,
-        parents=[p_main, p_argv,
-            p_all, p_uid, p_gid, p_id,
-            p_ipc, p_mount, p_net,
-            p_pid, p_user, p_uts,
-        ],
-        help='Run program in new namespaces.'
-    )
-    pe.set_defaults(func=execute)
-    # inject
-    pe = subps.add_parser('inject', add_help=False,
-        parents=[p_main, p_all,
-            p_ipc, p_mount, p_net,
-            p_pid, p_user, p_uts,
-            p_uid, p_gid, p_id,
-        ],
-        help='Run program in namespaces of another process.'
-    )
-    pe.add_argument('target_pid',
-        help='Pid of target process.',
-    )
-    # add argv not as parent parser because of
-    # sequence of positional args
-    pe.add_argument('argv',
-        help='Command with args for executing.',
-    )
-    pe.add_argument('--proc', default='/proc',
-        help='root directory of proc fs.',
-    )
-    pe.set_defaults(func=inject)
+    Args:
+      argv (list): cli args, default is sys.argv[1:]
 
-    args, extra = p_case.parse_known_args()
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    command = None
+    for arg in argv:
+        if not arg.startswith('-'):
+            command = arg
+            break
+    p_case = parser([command] if command in commands else None)
+    args, extra = p_case.parse_known_args(argv)
+    if not hasattr(args, 'func'):
+        p_case.error('command is required')
     args.func(args, extra)
 
 def execute(args, argv):
@@ -144,8 +127,9 @@ def execute(args, argv):
     Analog of userns_child_exec from user namespaces man.
 
     """
+    from .process import Container
     argv.insert(0, args.argv)
-    c = Container(target=os.execvp, args=(argv[0], argv),
+    c = Container(exec_argv=argv,
               uid_map=args.uid, gid_map=args.gid, map_zero=args.id,
               newpid=args.pid, newuser=args.user, newns=args.mnt,
               newuts=args.uts, newipc=args.ipc, newnet=args.net,
@@ -180,9 +164,10 @@ def chroot(args, argv):
     [src](http://www.ciiycode.com/0JiJzPgggqPg/why-doesnt-exec-work-after-chroot)
 
     """
+    from .process import Chroot
     argv.insert(0, args.argv)
-    c = Chroot(path=args.path, target=os.execvp,
-              args=(argv[0], argv), all=args.all, newpid=args.pid,
+    c = Chroot(path=args.path, target=None,
+              exec_argv=argv, all=args.all, newpid=args.pid,
               uid_map=args.uid, gid_map=args.gid, map_zero=args.id,
               newuts=args.uts, newipc=args.ipc, newnet=args.net
     )
@@ -199,6 +184,7 @@ def inject(args, argv):
     $ space inject --all 12603 bash
 
     """
+    from .setns import setns
     argv.insert(0, args.argv)
     if args.verbose:
         print("PID is %ld\n" % os.getpid())
@@ -10,65 +10,258 @@ Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
 
 import os
 import sys
+import mmap
 import errno
+import threading
+import signal
+import select
 from .libc import *
+from .flags import *
+from .timing import Timer, histograms
 from signal import SIGKILL, SIGCHLD
+from functools import partial
+from operator import methodcaller
+from collections import deque, OrderedDict
+try:
+    from itertools import imap
+except ImportError:
+    # python 3
+    imap = map
 
 try:
     from multiprocessing.forking import Popen
 except ImportError:
     from multiprocessing.popen_fork import Popen
 
+# Python runs this hooks around os.fork: they reinit
+# the GIL, import lock and state of threading module,
+# so clone can be safely called from any thread
+try:
+    before_fork = pythonapi.PyOS_BeforeFork
+    after_fork_parent = pythonapi.PyOS_AfterFork_Parent
+    after_fork_child = pythonapi.PyOS_AfterFork_Child
+except AttributeError:
+    # python < 3.7
+    before_fork = after_fork_parent = lambda: None
+    after_fork_child = pythonapi.PyOS_AfterFork
 
 STACK_SIZE = 1024 * 1024
 """STACK_SIZE (1024 * 1024)"""
 
-# cloning flags
-# src: linux/include/uapi/linux/sched.h
-CLONE_VM = 0x00000100  
-"""set if VM shared between processes"""
-CLONE_FS = 0x00000200  
-"""set if fs info shared between processes"""
-CLONE_FILES = 0x00000400  
-"""set if open files shared between processes"""
-CLONE_SIGHAND = 0x00000800  
-"""set if signal handlers and blocked signals shared"""
-CLONE_PTRACE = 0x00002000  
-"""set if we want to let tracing continue on the child too"""
-CLONE_VFORK = 0x00004000  
-"""set if the parent wants the child to wake it up on mm_release"""
-CLONE_PARENT = 0x00008000  
-"""set if we want to have the same parent as the cloner"""
-CLONE_THREAD = 0x00010000  
-"""Same thread group?"""
-CLONE_NEWNS = 0x00020000  
-"""New mount namespace group"""
-CLONE_SYSVSEM = 0x00040000  
-"""share system V SEM_UNDO semantics"""
-CLONE_SETTLS = 0x00080000  
-"""create a new TLS for the child"""
-CLONE_PARENT_SETTID = 0x00100000  
-"""set the TID in the parent"""
-CLONE_CHILD_CLEARTID = 0x00200000  
-"""clear the TID in the child"""
-CLONE_DETACHED = 0x00400000  
-"""Unused, ignored"""
-CLONE_UNTRACED = 0x00800000  
-"""set if the tracing process can't force CLONE_PTRACE on this clone"""
-CLONE_CHILD_SETTID = 0x01000000  
-"""set the TID in the child"""
-CLONE_NEWUTS = 0x04000000  
-"""New utsname namespace"""
-CLONE_NEWIPC = 0x08000000  
-"""New ipc namespace"""
-CLONE_NEWUSER = 0x10000000  
-"""New user namespace"""
-CLONE_NEWPID = 0x20000000  
-"""New pid namespace"""
-CLONE_NEWNET = 0x40000000  
-"""New network namespace"""
-CLONE_IO = 0x80000000  
-"""Clone io context"""
+# syscall numbers are the same on all architectures
+# since linux 5.1
+# src: linux/include/uapi/asm-generic/unistd.h
+SYS_pidfd_send_signal = 424
+SYS_pidfd_open = 434
+SYS_clone3 = 435
+
+
+_clone3 = None
+
+def has_clone3():
+    """Check if kernel supports clone3 syscall.
+
+    Kernel is probed only once: clone3 with empty
+    arguments fails with EINVAL if syscall exists
+    and with ENOSYS if it doesn't or is filtered
+    by seccomp. Such kernel also supports
+    CLONE_PIDFD flag of clone.
+
+    Return:
+      bool: True if clone3 is supported
+
+    """
+    global _clone3
+    if _clone3 is None:
+        _clone3 = (libc.syscall(SYS_clone3, None, 0) == -1 and
+                   get_errno() == errno.EINVAL)
+    return _clone3
+
+def child_entry(*funcs):
+    """Return callable that calls funcs one by one.
+
+    Returned callable and iteration over funcs are
+    implemented in C, so no bytecode runs before the
+    first function. Cloned child must reinit the GIL
+    before the interpreter checks if another thread
+    requested it, else the child waits forever for
+    the thread that exists only in its parent.
+
+    Args:
+      funcs (list): functions without arguments
+
+    Return:
+      callable: callable for ctypes callback
+
+    """
+    return partial(deque, imap(methodcaller('__call__'), funcs), 0)
+
+# memory flags
+# src: linux/include/uapi/asm-generic/mman-common.h
+PROT_NONE = 0x0
+"""page can not be accessed"""
+PROT_READ = 0x1
+"""page can be read"""
+PROT_WRITE = 0x2
+"""page can be written"""
+MAP_PRIVATE = 0x02
+"""changes are private"""
+MAP_ANONYMOUS = 0x20
+"""don't use a file"""
+MAP_NORESERVE = 0x4000
+"""don't check for reservations"""
+MAP_STACK = 0x20000
+"""give out an address that is best suited for process/thread stacks"""
+MAP_FAILED = c_void_p(-1).value
+
+libc.mmap.restype = c_void_p
+libc.mmap.argtypes = [c_void_p, c_size_t, c_int, c_int, c_int, c_long]
+libc.munmap.argtypes = [c_void_p, c_size_t]
+libc.mprotect.argtypes = [c_void_p, c_size_t, c_int]
+
+
+class Stack(object):
+    """Memory region for stack of cloned child.
+
+    Region is allocated with mmap, so pages are zeroed by
+    kernel lazily on first touch, and lowest page of the
+    region is protected as guard page: stack overflow in
+    child raises SIGSEGV instead of memory corruption.
+
+    Raises:
+      OSError: can not execute mmap or mprotect
+
+    """
+    def __init__(self, size=STACK_SIZE):
+        """Map size bytes and one guard page.
+
+        Args:
+          size (int): usable size of stack, rounded
+            up to page size, default is STACK_SIZE
+
+        """
+        self.size = -(-size // mmap.PAGESIZE) * mmap.PAGESIZE
+        self.length = self.size + mmap.PAGESIZE
+        self.address = libc.mmap(None, self.length,
+            PROT_READ | PROT_WRITE,
+            MAP_PRIVATE | MAP_ANONYMOUS | MAP_NORESERVE | MAP_STACK,
+            -1, 0
+        )
+        if self.address in (None, MAP_FAILED):
+            self.address = None
+            e = get_errno()
+            raise OSError(e, os.strerror(e))
+        if libc.mprotect(self.address, mmap.PAGESIZE, PROT_NONE) == -1:
+            e = get_errno()
+            self.free()
+            raise OSError(e, os.strerror(e))
+
+    @property
+    def top(self):
+        """Pointer to the top of stack: stack grows down."""
+        return c_void_p(self.address + self.length)
+
+    def free(self):
+        """Unmap memory region."""
+        if self.address is not None:
+            libc.munmap(self.address, self.length)
+            self.address = None
+
+    def __del__(self):
+        self.free()
+
+
+class StackPool(object):
+    """Pool of reusable stacks for cloned children.
+
+    Stacks are grouped by size, at most `limit`
+    free stacks of each size are kept.
+
+    """
+    def __init__(self, limit=64):
+        """Create empty pool.
+
+        Args:
+          limit (int): max count of free stacks of
+            each size, default is 64
+
+        """
+        self.limit = limit
+        self._free = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, size=STACK_SIZE):
+        """Return free stack of given size or new one.
+
+        Args:
+          size (int): usable size of stack,
+            default is STACK_SIZE
+
+        Return:
+          Stack: stack for cloned child
+
+        """
+        size = -(-size // mmap.PAGESIZE) * mmap.PAGESIZE
+        with self._lock:
+            free = self._free.get(size)
+            if free:
+                return free.pop()
+        return Stack(size)
+
+    def release(self, stack):
+        """Return stack into the pool.
+
+        Args:
+          stack (Stack): stack acquired from this pool
+
+        """
+        with self._lock:
+            free = self._free.setdefault(stack.size, [])
+            if len(free) < self.limit:
+                free.append(stack)
+                return
+        stack.free()
+
+    def clear(self):
+        """Unmap all free stacks."""
+        with self._lock:
+            for free in self._free.values():
+                for stack in free:
+                    stack.free()
+            self._free.clear()
+
+stacks = StackPool()
+"""Default pool of stacks for cloned children"""
+
+def arg2map(arg):
+    """Render UID or GID mapping.
+
+    Args:
+      arg (int, str, list, IdLease):
+        int: map given uid to root
+        str: like int or in format
+        ' '.join((<start uid in new ns>,
+                  <start uid in current ns>,
+                  <range to mapping>
+        )). Example "0 1000 1" will map 1000 uid as root,
+        "0 1000 1,1 1001 1" will map also 1001 as uid 1.
+        list: list of int or str
+        IdLease: leased range of ids with rendered map
+
+    Return:
+      str: newline-delimited records of mapping
+
+    """
+    if hasattr(arg, 'map'):
+        return arg.map
+    if type(arg) is int:
+        return "0 %d 1" % arg
+    if isinstance(arg, (str, type(u''))):
+        arg = arg.split(',')
+    arg = [str(a) for a in arg]
+    if ' ' not in arg[0]:
+        arg = ['%d %s 1' % (i, d) for i, d in enumerate(arg)]
+    return '\n'.join(arg)
 
 
 class Clone(Popen):
@@ -79,7 +272,8 @@ class Clone(Popen):
 
     Raises:
       OSError: can not execute glibc.clone function
-      RuntimeError: parent doesn't close its pipe descriptor
+      RuntimeError: parent closes its pipe descriptor
+        without updating the mappings
       IOError: do not have permission to write to a file.
         Child will be killed with signal.SIGKILL.
 
@@ -91,6 +285,23 @@ class Clone(Popen):
         allow UID and GID mappings to be specified when
         creating a user namespace.
 
+        If kernel supports clone3, child is created
+        with CLONE_PIDFD flag: pidfd is used as sentinel
+        and for poll and kill, so there is no race
+        with reused pids.
+
+        If process has exec_plan, child executes its
+        chain of libc calls instead of python bootstrap.
+
+        Unlike fork, glibc clone does not run atfork
+        handlers of malloc. The GIL is held, so other
+        threads do not run python code, but thread that
+        is inside malloc without the GIL, e.g. exiting
+        thread that frees its memory, leaves the arena
+        locked in the child and the child hangs on first
+        allocation. Container should not be started while
+        other threads exit or call C code without the GIL.
+
         Raises:
           OSError: can not execute glibc.clone function
 
@@ -99,6 +310,17 @@ class Clone(Popen):
         sys.stderr.flush()
         self.process_obj = process_obj
         self.returncode = None
+        self.pidfd = None
+        self.stack = None
+        self.timer = None
+        self.timings_fd = None
+        self.recorded = False
+        plan = process_obj.__dict__.get('exec_plan')
+        if process_obj.__dict__.get('timed', False):
+            self.timer = Timer()
+            # program executed by plan does not send timings
+            if plan is None:
+                self.timings_fd = os.pipe()
         self.pipe_fd = os.pipe()
 
         # clone attributes
@@ -107,36 +329,40 @@ class Clone(Popen):
         gid_map = process_obj.__dict__.get('gid_map', "")
         map_zero = process_obj.__dict__.get('map_zero', False)
         proc = process_obj.__dict__.get('proc', '/proc')
+        stack_size = process_obj.__dict__.get('stack_size', STACK_SIZE)
 
         # Create the child in new namespace(s)
-        child = CFUNCTYPE(c_int)(self.child)
-        child_stack = create_string_buffer(STACK_SIZE)
-        child_stack_pointer = c_void_p(cast(child_stack, c_void_p).value + STACK_SIZE)
-
-        self.pid = libc.clone(child, child_stack_pointer, flags | SIGCHLD)
-
+        # Call clone with the GIL held like os.fork does,
+        # else the child can inherit it locked by another thread
+        if plan is not None:
+            # child does not run python code, fork hooks are not needed
+            try:
+                funcs = plan.entry(self.pipe_fd)
+            except Exception:
+                os.close(self.pipe_fd[0])
+                os.close(self.pipe_fd[1])
+                raise
+            try:
+                self.pid = self.clone(flags, stack_size, funcs)
+            finally:
+                plan.close()
+        else:
+            before_fork()
+            try:
+                self.pid = self.clone(flags, stack_size)
+            finally:
+                after_fork_parent()
+
+        if self.timings_fd is not None:
+            os.close(self.timings_fd[1])
+            self.timings_fd = self.timings_fd[0]
         if self.pid == -1:
             e = get_errno()
+            self.close()
             raise OSError(e, os.strerror(e))
+        self.lap('clone')
 
         # Update the UID and GID maps in the child
-        def arg2map(arg):
-            #    int: map given uid to root
-            #    str: like int or in format
-            #    ' '.join((<start uid in new ns>,
-            #              <start uid in current ns>,
-            #              <range to mapping>
-            #    )). Example "0 1000 1" will map 1000 uid as root,
-            #    "0 1000 1,1 1001 1" will map also 1001 as uid 1.
-            #    list: list of int or str
-            if type(arg) is int:
-                return "0 %d 1" % arg
-            if not hasattr(arg, '__iter__'):
-                arg = arg.split(',')
-            if ' ' not in arg[0]:
-                arg = ['%d %s 1' % (i, d) for i, d in enumerate(arg)]
-            return '\n'.join(arg)
-
         if uid_map or map_zero:
             map_path = "%s/%s/uid_map" % (proc, self.pid)
             if map_zero or type(uid_map) is bool:
@@ -158,33 +384,102 @@ class Clone(Popen):
             else:
                 gid_map = arg2map(gid_map)
             self.update_map(gid_map, map_path)
-
-        # Close the write end of the pipe, to signal to the child that we
-        # have updated the UID and GID maps
+        self.lap('update_map')
+
+        # Parent side setup of namespaces of the child,
+        # e.g. network links, before the child is released
+        prestart = getattr(process_obj, 'prestart', None)
+        if prestart is not None:
+            try:
+                prestart(self.pid)
+            except:
+                self.abort()
+                raise
+            self.lap('prestart')
+
+        # Write one byte and close the write end of the pipe, to signal
+        # to the child that we have updated the UID and GID maps.
+        # Only EOF is not enough: children cloned from other threads
+        # at the same time may inherit our write end of the pipe
+        os.write(self.pipe_fd[1], b'\0')
         os.close(self.pipe_fd[1])
-        self.sentinel = self.pipe_fd[0]
+        self.lap('handshake')
+        if self.pidfd is not None:
+            os.close(self.pipe_fd[0])
+            self.sentinel = self.pidfd
+        else:
+            self.sentinel = self.pipe_fd[0]
+
+    def clone(self, flags, stack_size=STACK_SIZE, funcs=None):
+        """Create child with glibc clone function.
+
+        CLONE_PIDFD is added if kernel supports it
+        and flags allow it. Raw clone3 syscall is
+        not used: child would return from it into
+        the interpreter before the GIL is reinit.
+
+        Args:
+          flags (int): flags for clone
+          stack_size (int): size of stack for child
+          funcs (list): functions called in child,
+            default is python fork hooks and self.child
+
+        Return:
+          int: pid of child or -1
+
+        """
+        pidfd = c_int(-1)
+        ptid = None
+        # kernel rejects CLONE_PIDFD with CLONE_DETACHED
+        if has_clone3() and not flags & (
+                CLONE_THREAD | CLONE_PARENT_SETTID | CLONE_DETACHED):
+            flags |= CLONE_PIDFD
+            ptid = byref(pidfd)
+        if funcs is None:
+            funcs = (after_fork_child, self.child)
+        child = CFUNCTYPE(c_int)(child_entry(*funcs))
+        self.stack = stacks.acquire(stack_size)
+        pid = pylibc.clone(child, self.stack.top, flags | SIGCHLD, None, ptid)
+        # Child without CLONE_VM works on its own copy of the stack
+        # and child with CLONE_VFORK has already exec'd or exited
+        if pid == -1 or not flags & CLONE_VM or flags & CLONE_VFORK:
+            self.release_stack()
+        if pid != -1 and ptid is not None:
+            self.pidfd = pidfd.value
+        return pid
 
     def child(self):
         """Start function for cloned child.
 
         Wait until the parent has updated the UID and GID mappings.
-        See the comment in main(). We wait for end of file on a
-        pipe that will be closed by the parent process once it has
+        See the comment in main(). We wait for one byte on a
+        pipe that will be written by the parent process once it has
         updated the mappings.
 
         Raises:
-          RuntimeError: parent doesn't close its pipe descriptor
+          RuntimeError: parent closes its pipe descriptor
+            without updating the mappings
 
         """
+        if self.timer is not None:
+            # container sends timings before its target runs
+            timer = Timer(self.timer.start)
+            timer.lap('child_clone')
+            os.close(self.timings_fd[0])
+            self.process_obj._timer = timer
+            self.process_obj._timings_fd = self.timings_fd[1]
         # Close our descriptor for the write
         # end of the pipe so that we see EOF
-        # when parent closes its descriptor
+        # if parent closes its descriptor
         os.close(self.pipe_fd[1])
-        if os.read(self.pipe_fd[0], 1):
+        if not os.read(self.pipe_fd[0], 1):
             raise RuntimeError(
                 'Failure in child:'
-                ' parent doesn\'t close its descriptor'
+                ' parent closes its descriptor'
+                ' without updating the mappings'
             )
+        if self.timer is not None:
+            timer.lap('child_handshake')
 
         if 'random' in sys.modules:
             import random
@@ -194,6 +489,154 @@ class Clone(Popen):
         sys.stderr.flush()
         os._exit(code)
 
+    def abort(self):
+        """Kill and reap child that is not released yet.
+
+        Handshake pipe, pidfd, stack, leases
+        and cgroup of child are released.
+
+        """
+        try:
+            os.kill(self.pid, SIGKILL)
+            os.waitpid(self.pid, 0)
+        except OSError:
+            pass
+        self.returncode = -SIGKILL
+        for fd in self.pipe_fd:
+            os.close(fd)
+        self.close()
+        self.release_stack()
+        self.release_leases()
+        self.release_cgroup()
+
+    def poll(self, flag=os.WNOHANG):
+        """Check if child has exited and release its resources.
+
+        Timings of exited child are recorded
+        into timing.histograms once.
+
+        Child created with CLONE_PIDFD is waited by pidfd.
+
+        """
+        if (self.returncode is None and self.pidfd is not None
+                and hasattr(os, 'P_PIDFD')):
+            try:
+                result = os.waitid(os.P_PIDFD, self.pidfd,
+                                   os.WEXITED | flag)
+            except OSError:
+                # child is already reaped
+                return None
+            if result is not None:
+                if result.si_code == os.CLD_EXITED:
+                    self.returncode = result.si_status
+                else:
+                    self.returncode = -result.si_status
+        returncode = Popen.poll(self, flag)
+        if returncode is not None:
+            self.record_timings()
+            self.release_stack()
+            self.release_leases()
+            self.release_cgroup()
+        return returncode
+
+    def _send_signal(self, sig):
+        """Send signal to child by pidfd if it exists."""
+        if self.returncode is not None:
+            return
+        try:
+            if self.pidfd is None:
+                os.kill(self.pid, sig)
+            elif libc.syscall(SYS_pidfd_send_signal, self.pidfd,
+                              sig, None, 0) == -1:
+                e = get_errno()
+                raise OSError(e, os.strerror(e))
+        except OSError as e:
+            if e.errno != errno.ESRCH:
+                raise
+
+    def terminate(self):
+        self._send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self._send_signal(signal.SIGKILL)
+
+    def close(self):
+        """Close pidfd of child and pipe of timings."""
+        if self.pidfd is not None:
+            os.close(self.pidfd)
+            self.pidfd = None
+        if isinstance(self.timings_fd, int):
+            os.close(self.timings_fd)
+        self.timings_fd = None
+
+    def lap(self, name):
+        """Save duration of finished phase if timer is set."""
+        if self.timer is not None:
+            self.timer.lap(name)
+
+    def timings(self):
+        """Return durations of startup phases.
+
+        Waits until the child sends its timings
+        before running the target or exits.
+
+        Return:
+          OrderedDict: phase name and duration in seconds
+            or None if timer is not set
+
+        """
+        if self.timer is None:
+            return None
+        fd = self.timings_fd
+        if fd is None:
+            return OrderedDict(self.timer.phases)
+        self.timings_fd = None
+        data = b''
+        try:
+            while not data.endswith(b'\n'):
+                if self.pidfd is not None:
+                    # pidfd is readable when the child exits
+                    ready = select.select([fd, self.pidfd], [], [])[0]
+                    if fd not in ready:
+                        break
+                chunk = os.read(fd, 4096)
+                if not chunk:
+                    break
+                data += chunk
+        finally:
+            os.close(fd)
+        if data.endswith(b'\n'):
+            self.timer.phases.update(Timer.loads(data.decode()))
+        return OrderedDict(self.timer.phases)
+
+    def record_timings(self):
+        """Record timings of child into timing.histograms once."""
+        if self.timer is not None and not self.recorded:
+            self.recorded = True
+            histograms.record(self.timings())
+
+    def release_leases(self):
+        """Release leased ranges of ids used as UID and GID maps."""
+        for name in ('uid_map', 'gid_map'):
+            lease = self.process_obj.__dict__.get(name)
+            if hasattr(lease, 'release'):
+                lease.release()
+
+    def release_cgroup(self):
+        """Remove cgroup of child saving its final stats."""
+        cgroup = self.process_obj.__dict__.get('cgroup')
+        if cgroup is not None and cgroup.final is None:
+            try:
+                cgroup.remove()
+            except OSError:
+                pass
+
+    def release_stack(self):
+        """Return stack of child into the pool."""
+        if self.stack is not None:
+            stacks.release(self.stack)
+            self.stack = None
+
     def update_map(self, mapping, map_file):
         """
 
@@ -221,7 +664,7 @@ class Clone(Popen):
             with open(map_file, 'w') as f:
                 f.write(mapping)
         except IOError as e:
-            os.kill(self.pid, SIGKILL)
+            self.abort()
             raise IOError(
                 "Can not write %s: %s\nAborting!" % (map_file, e)
             )
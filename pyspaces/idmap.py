@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""This is part of [pyspaces](https://github.com/Friz-zy/pyspaces)
+
+License: MIT or BSD or Apache 2.0
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+"""
+
+
+import os
+import pwd
+import heapq
+import threading
+
+
+def read_subid(user=None, path='/etc/subuid'):
+    """Read subordinate id ranges of user.
+
+    Args:
+      user (str or int): name or uid of user,
+        default is current user
+      path (str): path to subordinate ids file,
+        '/etc/subuid' or '/etc/subgid',
+        default is '/etc/subuid'
+
+    Return:
+      list: list of (start, count) tuples
+
+    """
+    if user is None:
+        user = os.getuid()
+    names = set([str(user)])
+    try:
+        if isinstance(user, int):
+            names.add(pwd.getpwuid(user).pw_name)
+        else:
+            names.add(str(pwd.getpwnam(user).pw_uid))
+    except KeyError:
+        pass
+    ranges = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            name, start, count = line.split(':')
+            if name in names:
+                ranges.append((int(start), int(count)))
+    return ranges
+
+
+class IdLease(object):
+    """Range of ids leased from `IdAllocator`.
+
+    Can be passed as uid_map or gid_map into
+    `Container`: text of map is rendered once,
+    the lease is released when the container
+    exits and is joined.
+
+    """
+    def __init__(self, allocator, index, start, count, inside=0):
+        """Set range and render map.
+
+        Args:
+          allocator (IdAllocator): owner of the range
+          index (int): index of block in allocator
+          start (int): first id of range in current ns
+          count (int): length of range
+          inside (int): first id of range in new ns,
+            default is 0
+
+        """
+        self.allocator = allocator
+        self.index = index
+        self.start = start
+        self.count = count
+        self.map = '%d %d %d' % (inside, start, count)
+        self.released = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def __str__(self):
+        return self.map
+
+    def __repr__(self):
+        return '<IdLease %s>' % self.map
+
+    def release(self):
+        """Return range into allocator, can be called many times."""
+        self.allocator.release(self)
+
+
+class IdAllocator(object):
+    """Allocator of non-overlapping ranges of ids.
+
+    Range [start, start + count) is split into blocks
+    of equal size. Free blocks are kept in heap, so
+    lease and release are O(log n) and the lowest
+    free block is always leased first.
+
+    """
+    def __init__(self, start, count, block=65536):
+        """Set range of ids.
+
+        Args:
+          start (int): first id of the range
+          count (int): length of the range
+          block (int): size of one lease,
+            default is 65536
+
+        Raises:
+          ValueError: range is smaller than block
+
+        """
+        if count < block:
+            raise ValueError('Range %d:%d is smaller than block %d' %
+                             (start, count, block))
+        self.start = start
+        self.block = block
+        self.size = count // block
+        self._free = []
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_subid(cls, user=None, path='/etc/subuid', block=65536):
+        """Create allocator for first subordinate range of user.
+
+        Args:
+          user (str or int): name or uid of user,
+            default is current user
+          path (str): path to subordinate ids file,
+            default is '/etc/subuid'
+          block (int): size of one lease,
+            default is 65536
+
+        Raises:
+          ValueError: user has no subordinate ids
+
+        """
+        ranges = read_subid(user, path)
+        if not ranges:
+            raise ValueError('No subordinate ids for %s in %s' %
+                             (user, path))
+        start, count = ranges[0]
+        return cls(start, count, block)
+
+    def __len__(self):
+        """Return count of leased blocks."""
+        return self._next - len(self._free)
+
+    def lease(self, inside=0):
+        """Lease free block of ids.
+
+        Args:
+          inside (int): first id of range in new ns,
+            default is 0
+
+        Return:
+          IdLease: leased range
+
+        Raises:
+          RuntimeError: all blocks are leased
+
+        """
+        with self._lock:
+            if self._free:
+                index = heapq.heappop(self._free)
+            elif self._next < self.size:
+                index = self._next
+                self._next += 1
+            else:
+                raise RuntimeError('No free ids in range %d:%d' %
+                                   (self.start, self.size * self.block))
+        return IdLease(self, index, self.start + index * self.block,
+                       self.block, inside)
+
+    def release(self, lease):
+        """Return leased block, can be called many times.
+
+        Args:
+          lease (IdLease): leased range
+
+        Raises:
+          ValueError: lease is not from this allocator
+
+        """
+        if lease.allocator is not self:
+            raise ValueError('%r is not leased from this allocator' % lease)
+        with self._lock:
+            if not lease.released:
+                lease.released = True
+                heapq.heappush(self._free, lease.index)
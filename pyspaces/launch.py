@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""This is part of [pyspaces](https://github.com/Friz-zy/pyspaces)
+
+License: MIT or BSD or Apache 2.0
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+"""
+
+
+import threading
+from multiprocessing import cpu_count
+from .process import Container
+try:
+    import queue
+except ImportError:
+    # python 2
+    import Queue as queue
+
+
+def _launch(specs, parallelism=None, container=Container):
+    """Start containers in worker threads.
+
+    Clone is called with the GIL held, but building of
+    containers, writing of UID and GID maps and waiting
+    on pipes of different children are overlapped.
+
+    Args:
+      specs (list): list of dicts with arguments
+        for Container.__init__
+      parallelism (int): count of worker threads,
+        default is count of cpus
+      container (class): class of containers,
+        default is Container
+
+    Yield:
+      tuple: index of spec and started container
+        as soon as the child is released
+
+    Raises:
+      any exception raised while starting container,
+        after already started containers were yielded
+
+    """
+    tasks = queue.Queue()
+    count = 0
+    for i, spec in enumerate(specs):
+        tasks.put((i, spec))
+        count += 1
+    results = queue.Queue()
+    stop = threading.Event()
+
+    def worker():
+        while not stop.is_set():
+            try:
+                i, spec = tasks.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                c = container(**spec)
+                c.start()
+            except Exception as e:
+                stop.set()
+                results.put((i, None, e))
+            else:
+                results.put((i, c, None))
+
+    threads = []
+    for n in range(min(parallelism or cpu_count(), count)):
+        t = threading.Thread(target=worker)
+        t.daemon = True
+        t.start()
+        threads.append(t)
+
+    error = None
+    try:
+        while count:
+            try:
+                i, c, e = results.get(timeout=0.1)
+            except queue.Empty:
+                if not any(t.is_alive() for t in threads):
+                    # workers were stopped by error
+                    if results.empty():
+                        break
+                continue
+            count -= 1
+            if e is not None:
+                error = error or e
+            else:
+                yield i, c
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+    if error is not None:
+        raise error
+
+def ilaunch_many(specs, parallelism=None, container=Container):
+    """Start many containers in parallel.
+
+    Args:
+      specs (list): list of dicts with arguments
+        for Container.__init__
+      parallelism (int): count of worker threads,
+        default is count of cpus
+      container (class): class of containers,
+        default is Container
+
+    Yield:
+      Container: started container as soon as
+        the child is released, in order of release
+
+    Raises:
+      any exception raised while starting container,
+        after already started containers were yielded
+
+    """
+    for i, c in _launch(specs, parallelism, container):
+        yield c
+
+def launch_many(specs, parallelism=None, container=Container):
+    """Start many containers in parallel.
+
+    If any container can not be started, already
+    started ones are killed and joined.
+
+    Args:
+      specs (list): list of dicts with arguments
+        for Container.__init__
+      parallelism (int): count of worker threads,
+        default is count of cpus
+      container (class): class of containers,
+        default is Container
+
+    Return:
+      list: started containers in order of specs
+
+    Raises:
+      any exception raised while starting container
+
+    """
+    started = {}
+    try:
+        for i, c in _launch(specs, parallelism, container):
+            started[i] = c
+    except Exception:
+        for c in started.values():
+            c.kill()
+            c.join()
+        raise
+    return [started[i] for i in sorted(started)]
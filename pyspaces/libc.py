@@ -13,3 +13,7 @@ from ctypes import *
 
 libc = CDLL(None, use_errno=True)
 """Import libc.so.6 as libc"""
+
+pylibc = PyDLL(None, use_errno=True)
+"""Import libc.so.6 as pylibc, functions are called without
+releasing the GIL"""
@@ -0,0 +1,427 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""This is part of [pyspaces](https://github.com/Friz-zy/pyspaces)
+
+License: MIT or BSD or Apache 2.0
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Declarative mount plan: list of entries executed in order
+with mount(2) and umount2(2) from libc, without `mount` binary.
+
+    Container(target=f, all=True, map_zero=True, mounts=[
+        propagation('/', 'private'),
+        proc('/proc'),
+        tmpfs('/tmp', size='64m'),
+        bind('/srv/data', '/mnt', readonly=True),
+    ])
+
+Paths are resolved before chroot of the container.
+Copy-on-write root shared by many containers:
+
+    Chroot('/run/box', f, overlay=Overlay('/images/base', size='64m'))
+
+
+"""
+
+
+import os
+from .libc import libc, get_errno
+from .spawn import to_bytes
+
+# src: linux/include/uapi/linux/mount.h
+MS_RDONLY = 1
+MS_NOSUID = 2
+MS_NODEV = 4
+MS_NOEXEC = 8
+MS_SYNCHRONOUS = 16
+MS_REMOUNT = 32
+MS_MANDLOCK = 64
+MS_DIRSYNC = 128
+MS_NOATIME = 1024
+MS_NODIRATIME = 2048
+MS_BIND = 4096
+MS_MOVE = 8192
+MS_REC = 16384
+MS_SILENT = 32768
+MS_UNBINDABLE = 1 << 17
+MS_PRIVATE = 1 << 18
+MS_SLAVE = 1 << 19
+MS_SHARED = 1 << 20
+MS_RELATIME = 1 << 21
+MS_STRICTATIME = 1 << 24
+
+MNT_FORCE = 1
+MNT_DETACH = 2
+
+# src: linux/include/uapi/linux/statfs.h
+statvfs_flags = (
+    (1, MS_RDONLY),
+    (2, MS_NOSUID),
+    (4, MS_NODEV),
+    (8, MS_NOEXEC),
+    (16, MS_SYNCHRONOUS),
+    (64, MS_MANDLOCK),
+    (1024, MS_NOATIME),
+    (2048, MS_NODIRATIME),
+    (4096, MS_RELATIME),
+)
+"""ST_* flags of statvfs and their MS_* flags"""
+
+mount_options = {
+    'ro': MS_RDONLY,
+    'nosuid': MS_NOSUID,
+    'nodev': MS_NODEV,
+    'noexec': MS_NOEXEC,
+    'sync': MS_SYNCHRONOUS,
+    'remount': MS_REMOUNT,
+    'dirsync': MS_DIRSYNC,
+    'noatime': MS_NOATIME,
+    'nodiratime': MS_NODIRATIME,
+    'bind': MS_BIND,
+    'rbind': MS_BIND | MS_REC,
+    'move': MS_MOVE,
+    'silent': MS_SILENT,
+    'relatime': MS_RELATIME,
+    'strictatime': MS_STRICTATIME,
+    'unbindable': MS_UNBINDABLE,
+    'runbindable': MS_UNBINDABLE | MS_REC,
+    'private': MS_PRIVATE,
+    'rprivate': MS_PRIVATE | MS_REC,
+    'slave': MS_SLAVE,
+    'rslave': MS_SLAVE | MS_REC,
+    'shared': MS_SHARED,
+    'rshared': MS_SHARED | MS_REC,
+}
+"""Mount options of fstab format and their flags"""
+
+
+def parse_options(value):
+    """Split mount options into flags and data.
+
+    Args:
+      value (str): comma separated options like
+        'ro,nosuid,size=64m', 'rw' and 'defaults'
+        are ignored
+
+    Return:
+      tuple: flags and data for filesystem or None
+
+    """
+    flags = 0
+    data = []
+    for option in (value or '').split(','):
+        option = option.strip()
+        if option in ('', 'rw', 'defaults'):
+            continue
+        if option in mount_options:
+            flags |= mount_options[option]
+        else:
+            data.append(option)
+    return flags, ','.join(data) or None
+
+
+def mount_flags(path):
+    """Return MS_* flags of mount with path.
+
+    Raises:
+      OSError: statvfs failed
+
+    """
+    f_flag = os.statvfs(path).f_flag
+    flags = 0
+    for st, ms in statvfs_flags:
+        if f_flag & st:
+            flags |= ms
+    return flags
+
+
+class MountError(OSError):
+    """Error of mount plan entry."""
+    def __init__(self, err, entry, index=None):
+        OSError.__init__(self, err, '%s: %s' % (entry, os.strerror(err)))
+        self.entry = entry
+        self.index = index
+
+
+class Mount(object):
+    """Entry of mount plan executed with mount(2)."""
+    def __init__(self, target, source='none', fstype=None,
+                 options=None, flags=0, optional=False):
+        """Set arguments of mount.
+
+        Args:
+          target (str): mount point
+          source (str): device, directory or
+            name of filesystem, default is 'none'
+          fstype (str): type of filesystem, default is None
+          options (str): mount options in fstab format,
+            unknown options are passed to filesystem
+          flags (int): additional MS_* flags, default is 0
+          optional (bool): error does not stop the plan,
+            default is False
+
+        """
+        self.target = target
+        self.source = source
+        self.fstype = fstype
+        self.options = options
+        self.flags, self.data = parse_options(options)
+        self.flags |= flags
+        self.optional = optional
+
+    def __repr__(self):
+        return '<%s %s on %s type %s (%s)>' % (
+            self.__class__.__name__, self.source, self.target,
+            self.fstype, self.options or '%#x' % self.flags)
+
+    def mount(self, source, target, fstype, flags, data):
+        """Call mount(2) and return errno or 0."""
+        if libc.mount(to_bytes(source) if source else None,
+                      to_bytes(target),
+                      to_bytes(fstype) if fstype else None,
+                      flags,
+                      to_bytes(data) if data else None) != 0:
+            return get_errno()
+        return 0
+
+    def apply(self):
+        """Execute entry.
+
+        Read-only bind mount is made read-only with
+        second call, flags of the source mount are kept
+        in it, like `mount` does: in user namespace
+        the kernel does not allow to clear them.
+
+        Raises:
+          MountError: mount(2) failed
+
+        """
+        err = self.mount(self.source, self.target, self.fstype,
+                         self.flags, self.data)
+        bind = self.flags & (MS_BIND | MS_REMOUNT) == MS_BIND
+        if not err and bind and self.flags & MS_RDONLY:
+            flags = self.flags | MS_REMOUNT
+            try:
+                flags |= mount_flags(self.target)
+            except OSError as e:
+                err = e.errno
+            else:
+                err = self.mount(None, self.target, None, flags, None)
+        if err:
+            raise MountError(err, self)
+
+
+class Unmount(Mount):
+    """Entry of mount plan executed with umount2(2)."""
+    def __init__(self, target, flags=MNT_DETACH, optional=False):
+        """Set arguments of umount2.
+
+        Args:
+          target (str): mount point
+          flags (int): MNT_* flags, default is MNT_DETACH
+          optional (bool): error does not stop the plan,
+            default is False
+
+        """
+        Mount.__init__(self, target, None, None, None, 0, optional)
+        self.flags = flags
+
+    def __repr__(self):
+        return '<Unmount %s>' % self.target
+
+    def apply(self):
+        """Execute entry.
+
+        Raises:
+          MountError: umount2(2) failed
+
+        """
+        if libc.umount2(to_bytes(self.target), self.flags) != 0:
+            raise MountError(get_errno(), self)
+
+
+class Overlay(Mount):
+    """Entry of mount plan for copy-on-write overlayfs.
+
+    Without upper dir upper and work dirs are created
+    on tmpfs mounted at target and then covered by
+    overlay, so changes are thrown away with mount
+    namespace of the container.
+
+    """
+    def __init__(self, lower, upper=None, work=None, size=None,
+                 target=None, options=None, optional=False):
+        """Set layers of overlay.
+
+        Args:
+          lower (str, list): read-only directory or stack
+            of them from top to bottom, shared by containers
+          upper (str): writable directory of container,
+            default is None: upper on tmpfs
+          work (str): empty directory on the same filesystem
+            as upper, required with upper
+          size (int, str): size limit of tmpfs upper,
+            like '64m', default is None
+          target (str): mount point, Container sets
+            it to rootdir, default is None
+          options (str): additional mount options
+          optional (bool): error does not stop the plan,
+            default is False
+
+        Raises:
+          ValueError: upper without work dir
+
+        """
+        if isinstance(lower, (list, tuple)):
+            lower = ':'.join(lower)
+        if upper and not work:
+            raise ValueError('overlay upper dir requires work dir')
+        self.lower = lower
+        self.upper = upper
+        self.work = work
+        self.size = size
+        Mount.__init__(self, target, 'overlay', 'overlay',
+                       options, 0, optional)
+
+    def apply(self):
+        """Execute entry.
+
+        Raises:
+          MountError: mount(2) or creation
+            of tmpfs upper dir failed
+
+        """
+        upper, work = self.upper, self.work
+        if not upper:
+            upper = os.path.join(self.target, 'upper')
+            work = os.path.join(self.target, 'work')
+            tmpfs(self.target, self.size, 0o755).apply()
+            try:
+                os.mkdir(upper, 0o755)
+                os.mkdir(work, 0o755)
+            except OSError as e:
+                raise MountError(e.errno, self)
+        data = 'lowerdir=%s,upperdir=%s,workdir=%s' % (self.lower, upper, work)
+        if self.data:
+            data += ',' + self.data
+        err = self.mount(self.source, self.target, self.fstype,
+                         self.flags, data)
+        if err:
+            raise MountError(err, self)
+
+
+def proc(target='/proc', options='nosuid,nodev,noexec'):
+    """Return entry for proc filesystem.
+
+    New pid namespace is required to see only its processes.
+
+    """
+    return Mount(target, 'proc', 'proc', options)
+
+def sysfs(target='/sys', options='ro,nosuid,nodev,noexec'):
+    """Return entry for sysfs.
+
+    New network namespace is required
+    in new user namespace.
+
+    """
+    return Mount(target, 'sysfs', 'sysfs', options)
+
+def tmpfs(target, size=None, mode=None, options='nosuid,nodev'):
+    """Return entry for tmpfs.
+
+    Args:
+      target (str): mount point
+      size (int, str): size limit in bytes or
+        with suffix like '64m' or '10%'
+      mode (int): permissions of root directory
+      options (str): additional mount options
+
+    """
+    opts = [options] if options else []
+    if size is not None:
+        opts.append('size=%s' % size)
+    if mode is not None:
+        opts.append('mode=%o' % mode)
+    return Mount(target, 'tmpfs', 'tmpfs', ','.join(opts))
+
+def bind(source, target=None, readonly=False, recursive=True):
+    """Return entry for bind mount.
+
+    Args:
+      source (str): directory or file
+      target (str): mount point, default is source
+      readonly (bool): remount read-only, default is False
+      recursive (bool): bind submounts too, default is True
+
+    """
+    flags = MS_BIND
+    if recursive:
+        flags |= MS_REC
+    if readonly:
+        flags |= MS_RDONLY
+    return Mount(source if target is None else target, source, flags=flags)
+
+def remount(target, options='ro'):
+    """Return entry that changes flags of bind mount.
+
+    Args:
+      target (str): mount point
+      options (str): new mount options,
+        default is 'ro'
+
+    """
+    return Mount(target, None, None, options, MS_REMOUNT | MS_BIND)
+
+def propagation(target='/', kind='private', recursive=True):
+    """Return entry that changes mount propagation.
+
+    Mounts of new mount namespace propagate to the parent
+    one if its root is shared, make it private or slave
+    before other entries.
+
+    Args:
+      target (str): mount point, default is '/'
+      kind (str): 'private', 'slave', 'shared'
+        or 'unbindable', default is 'private'
+      recursive (bool): change submounts too,
+        default is True
+
+    """
+    flags = MS_REC if recursive else 0
+    return Mount(target, None, None, kind, flags)
+
+def umount(target, detach=True):
+    """Return entry for umount2.
+
+    Args:
+      target (str): mount point
+      detach (bool): lazy unmount, default is True
+
+    """
+    return Unmount(target, MNT_DETACH if detach else 0)
+
+def apply(plan):
+    """Execute entries of mount plan in order.
+
+    Args:
+      plan (list): Mount entries
+
+    Return:
+      list: MountError of optional entries
+
+    Raises:
+      MountError: entry failed, error has
+        its entry and index in plan
+
+    """
+    errors = []
+    for index, entry in enumerate(plan):
+        try:
+            entry.apply()
+        except MountError as e:
+            e.index = index
+            if not entry.optional:
+                raise
+            errors.append(e)
+    return errors
@@ -0,0 +1,476 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""This is part of [pyspaces](https://github.com/Friz-zy/pyspaces)
+
+License: MIT or BSD or Apache 2.0
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Minimal rtnetlink client over raw AF_NETLINK socket:
+links up and down, veth pairs, moving of links into
+network namespaces, addresses and routes without `ip`.
+
+Example in `Container.prestart`, called by parent before
+the child is released:
+
+    with RtNetlink() as nl, nl.batch():
+        nl.add_veth('veth0', 'eth0', peer_netns=pid)
+        nl.add_address('veth0', '10.0.0.1/24')
+        nl.link_up('veth0')
+
+"""
+
+
+import os
+import errno
+import socket
+import struct
+from contextlib import contextmanager
+from .libc import libc, get_errno
+from .flags import CLONE_NEWNET
+
+NETLINK_ROUTE = 0
+
+# src: linux/include/uapi/linux/netlink.h
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_MULTI = 0x2
+NLM_F_ACK = 0x4
+NLM_F_REPLACE = 0x100
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+
+# src: linux/include/uapi/linux/rtnetlink.h
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+RT_TABLE_MAIN = 254
+RTPROT_BOOT = 3
+RT_SCOPE_UNIVERSE = 0
+RT_SCOPE_LINK = 253
+RTN_UNICAST = 1
+RTA_DST = 1
+RTA_OIF = 4
+RTA_GATEWAY = 5
+
+# src: linux/include/uapi/linux/if_link.h
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_MTU = 4
+IFLA_LINKINFO = 18
+IFLA_NET_NS_PID = 19
+IFLA_NET_NS_FD = 28
+IFLA_INFO_KIND = 1
+IFLA_INFO_DATA = 2
+VETH_INFO_PEER = 1
+IFF_UP = 0x1
+
+# src: linux/include/uapi/linux/if_addr.h
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+
+NLMSGHDR = struct.Struct('=IHHII')
+NLMSGERR = struct.Struct('=i')
+IFINFOMSG = struct.Struct('=BxHiII')
+IFADDRMSG = struct.Struct('=BBBBI')
+RTMSG = struct.Struct('=BBBBBBBBI')
+RTATTR = struct.Struct('=HH')
+
+
+def align(length):
+    """Round length up to 4 bytes like NLMSG_ALIGN."""
+    return (length + 3) & ~3
+
+def attr(kind, value):
+    """Return rtattr with padding.
+
+    Args:
+      kind (int): type of attribute
+      value (bytes, str, int): payload, str is
+        null-terminated, int is u32
+
+    """
+    if isinstance(value, int):
+        value = struct.pack('=I', value)
+    elif not isinstance(value, bytes):
+        value = value.encode() + b'\0'
+    length = RTATTR.size + len(value)
+    return RTATTR.pack(length, kind) + value + b'\0' * (align(length) - length)
+
+def nested(kind, *attrs):
+    """Return rtattr with nested attributes."""
+    return attr(kind, b''.join(attrs))
+
+def parse_attrs(data):
+    """Return dict of attribute type and payload."""
+    attrs = {}
+    offset = 0
+    while offset + RTATTR.size <= len(data):
+        length, kind = RTATTR.unpack_from(data, offset)
+        if length < RTATTR.size:
+            break
+        attrs[kind] = data[offset + RTATTR.size:offset + length]
+        offset += align(length)
+    return attrs
+
+def parse_address(address):
+    """Parse address with optional prefix length.
+
+    Args:
+      address (str): like '10.0.0.1/24' or 'fd00::1/64'
+
+    Return:
+      tuple: family, packed address and prefix length
+
+    """
+    address, _, prefix = address.partition('/')
+    family = socket.AF_INET6 if ':' in address else socket.AF_INET
+    packed = socket.inet_pton(family, address)
+    prefix = int(prefix) if prefix else len(packed) * 8
+    return family, packed, prefix
+
+def netns_path(netns, proc='/proc'):
+    """Return path to network namespace file of pid or path."""
+    if isinstance(netns, int):
+        return '%s/%d/ns/net' % (proc, netns)
+    return netns
+
+
+class NetlinkError(OSError):
+    """Error returned by kernel for netlink request."""
+
+
+class RtNetlink(object):
+    """Client of NETLINK_ROUTE socket.
+
+    Every request asks for acknowledgement. Requests
+    made inside `batch` block are sent with one send
+    call and their acknowledgements are read together.
+
+    """
+    def __init__(self, netns=None, proc='/proc'):
+        """Open netlink socket.
+
+        Args:
+          netns (int, str): pid of process or path to
+            network namespace file: socket is opened in
+            this namespace, calling thread enters it only
+            for creation of socket, default is current one
+          proc (str): root directory of proc fs,
+            default is '/proc'
+
+        Raises:
+          OSError: can not enter namespace or open socket
+
+        """
+        self.seq = 0
+        self.pending = None
+        self.fds = []
+        if netns is None:
+            self.sock = self.open()
+        else:
+            self.sock = self.open_in(netns_path(netns, proc), proc)
+        self.sock.bind((0, 0))
+
+    @staticmethod
+    def open():
+        """Return new netlink socket in current namespace."""
+        return socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                             NETLINK_ROUTE)
+
+    def open_in(self, path, proc='/proc'):
+        """Return new netlink socket in namespace of path."""
+        own = os.open('%s/thread-self/ns/net' % proc, os.O_RDONLY)
+        try:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                if libc.setns(fd, CLONE_NEWNET) == -1:
+                    e = get_errno()
+                    raise OSError(e, os.strerror(e))
+            finally:
+                os.close(fd)
+            try:
+                return self.open()
+            finally:
+                if libc.setns(own, CLONE_NEWNET) == -1:
+                    e = get_errno()
+                    raise OSError(e, 'Can not return into network '
+                                     'namespace: %s' % os.strerror(e))
+        finally:
+            os.close(own)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close socket."""
+        self.close_fds()
+        self.sock.close()
+
+    def close_fds(self):
+        """Close namespace files of sent requests."""
+        fds, self.fds = self.fds, []
+        for fd in fds:
+            os.close(fd)
+
+    def netns_attr(self, netns):
+        """Return attribute with pid or file of network namespace.
+
+        File is open until request is sent.
+
+        """
+        if isinstance(netns, int):
+            return attr(IFLA_NET_NS_PID, netns)
+        fd = os.open(netns, os.O_RDONLY)
+        self.fds.append(fd)
+        return attr(IFLA_NET_NS_FD, fd)
+
+    @contextmanager
+    def batch(self):
+        """Send requests of block with one call.
+
+        Raises:
+          NetlinkError: first error of requests,
+            other requests are still applied by kernel
+
+        """
+        if self.pending is not None:
+            yield self
+            return
+        self.pending = []
+        try:
+            yield self
+        except Exception:
+            self.pending = None
+            self.close_fds()
+            raise
+        self.flush()
+
+    def flush(self):
+        """Send queued requests and wait for acknowledgements."""
+        pending, self.pending = self.pending, None
+        if pending:
+            try:
+                self.sock.sendall(b''.join(pending))
+            finally:
+                self.close_fds()
+            self.receive(set(range(self.seq - len(pending) + 1,
+                                   self.seq + 1)))
+
+    def request(self, kind, flags, payload, reply=False):
+        """Send request or queue it inside batch.
+
+        Args:
+          kind (int): type of message
+          flags (int): flags besides NLM_F_REQUEST and NLM_F_ACK
+          payload (bytes): message after header
+          reply (bool): return replies, forces flush
+            of batch, default is False
+
+        Return:
+          list: replies as tuples of type and payload
+
+        """
+        self.seq += 1
+        message = NLMSGHDR.pack(NLMSGHDR.size + len(payload), kind,
+                                flags | NLM_F_REQUEST | NLM_F_ACK,
+                                self.seq, 0) + payload
+        if self.pending is not None and not reply:
+            self.pending.append(message)
+            return []
+        if self.pending:
+            # queued requests are sent before this one
+            self.pending.append(message)
+            seqs = set(range(self.seq - len(self.pending) + 1, self.seq + 1))
+            message = b''.join(self.pending)
+            self.pending = []
+        else:
+            seqs = set([self.seq])
+        try:
+            self.sock.sendall(message)
+        finally:
+            self.close_fds()
+        return self.receive(seqs)
+
+    def receive(self, seqs):
+        """Read replies until all seqs are acknowledged.
+
+        Raises:
+          NetlinkError: first error of requests
+
+        """
+        replies = []
+        error = None
+        while seqs:
+            data = self.sock.recv(65536)
+            offset = 0
+            while offset + NLMSGHDR.size <= len(data):
+                length, kind, flags, seq, pid = NLMSGHDR.unpack_from(data, offset)
+                if length < NLMSGHDR.size:
+                    break
+                body = data[offset + NLMSGHDR.size:offset + length]
+                offset += align(length)
+                if kind == NLMSG_ERROR:
+                    code = -NLMSGERR.unpack_from(body)[0]
+                    seqs.discard(seq)
+                    if code and error is None:
+                        error = NetlinkError(code, os.strerror(code))
+                elif kind == NLMSG_DONE:
+                    seqs.discard(seq)
+                else:
+                    replies.append((kind, body))
+        if error is not None:
+            raise error
+        return replies
+
+    def link_index(self, name):
+        """Return index of link by name.
+
+        Flushes queued requests, so link can
+        be created earlier in the same batch.
+
+        Raises:
+          NetlinkError: link does not exist
+
+        """
+        payload = IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+        payload += attr(IFLA_IFNAME, name)
+        for kind, body in self.request(RTM_GETLINK, 0, payload, reply=True):
+            if kind == RTM_NEWLINK:
+                return IFINFOMSG.unpack_from(body)[2]
+        raise NetlinkError(errno.ENODEV, os.strerror(errno.ENODEV))
+
+    def index(self, link):
+        """Return index of link given by name or index."""
+        if isinstance(link, int):
+            return link
+        return self.link_index(link)
+
+    def set_link(self, link, flags=0, change=0, *attrs):
+        """Change existing link given by name or index."""
+        if isinstance(link, int):
+            payload = IFINFOMSG.pack(socket.AF_UNSPEC, 0, link, flags, change)
+        else:
+            payload = IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, flags, change)
+            payload += attr(IFLA_IFNAME, link)
+        self.request(RTM_NEWLINK, 0, payload + b''.join(attrs))
+
+    def link_up(self, link):
+        """Bring link up."""
+        self.set_link(link, IFF_UP, IFF_UP)
+
+    def link_down(self, link):
+        """Bring link down."""
+        self.set_link(link, 0, IFF_UP)
+
+    def set_mtu(self, link, mtu):
+        """Set MTU of link."""
+        self.set_link(link, 0, 0, attr(IFLA_MTU, mtu))
+
+    def set_netns(self, link, netns):
+        """Move link into network namespace.
+
+        Args:
+          link (str, int): name or index of link
+          netns (int, str): pid of process or path
+            to network namespace file
+
+        """
+        self.set_link(link, 0, 0, self.netns_attr(netns))
+
+    def add_veth(self, name, peer, peer_netns=None):
+        """Create veth pair.
+
+        Args:
+          name (str): name of link in current namespace
+          peer (str): name of peer link
+          peer_netns (int, str): pid of process or path to
+            network namespace file for peer link,
+            default is namespace of socket
+
+        """
+        peer_attrs = [attr(IFLA_IFNAME, peer)]
+        if peer_netns is not None:
+            peer_attrs.append(self.netns_attr(peer_netns))
+        payload = IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+        payload += attr(IFLA_IFNAME, name)
+        payload += nested(IFLA_LINKINFO,
+            attr(IFLA_INFO_KIND, 'veth'),
+            nested(IFLA_INFO_DATA,
+                attr(VETH_INFO_PEER,
+                     IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0) +
+                     b''.join(peer_attrs))))
+        self.request(RTM_NEWLINK, NLM_F_CREATE | NLM_F_EXCL, payload)
+
+    def delete_link(self, link):
+        """Delete link given by name or index."""
+        if isinstance(link, int):
+            payload = IFINFOMSG.pack(socket.AF_UNSPEC, 0, link, 0, 0)
+        else:
+            payload = IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+            payload += attr(IFLA_IFNAME, link)
+        self.request(RTM_DELLINK, 0, payload)
+
+    def add_address(self, link, address):
+        """Add address to link.
+
+        Args:
+          link (str, int): name or index of link
+          address (str): address with prefix length,
+            like '10.0.0.1/24'
+
+        """
+        family, packed, prefix = parse_address(address)
+        payload = IFADDRMSG.pack(family, prefix, 0, RT_SCOPE_UNIVERSE,
+                                 self.index(link))
+        payload += attr(IFA_LOCAL, packed) + attr(IFA_ADDRESS, packed)
+        self.request(RTM_NEWADDR, NLM_F_CREATE | NLM_F_EXCL, payload)
+
+    def add_route(self, dst='default', gateway=None, link=None):
+        """Add route into main table.
+
+        Args:
+          dst (str): destination with prefix length,
+            default is 'default'
+          gateway (str): address of gateway, default is None
+          link (str, int): name or index of output link,
+            default is None
+
+        """
+        if dst == 'default':
+            family = socket.AF_INET6 if gateway and ':' in gateway \
+                else socket.AF_INET
+            packed, prefix = None, 0
+        else:
+            family, packed, prefix = parse_address(dst)
+        scope = RT_SCOPE_UNIVERSE if gateway else RT_SCOPE_LINK
+        payload = RTMSG.pack(family, prefix, 0, 0, RT_TABLE_MAIN,
+                             RTPROT_BOOT, scope, RTN_UNICAST, 0)
+        if packed is not None:
+            payload += attr(RTA_DST, packed)
+        if gateway:
+            payload += attr(RTA_GATEWAY, socket.inet_pton(family, gateway))
+        if link is not None:
+            payload += attr(RTA_OIF, self.index(link))
+        self.request(RTM_NEWROUTE, NLM_F_CREATE | NLM_F_EXCL, payload)
+
+
+def loopback_up(netns=None, proc='/proc'):
+    """Bring up loopback link of network namespace.
+
+    Args:
+      netns (int, str): pid of process or path to
+        network namespace file, default is current one
+      proc (str): root directory of proc fs,
+        default is '/proc'
+
+    """
+    with RtNetlink(netns, proc) as nl:
+        nl.link_up('lo')
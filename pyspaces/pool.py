@@ -0,0 +1,981 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""This is part of [pyspaces](https://github.com/Friz-zy/pyspaces)
+
+License: MIT or BSD or Apache 2.0
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+"""
+
+
+import os
+import time
+import select
+import threading
+import traceback
+from collections import deque
+from multiprocessing import Pipe
+from multiprocessing.util import Finalize
+from .process import Container
+from .spec import ContainerSpec
+from .args_aliases import pop
+
+try:
+    import queue
+except ImportError:
+    # python 2
+    import Queue as queue
+
+try:
+    from multiprocessing.connection import wait
+except ImportError:
+    # python 2
+    def wait(objects, timeout=None):
+        """Return objects or descriptors ready for reading."""
+        fds = dict((o if isinstance(o, int) else o.fileno(), o)
+                   for o in objects)
+        return [fds[fd] for fd in select.select(list(fds), [], [],
+                                                timeout)[0]]
+
+
+def _parked(reader, writer):
+    """Target of parked container.
+
+    Wait for the (target, args, kwargs) task
+    from the pool and execute it. Closing the
+    channel or sending None retires the container.
+
+    Args:
+      reader (Connection): read end of task channel
+      writer (Connection): write end of task channel,
+        inherited from parent and closed at once
+
+    Return:
+      Return value of the task or 0
+
+    """
+    writer.close()
+    try:
+        task = reader.recv()
+    except EOFError:
+        return 0
+    finally:
+        reader.close()
+    if task is None:
+        return 0
+    target, args, kwargs = task
+    return target(*args, **kwargs)
+
+def memory_pressure(proc='/proc'):
+    """Return current memory stall and usage in percents.
+
+    Stall is 'some avg10' value of PSI from
+    {proc}/pressure/memory, percent of time
+    when tasks waited for memory. Usage is
+    percent of used memory from {proc}/meminfo.
+
+    Args:
+      proc (str): root directory of proc fs,
+        default is '/proc'
+
+    Return:
+      tuple: stall from 0 to 100 or None if kernel
+        does not support PSI, usage from 0 to 100
+
+    """
+    stall = None
+    try:
+        with open('%s/pressure/memory' % proc) as f:
+            for line in f:
+                if line.startswith('some'):
+                    for field in line.split()[1:]:
+                        key, value = field.split('=')
+                        if key == 'avg10':
+                            stall = float(value)
+    except (IOError, OSError):
+        pass
+    info = {}
+    with open('%s/meminfo' % proc) as f:
+        for line in f:
+            key, value = line.split(':', 1)
+            info[key] = int(value.split()[0])
+    total = info.get('MemTotal', 0)
+    if not total:
+        return stall, 0.0
+    available = info.get('MemAvailable', info.get('MemFree', 0))
+    return stall, 100.0 * (total - available) / total
+
+
+class ContainerPool(object):
+    """Pool of pre-cloned containers.
+
+    Containers are created with the same arguments,
+    pass preup, daemonize, chroot, chdir and chtty
+    steps and wait for the target in parked state.
+    `submit` sends the target over a pipe to one of
+    them, so dispatch costs only one write.
+
+    The pool is refilled in background thread and
+    retires idle containers under memory pressure.
+
+    """
+    def __init__(self, size, *args, **kwargs):
+        """Set pool parameters and start refilling.
+
+        Args:
+          size (int): count of parked containers
+          *args (list): arguments for Container.__init__
+          **kwargs (dict): arguments for Container.__init__
+            except target, args and kwargs
+          min_size (int): count of parked containers
+            that are kept under memory pressure,
+            default is 0
+          pressure (float): percent of used memory,
+            see `memory_pressure`, after which idle
+            containers are retired, default is 90.0
+          stall (float): percent of time stalled on
+            memory by PSI, after which idle containers
+            are retired, ignored without PSI,
+            default is 10.0
+          interval (float): seconds between memory
+            pressure checks, default is 1.0
+          container (class): class of containers,
+            default is Container
+
+        Raises:
+          ValueError: target specified for the pool
+
+        """
+        args = list(args)
+        if 'target' in kwargs:
+            raise ValueError('Target should be passed to submit')
+        self.size = size
+        self.min_size = pop('min_size', args, kwargs, 0)
+        self.pressure = pop('pressure', args, kwargs, 90.0)
+        self.stall = pop('stall', args, kwargs, 10.0)
+        self.interval = pop('interval', args, kwargs, 1.0)
+        self.container = pop('container', args, kwargs, Container)
+        self.proc = kwargs.get('proc', '/proc')
+        self.args = args
+        self.kwargs = kwargs
+
+        self._parked = deque()
+        self._retired = []
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._refill)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        self.join()
+
+    def __len__(self):
+        """Return count of parked containers."""
+        return len(self._parked)
+
+    def _spawn(self):
+        """Create and start one parked container.
+
+        Return:
+          tuple: container and write end of its channel
+
+        """
+        reader, writer = Pipe(duplex=False)
+        kwargs = dict(self.kwargs)
+        kwargs['target'] = _parked
+        kwargs['args'] = (reader, writer)
+        c = self.container(*self.args, **kwargs)
+        try:
+            c.start()
+        finally:
+            reader.close()
+        return c, writer
+
+    def _retire(self, count):
+        """Send stop signal to `count` idle containers."""
+        for i in range(count):
+            with self._cond:
+                if not self._parked:
+                    return
+                c, writer = self._parked.popleft()
+            try:
+                writer.send(None)
+            except (IOError, OSError):
+                pass
+            writer.close()
+            self._retired.append(c)
+
+    def _refill(self):
+        """Keep `size` containers parked.
+
+        Executed in background thread.
+
+        """
+        while True:
+            with self._cond:
+                while (not self._closed and
+                       len(self._parked) >= self.size):
+                    self._cond.wait(self.interval)
+                    if self._under_pressure():
+                        break
+                if self._closed:
+                    return
+            if self._under_pressure():
+                self._retire(len(self._parked) - self.min_size)
+                self._reap()
+                with self._cond:
+                    self._cond.wait(self.interval)
+                continue
+            self._reap()
+            c = self._spawn()
+            with self._cond:
+                if self._closed:
+                    self._parked.append(c)
+                    return
+                self._parked.append(c)
+                self._cond.notify_all()
+
+    def _under_pressure(self):
+        """Check memory pressure, see `memory_pressure`."""
+        try:
+            stall, used = memory_pressure(self.proc)
+        except (IOError, OSError, ValueError):
+            return False
+        if stall is not None and stall >= self.stall:
+            return True
+        return used >= self.pressure
+
+    def _reap(self):
+        """Join retired containers that have exited."""
+        for c in self._retired[:]:
+            if c.exitcode is not None:
+                c.join()
+                self._retired.remove(c)
+
+    def submit(self, target, args=(), kwargs={}):
+        """Execute target in one of parked containers.
+
+        If there are no parked containers,
+        new one will be created in the
+        current thread.
+
+        Args:
+          target (callable object): picklable callable
+            object to be invoked in the container
+          args (tuple): argument tuple for the target,
+            default is ()
+          kwargs (dict): dict of keyword arguments
+            for the target, default is {}
+
+        Return:
+          Container: started container executing target,
+            should be joined by caller
+
+        Raises:
+          ValueError: pool is closed
+
+        """
+        if self._closed:
+            raise ValueError('Pool is closed')
+        with self._cond:
+            if self._parked:
+                c, writer = self._parked.popleft()
+            else:
+                c = None
+            self._cond.notify_all()
+        if c is None:
+            c, writer = self._spawn()
+        try:
+            writer.send((target, args, kwargs))
+        finally:
+            writer.close()
+        return c
+
+    def close(self):
+        """Stop refilling and retire all parked containers."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._retire(len(self._parked))
+
+    def join(self):
+        """Wait for all retired containers."""
+        for c in self._retired:
+            c.join()
+        self._retired = []
+
+
+class WorkerLostError(RuntimeError):
+    """Worker of NamespacePool exited while executing task."""
+
+
+def _serve(conn, other, maxtasks=None):
+    """Target of worker of NamespacePool.
+
+    Receive (job, index, func, items, star) tasks,
+    execute func for every item and send back
+    (job, index, values, errors) with exceptions
+    of failed items by their offset in errors. Exit on None, after
+    maxtasks tasks or when the pool process exits.
+
+    Args:
+      conn (Connection): child end of the pipe
+      other (Connection): parent end of the pipe,
+        inherited from parent and closed at once
+      maxtasks (int): tasks before exit,
+        default is None: no limit
+
+    """
+    other.close()
+    parent = os.getppid()
+    done = 0
+    try:
+        while maxtasks is None or done < maxtasks:
+            while not conn.poll(1.0):
+                if os.getppid() != parent:
+                    return
+            try:
+                task = conn.recv()
+            except EOFError:
+                return
+            if task is None:
+                return
+            job, index, func, items, star = task
+            values = []
+            errors = {}
+            for item in items:
+                try:
+                    values.append(func(*item) if star else func(item))
+                except Exception as e:
+                    errors[len(values)] = e
+                    values.append(None)
+            try:
+                conn.send((job, index, values, errors))
+            except Exception as e:
+                # result or exception can not be pickled
+                conn.send((job, index, [None] * len(items),
+                           _failed(items, 'Can not send result: %r' % e)))
+            done += 1
+    finally:
+        conn.close()
+
+
+class AsyncResult(object):
+    """Result of apply_async and map_async of NamespacePool."""
+    def __init__(self, chunks, count, callback=None, error_callback=None,
+                 single=False):
+        """Set expected count of chunks and values.
+
+        Args:
+          chunks (int): count of chunks
+          count (int): count of values
+          callback (callable): called with value
+            in pool thread on success, pool lock
+            is not held and its exceptions are printed
+          error_callback (callable): called with
+            exception in pool thread on failure
+          single (bool): result is one value
+            instead of list, default is False
+
+        """
+        self._chunks = chunks
+        self._values = [None] * count
+        self._offsets = {}
+        self._callback = callback
+        self._error_callback = error_callback
+        self._single = single
+        self._error = None
+        self._event = threading.Event()
+        if not chunks:
+            self._finish()
+
+    def _set(self, index, values, errors):
+        """Save results of chunk, called by pool thread.
+
+        Return:
+          bool: True if all chunks are done
+            and _finish should be called
+
+        """
+        offset = self._offsets.get(index, index)
+        self._values[offset:offset + len(values)] = values
+        if errors and self._error is None:
+            self._error = errors[min(errors)]
+        self._chunks -= 1
+        return not self._chunks
+
+    def _finish(self):
+        """Mark result ready and call callbacks."""
+        self._event.set()
+        try:
+            if self._error is not None:
+                if self._error_callback is not None:
+                    self._error_callback(self._error)
+            elif self._callback is not None:
+                self._callback(self._value())
+        except Exception:
+            traceback.print_exc()
+
+    def _value(self):
+        return self._values[0] if self._single else self._values
+
+    def ready(self):
+        """Return True if all chunks are done."""
+        return self._event.is_set()
+
+    def successful(self):
+        """Return True if no task raised exception.
+
+        Raises:
+          ValueError: result is not ready
+
+        """
+        if not self.ready():
+            raise ValueError('Result is not ready')
+        return self._error is None
+
+    def wait(self, timeout=None):
+        """Wait until result is ready."""
+        self._event.wait(timeout)
+
+    def get(self, timeout=None):
+        """Return value or list of values.
+
+        Raises:
+          multiprocessing.TimeoutError: result is not ready
+          any exception raised by task
+
+        """
+        self.wait(timeout)
+        if not self.ready():
+            from multiprocessing import TimeoutError
+            raise TimeoutError('Result is not ready')
+        if self._error is not None:
+            raise self._error
+        return self._value()
+
+
+class IMapIterator(object):
+    """Iterator over results of imap and imap_unordered."""
+    def __init__(self, chunks, ordered=True):
+        self._chunks = chunks
+        self._ordered = ordered
+        self._ready = {}
+        self._next = 0
+        self._items = deque()
+        self._cond = threading.Condition(threading.Lock())
+
+    def __iter__(self):
+        return self
+
+    def _set(self, index, values, errors):
+        """Save results of chunk, called by pool thread."""
+        results = [(i not in errors, errors.get(i, v))
+                   for i, v in enumerate(values)]
+        with self._cond:
+            if self._ordered:
+                self._ready[index] = results
+                while self._next in self._ready:
+                    self._items.extend(self._ready.pop(self._next))
+                    self._next += 1
+            else:
+                self._items.extend(results)
+            self._chunks -= 1
+            self._cond.notify_all()
+
+    def next(self, timeout=None):
+        """Return next value.
+
+        Raises:
+          StopIteration: all values are returned
+          multiprocessing.TimeoutError: value is not ready
+          any exception raised by task
+
+        """
+        with self._cond:
+            while not self._items:
+                if not self._chunks:
+                    raise StopIteration
+                if not self._cond.wait(timeout) and timeout is not None:
+                    if not self._items:
+                        from multiprocessing import TimeoutError
+                        raise TimeoutError('Value is not ready')
+            success, value = self._items.popleft()
+        if not success:
+            raise value
+        return value
+
+    __next__ = next
+
+
+class _Worker(object):
+    """Worker container of NamespacePool and its tasks in flight."""
+    def __init__(self, container, conn, quota):
+        self.container = container
+        self.conn = conn
+        self.quota = quota
+        self.inflight = deque()
+        self.retiring = False
+        self.started = False
+        self.child = None
+        self.idle_since = time.time()
+
+    def capacity(self, prefetch):
+        """Return count of tasks that can be sent."""
+        if self.retiring:
+            return 0
+        free = prefetch - len(self.inflight)
+        if self.quota is not None:
+            free = min(free, self.quota)
+        return max(free, 0)
+
+
+class NamespacePool(object):
+    """Pool of long-lived worker containers.
+
+    Workers are created from one ContainerSpec, so they
+    share namespaces flags, chroot and id maps, and
+    execute many tasks each, like `multiprocessing.Pool`.
+    Items are sent in chunks, every worker has up to
+    prefetch chunks in flight. Chunks are written by
+    sender thread, so pool thread always reads results
+    and big chunks and results can not block each other.
+    Sender thread starts new workers too, so they are not
+    cloned while it pickles chunks.
+    Pool grows from min_processes to processes when tasks
+    wait in queue and shrinks back when workers are idle
+    for idle_timeout seconds.
+
+        with NamespacePool(4, newpid=True, rootdir='/srv/box') as pool:
+            results = pool.map(f, items)
+
+    """
+    def __init__(self, processes=None, *args, **kwargs):
+        """Set pool parameters and start workers.
+
+        Args:
+          processes (int): maximal count of workers,
+            default is count of available CPUs
+          *args (list): arguments for Container.__init__
+          **kwargs (dict): arguments for Container.__init__
+            except target, args and kwargs
+          min_processes (int): count of workers kept
+            without tasks, default is processes
+          maxtasksperchild (int): tasks executed by
+            worker before it is replaced, default is None
+          idle_timeout (float): seconds before idle worker
+            above min_processes exits, default is 5.0
+          prefetch (int): chunks in flight per worker,
+            default is 2
+          container (class): class of containers,
+            default is Container
+
+        Raises:
+          ValueError: target specified for the pool
+
+        """
+        args = list(args)
+        if 'target' in kwargs:
+            raise ValueError('Target should be passed to pool methods')
+        if processes is None:
+            processes = _cpu_count()
+        self.processes = processes
+        self.min_processes = pop('min_processes', args, kwargs, processes)
+        self.maxtasksperchild = pop('maxtasksperchild', args, kwargs, None)
+        self.idle_timeout = pop('idle_timeout', args, kwargs, 5.0)
+        self.prefetch = pop('prefetch', args, kwargs, 2)
+        container = pop('container', args, kwargs, Container)
+        if args:
+            raise ValueError('Container arguments should be passed by name')
+        self.spec = ContainerSpec(container, **kwargs)
+
+        self._workers = []
+        self._tasks = deque()
+        self._jobs = {}
+        self._finished = []
+        self._counter = 0
+        self._state = 'run'
+        self._lock = threading.Lock()
+        self._wakeup = os.pipe()
+        self._outbox = queue.Queue()
+        self._sender = None
+        for i in range(self.min_processes):
+            self._spawn()
+        self._sender = threading.Thread(target=self._send,
+                                        name='pyspaces-pool-sender')
+        self._sender.daemon = True
+        self._sender.start()
+        self._thread = threading.Thread(target=self._manage,
+                                        name='pyspaces-pool')
+        self._thread.daemon = True
+        self._thread.start()
+        # workers exit only with parent, so pool is
+        # terminated before multiprocessing joins them
+        self._finalizer = Finalize(self, self.terminate, exitpriority=15)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.terminate()
+
+    def __len__(self):
+        """Return count of workers."""
+        return len(self._workers)
+
+    def _spawn(self):
+        """Add one worker.
+
+        Its container is started at once before
+        sender thread runs, then by sender thread
+        before chunks sent to the worker.
+
+        """
+        conn, child = Pipe()
+        c = self.spec.spawn(_serve, (child, conn, self.maxtasksperchild))
+        worker = _Worker(c, conn, self.maxtasksperchild)
+        worker.child = child
+        self._workers.append(worker)
+        if self._sender is None:
+            self._start(worker)
+        else:
+            self._outbox.put((worker, _START))
+
+    def _start(self, worker):
+        """Start container of worker."""
+        try:
+            worker.container.start()
+        finally:
+            worker.child.close()
+            worker.child = None
+        worker.started = True
+
+    def _launch(self, worker):
+        """Start worker in sender thread, fail its tasks on error."""
+        with self._lock:
+            if self._state == 'closed':
+                message = 'Pool terminated'
+            else:
+                try:
+                    self._start(worker)
+                    message = None
+                except Exception as e:
+                    message = 'Worker can not be started: %s' % e
+            if message is not None:
+                self._workers.remove(worker)
+                worker.conn.close()
+                if worker.child is not None:
+                    worker.child.close()
+                for job_id, index, func, items, star in worker.inflight:
+                    self._done(job_id, index, [None] * len(items),
+                               _failed(items, message))
+                worker.inflight.clear()
+        self._finish_jobs()
+        self._wake()
+
+    def _wake(self):
+        """Wake up pool thread."""
+        if self._wakeup:
+            os.write(self._wakeup[1], b'\0')
+
+    def _submit(self, job, func, chunks, star):
+        """Queue chunks of job.
+
+        Args:
+          job (AsyncResult, IMapIterator): result of chunks
+          func (callable): picklable function
+          chunks (list): lists of items
+          star (bool): items are tuples of arguments
+
+        """
+        with self._lock:
+            if self._state != 'run':
+                raise ValueError('Pool is not running')
+            self._counter += 1
+            self._jobs[self._counter] = [job, len(chunks)]
+            for index, items in enumerate(chunks):
+                self._tasks.append((self._counter, index, func, items, star))
+        self._wake()
+        return job
+
+    def _done(self, job_id, index, values, errors):
+        """Pass results of chunk to job, lock is held.
+
+        Finished jobs are queued for _finish_jobs.
+
+        """
+        entry = self._jobs.get(job_id)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if not entry[1]:
+            del self._jobs[job_id]
+        if entry[0]._set(index, values, errors):
+            self._finished.append(entry[0])
+
+    def _finish_jobs(self):
+        """Call callbacks of finished jobs, lock is not held."""
+        with self._lock:
+            jobs, self._finished = self._finished, []
+        for job in jobs:
+            job._finish()
+
+    def _dispatch(self):
+        """Send queued tasks to workers, lock is held."""
+        for worker in self._workers:
+            while self._tasks and worker.capacity(self.prefetch):
+                task = self._tasks.popleft()
+                self._outbox.put((worker, task))
+                worker.inflight.append(task)
+                if worker.quota is not None:
+                    worker.quota -= 1
+        live = [w for w in self._workers
+                if not w.retiring and (w.quota is None or w.quota > 0)]
+        if self._state == 'run' and len(live) < self.min_processes:
+            # replace workers exited after maxtasksperchild
+            self._spawn()
+            self._dispatch()
+        elif self._tasks and len(live) < self.processes and \
+                not any(w.capacity(self.prefetch) for w in live):
+            self._spawn()
+            self._dispatch()
+
+    def _shrink(self):
+        """Stop workers above min_processes idle too long, lock is held."""
+        now = time.time()
+        live = [w for w in self._workers if not w.retiring]
+        for worker in live[self.min_processes:]:
+            if worker.inflight:
+                worker.idle_since = now
+            elif now - worker.idle_since > self.idle_timeout:
+                self._retire(worker)
+
+    def _retire(self, worker):
+        """Send stop message to worker."""
+        worker.retiring = True
+        self._outbox.put((worker, None))
+
+    def _send(self):
+        """Main loop of sender thread."""
+        while True:
+            item = self._outbox.get()
+            if item is None:
+                return
+            worker, task = item
+            if task is _START:
+                self._launch(worker)
+                continue
+            try:
+                worker.conn.send(task)
+            except (IOError, OSError):
+                # worker is dead, its tasks fail on reap
+                pass
+            except Exception as e:
+                # task can not be pickled
+                with self._lock:
+                    if task in worker.inflight:
+                        worker.inflight.remove(task)
+                        if worker.quota is not None:
+                            worker.quota += 1
+                        items = task[3]
+                        self._done(task[0], task[1], [None] * len(items),
+                                   dict.fromkeys(range(len(items)), e))
+                self._finish_jobs()
+                self._wake()
+
+    def _receive(self, worker):
+        """Read results of worker, lock is held.
+
+        Return:
+          bool: False if pipe is closed
+
+        """
+        try:
+            while worker.conn.poll():
+                job_id, index, values, errors = worker.conn.recv()
+                worker.inflight.popleft()
+                worker.idle_since = time.time()
+                self._done(job_id, index, values, errors)
+        except (EOFError, IOError, OSError):
+            return False
+        return True
+
+    def _reap(self, worker):
+        """Remove exited worker and fail its tasks, lock is held."""
+        self._receive(worker)
+        self._workers.remove(worker)
+        worker.container.join()
+        message = 'Worker exited with code %s' % worker.container.exitcode
+        worker.container.close()
+        worker.conn.close()
+        for job_id, index, func, items, star in worker.inflight:
+            self._done(job_id, index, [None] * len(items),
+                       _failed(items, message))
+
+    def _manage(self):
+        """Main loop of pool thread."""
+        while True:
+            with self._lock:
+                workers = list(self._workers)
+                if self._state == 'close' and not self._jobs:
+                    self._state = 'closed'
+                    for worker in workers:
+                        self._retire(worker)
+                if self._state == 'closed' and not self._workers:
+                    return
+            objects = [self._wakeup[0]]
+            for worker in workers:
+                objects.append(worker.conn)
+                if worker.started:
+                    objects.append(worker.container.sentinel)
+            ready = wait(objects, self.idle_timeout / 2.0)
+            with self._lock:
+                if self._wakeup[0] in ready:
+                    os.read(self._wakeup[0], 4096)
+                for worker in workers:
+                    if worker.conn in ready:
+                        self._receive(worker)
+                    if worker.started and \
+                            worker.container.sentinel in ready:
+                        self._reap(worker)
+                if self._state in ('run', 'close'):
+                    self._dispatch()
+                    self._shrink()
+            self._finish_jobs()
+
+    def apply_async(self, func, args=(), kwds={}, callback=None,
+                    error_callback=None):
+        """Execute func(*args, **kwds) in worker.
+
+        Return:
+          AsyncResult: result of call
+
+        """
+        job = AsyncResult(1, 1, callback, error_callback, single=True)
+        return self._submit(job, _call, [[(func, args, kwds)]], True)
+
+    def apply(self, func, args=(), kwds={}):
+        """Execute func(*args, **kwds) in worker and return result."""
+        return self.apply_async(func, args, kwds).get()
+
+    def _chunks(self, iterable, chunksize):
+        """Split items into chunks, default size is like in Pool.map."""
+        items = list(iterable)
+        if chunksize is None:
+            chunksize, extra = divmod(len(items), self.processes * 4)
+            if extra:
+                chunksize += 1
+        chunksize = max(chunksize, 1)
+        return [items[i:i + chunksize]
+                for i in range(0, len(items), chunksize)], chunksize
+
+    def map_async(self, func, iterable, chunksize=None, callback=None,
+                  error_callback=None, star=False):
+        """Apply func to every item in workers.
+
+        Args:
+          func (callable): picklable function
+          iterable (iterable): items
+          chunksize (int): items sent at once,
+            default is len / (processes * 4)
+          callback, error_callback (callable):
+            see AsyncResult
+          star (bool): items are tuples of
+            arguments, default is False
+
+        Return:
+          AsyncResult: result with list of values
+
+        """
+        chunks, chunksize = self._chunks(iterable, chunksize)
+        job = AsyncResult(len(chunks), sum(len(c) for c in chunks),
+                          callback, error_callback)
+        job._offsets = dict((i, i * chunksize) for i in range(len(chunks)))
+        return self._submit(job, func, chunks, star)
+
+    def map(self, func, iterable, chunksize=None):
+        """Return list of func applied to every item."""
+        return self.map_async(func, iterable, chunksize).get()
+
+    def starmap(self, func, iterable, chunksize=None):
+        """Return list of func applied to every tuple of arguments."""
+        return self.map_async(func, iterable, chunksize, star=True).get()
+
+    def imap(self, func, iterable, chunksize=1):
+        """Return iterator over func applied to every item in order."""
+        chunks, chunksize = self._chunks(iterable, chunksize)
+        return self._submit(IMapIterator(len(chunks)), func, chunks, False)
+
+    def imap_unordered(self, func, iterable, chunksize=1):
+        """Return iterator over func applied to every item
+        in order of completion."""
+        chunks, chunksize = self._chunks(iterable, chunksize)
+        return self._submit(IMapIterator(len(chunks), False),
+                            func, chunks, False)
+
+    def close(self):
+        """Stop accepting tasks, workers exit after queued ones."""
+        with self._lock:
+            if self._state == 'run':
+                self._state = 'close'
+        self._wake()
+
+    def terminate(self):
+        """Kill workers and fail unfinished tasks."""
+        with self._lock:
+            self._state = 'closed'
+            while self._tasks:
+                job_id, index, func, items, star = self._tasks.popleft()
+                self._done(job_id, index, [None] * len(items),
+                           _failed(items, 'Pool terminated'))
+            for worker in self._workers:
+                worker.retiring = True
+                if worker.started:
+                    worker.container.kill()
+        self._finish_jobs()
+        self._wake()
+        self.join()
+
+    def join(self):
+        """Wait for exit of workers after close or terminate.
+
+        Raises:
+          ValueError: pool is running
+
+        """
+        if self._state == 'run':
+            raise ValueError('Pool is running')
+        self._thread.join()
+        self._outbox.put(None)
+        self._sender.join()
+        wakeup, self._wakeup = self._wakeup, ()
+        for fd in wakeup:
+            os.close(fd)
+        self._finalizer.cancel()
+
+
+_START = 'start'
+"""Message of sender thread to start worker"""
+
+def _failed(items, message):
+    """Return errors of all items of chunk."""
+    error = WorkerLostError(message)
+    return dict.fromkeys(range(len(items)), error)
+
+def _call(func, args, kwds):
+    """Execute task of apply_async."""
+    return func(*args, **kwds)
+
+def _cpu_count():
+    """Return count of CPUs available for the process."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        import multiprocessing
+        return multiprocessing.cpu_count()
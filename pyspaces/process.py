@@ -10,16 +10,36 @@ Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
 
 import os
 import sys
-from .setns import setns
+import errno
+from .setns import NamespaceCache, resolve, enter, has_pidfd_setns
 from . import cloning as cl
-if sys.version_info >= (3,0):
-    from inspect import signature
-else:
-    from inspect import getargspec
-from multiprocessing import Process
+from .spawn import ExecPlan
+import threading
+from multiprocessing import Process, Pipe
 from .args_aliases import na, ca, get, get_all, pop, pop_all
 
 
+_process_params = None
+
+def process_params():
+    """Return names of arguments of Process.__init__.
+
+    Process.__init__ is inspected once, inspect
+    module is imported only on first call.
+
+    """
+    global _process_params
+    if _process_params is None:
+        if sys.version_info >= (3,0):
+            from inspect import signature
+            params = signature(Process.__init__).parameters
+        else:
+            from inspect import getargspec
+            params = getargspec(Process.__init__).args
+        _process_params = tuple(params)
+    return _process_params
+
+
 class Container(Process):
     """Class wrapper over `multiprocessing.Process`.
 
@@ -74,6 +94,8 @@ class Container(Process):
             "0 1000 1,1 1001 1" or "1000,1001"
             will map 1000 as root and 1001 as uid 1.
             list: list of int or str
+            IdLease: leased range of ids, released
+            when container is joined
             default is ""
           gid_map (bool, int, str, list): GID mapping
             for new namespace, format the same as uid_map,
@@ -132,8 +154,81 @@ class Container(Process):
           io (bool): set CLONE_IO flag,
             default is False
           flags (int): flags for clone, default is 0
+          stack_size (int): size of stack for cloned child,
+            default is cloning.STACK_SIZE
+          timings (bool): measure durations of startup
+            phases, see Container.timings,
+            default is False
+          exec_argv (list): execute program with args
+            instead of target: child skips python
+            bootstrap and runup and only changes root,
+            working dir and stdio before execve,
+            default is None
+          exec_env (dict): environment of program
+            executed by exec_argv, default is os.environ
+          loopback (bool): bring up loopback link
+            of new network namespace before target,
+            default is False
+          mounts (list): mount plan executed before preup,
+            entries of pyspaces.mount like proc('/proc'),
+            paths are resolved before chroot,
+            default is None
+          overlay (str, list, Overlay): read-only lower
+            rootfs or stack of them mounted with overlayfs
+            at rootdir before mounts, upper is on tmpfs
+            if it is not set in Overlay, requires newns,
+            default is None
+          cgroup (dict, bool): limits of cgroup v2 like
+            {'memory.max': 2 ** 30}, child is added into
+            new cgroup before it is released, cgroup is
+            removed after exit, see Container.cgroup,
+            default is None
+          cgroup_root (str): root of cgroup v2 hierarchy,
+            default is cgroup.CGROUP_ROOT
+          cpus (list, str): CPU affinity like [0, 1]
+            or '0-3,8', default is None
+          numa (list, str, int): NUMA nodes: CPUs of nodes
+            and memory binding, memory of exec containers
+            is not bound, default is None
+          sched (str, int): scheduling policy 'other',
+            'batch', 'idle', 'fifo' or 'rr', default is None
+          priority (int): static priority 1..99 of
+            'fifo' and 'rr' policies, default is None
+          nice (int): nice value, default is None
+          ioprio (str, tuple): I/O priority 'idle' or class
+            and level like ('be', 7), default is None
+          capture (bool, dict): capture stdout and stderr
+            into bounded buffers drained by one reader thread,
+            dict is arguments of capture.Capture like size and
+            overflow, see Container.capture, default is False
+          forward (str, int, fo, Forward, dict): move
+            stdout and stderr into file or socket with
+            splice, dict sets 'stdout' and 'stderr' apart,
+            see capture.Capture, default is None
+          result (bool): send return value or exception
+            of target to parent, see Container.result,
+            not supported with daemonize, default is False
+          save (str): name under which new namespaces
+            are saved by parent before the child is
+            released, they outlive the container,
+            see registry.NamespaceRegistry, default is None
+          join (str, dict): name of saved namespaces
+            or dict of namespace and name like
+            {'net': 'web'}, child enters them before
+            preup instead of creating new ones, joined
+            pid namespace applies to children of target,
+            default is None
+          state_dir (str): directory of saved namespaces,
+            default is registry.STATE_DIR
+          init (bool): run minimal init before target:
+            it reaps orphaned descendants, forwards
+            termination signals to process group of
+            target and exits with its exit code or
+            128 + signal, without newpid it becomes
+            child subreaper, default is False
 
         """
+        self.reset()
         self.args = args
         self.kwargs = kwargs
         self.kwargs['args'] = kwargs.get('args', ())
@@ -144,6 +239,8 @@ class Container(Process):
         self.gid_map = pop('gid_map', args, kwargs, "")
         self.map_zero = pop('map_zero', args, kwargs, False)
         self.proc = kwargs.get('proc', '/proc')
+        self.stack_size = pop('stack_size', args, kwargs, cl.STACK_SIZE)
+        self.timed = pop('timings', args, kwargs, False)
 
         self.kwargs['proc'] = self.proc
         self.kwargs['rootdir'] = kwargs.get('rootdir', None)
@@ -154,6 +251,46 @@ class Container(Process):
             else:
                 self.kwargs['workdir'] = os.getcwd()
         self.kwargs['daemonize'] = pop('daemonize', args, kwargs, False)
+        self.kwargs['loopback'] = pop('loopback', args, kwargs, False)
+        self.kwargs['cgroup'] = pop('cgroup', args, kwargs, None)
+        self.kwargs['cgroup_root'] = pop('cgroup_root', args, kwargs, None)
+        self.kwargs['capture'] = pop('capture', args, kwargs, False)
+        self.kwargs['forward'] = pop('forward', args, kwargs, None)
+        self.kwargs['result'] = pop('result', args, kwargs, False)
+        if self.kwargs['result'] and self.kwargs['daemonize']:
+            # container exits before its daemon sends result
+            raise ValueError('result is not supported with daemonize')
+        self.placement = None
+        placement = {}
+        for k in ('cpus', 'numa', 'sched', 'priority', 'nice', 'ioprio'):
+            value = pop(k, args, kwargs, None)
+            if value is not None:
+                placement[k] = value
+        if placement:
+            from .sched import Placement
+            self.placement = Placement(**placement)
+        self.kwargs['save'] = pop('save', args, kwargs, None)
+        self.kwargs['join'] = pop('join', args, kwargs, None)
+        self.kwargs['state_dir'] = pop('state_dir', args, kwargs, None)
+        self.kwargs['init'] = pop('init', args, kwargs, False)
+        if self.kwargs['join']:
+            self.kwargs['join'] = self.resolve_join(self.kwargs['join'])
+        self.kwargs['mounts'] = pop('mounts', args, kwargs, None)
+        overlay = pop('overlay', args, kwargs, None)
+        if overlay:
+            from .mount import Overlay, propagation
+            if not isinstance(overlay, Overlay):
+                overlay = Overlay(overlay)
+            if overlay.target is None:
+                if not self.kwargs['rootdir']:
+                    raise ValueError('overlay requires rootdir')
+                # copy, overlay can be shared by containers
+                overlay = Overlay(overlay.lower, overlay.upper, overlay.work,
+                                  overlay.size, self.kwargs['rootdir'],
+                                  overlay.options, overlay.optional)
+            # overlay must not propagate into parent namespace
+            self.kwargs['mounts'] = [propagation('/', 'private'), overlay] + \
+                list(self.kwargs['mounts'] or [])
         self.kwargs['stdin'] = kwargs.get('stdin', None)
         if self.kwargs['stdin'] in (None, False) and self.kwargs['daemonize']:
             self.kwargs['stdin'] = '/dev/null'
@@ -164,6 +301,23 @@ class Container(Process):
         if self.kwargs['stderr'] in (None, False) and self.kwargs['daemonize']:
             self.kwargs['stderr'] = '/dev/null'
 
+        self.exec_plan = None
+        exec_argv = pop('exec_argv', args, kwargs, None)
+        exec_env = pop('exec_env', args, kwargs, None)
+        if exec_argv:
+            for k in ('daemonize', 'mounts', 'result', 'join', 'init'):
+                if self.kwargs[k]:
+                    raise ValueError('%s is not supported with exec_argv' % k)
+            workdir = self.kwargs['workdir']
+            if not self.kwargs['rootdir'] and workdir == os.getcwd():
+                workdir = None
+            self.exec_plan = ExecPlan(
+                exec_argv, exec_env,
+                rootdir=self.kwargs['rootdir'], workdir=workdir,
+                stdin=self.kwargs['stdin'], stdout=self.kwargs['stdout'],
+                stderr=self.kwargs['stderr'],
+            )
+
         # clear args and move all specific args to kwargs
         kwargs['all'] = pop('all', args, kwargs, False)
 
@@ -179,6 +333,16 @@ class Container(Process):
             if value:
                 self.clone_flags |= na[ns]['flag']
 
+        # joined namespaces replace new ones
+        for ns in self.kwargs['join'] or ():
+            self.clone_flags &= ~na[ns]['flag']
+        if self.kwargs['save'] and not self.clone_flags & sum(
+                na[ns]['flag'] for ns in na):
+            raise ValueError('save requires new namespaces')
+
+        if overlay and not self.clone_flags & cl.CLONE_NEWNS:
+            raise ValueError('overlay requires newns')
+
         for flag in ca:
             value = pop_all(ca[flag]['aliases'],
                             args, kwargs, False)
@@ -188,32 +352,265 @@ class Container(Process):
                 self.clone_flags |= ca[flag]['flag']
 
         kwargs = {}
-        if sys.version_info >= (3,0):
-            for k in signature(Process.__init__).parameters:
-                if k in self.kwargs:
-                    kwargs[k] = self.kwargs[k]
-        else:
-            for k in getargspec(Process.__init__).args:
-                if k in self.kwargs:
-                    kwargs[k] = self.kwargs[k]
+        for k in process_params():
+            if k in self.kwargs:
+                kwargs[k] = self.kwargs[k]
         kwargs['target'] = self.runup
         kwargs['args'] = ()
         kwargs['kwargs'] = {}
         Process.__init__(self, *args, **kwargs)
 
+    def reset(self):
+        """Reset state of one run of container.
+
+        Called by __init__ and by ContainerSpec.spawn,
+        so attributes set here are not shared by
+        containers spawned from one spec.
+
+        """
+        self._timings = None
+        self.cgroup = None
+        self.capture = None
+        self.channel = None
+        self.joined = None
+
+    def start(self):
+        """Start container.
+
+        Pipes for stdout and stderr are created
+        before clone if capture or forward is set,
+        output is read from self.capture.stdout and
+        stderr, counters of forwarding are there too.
+        Memory file of result is created if result is set.
+        Saved namespaces of join are opened before clone
+        and inherited by the child.
+
+        """
+        if self.kwargs['result']:
+            from .result import Channel
+            self.channel = Channel()
+        if self.kwargs['join']:
+            self.joined = self.open_joined()
+        options = self.kwargs['capture']
+        forward = self.kwargs['forward']
+        if options or forward is not None:
+            from .capture import Capture
+            options = dict(options) if isinstance(options, dict) else {}
+            if forward is not None:
+                options['forward'] = forward
+            self.capture = Capture(**options)
+            stdio = self.capture.open()
+            self.kwargs['stdout'], self.kwargs['stderr'] = stdio
+            if self.exec_plan is not None:
+                self.exec_plan.stdio = self.exec_plan.stdio[:1] + stdio
+        try:
+            Process.start(self)
+        except:
+            if self.capture is not None:
+                self.capture.close()
+            if self.channel is not None:
+                self.channel.close()
+            raise
+        finally:
+            self.close_joined()
+        if self.capture is not None:
+            self.capture.start()
+
+    def start_async(self, loop=None):
+        """Start container in asyncio event loop.
+
+        Args:
+          loop (AbstractEventLoop): event loop,
+            default is asyncio.get_event_loop()
+
+        Return:
+          Future: future resolved with container
+
+        """
+        from .aio import start
+        return start(self, loop)
+
+    def wait(self, loop=None):
+        """Wait for container in asyncio event loop.
+
+        Exit of container is watched through pidfd
+        or SIGCHLD handler, cancellation of returned
+        future kills the container.
+
+        Args:
+          loop (AbstractEventLoop): event loop,
+            default is asyncio.get_event_loop()
+
+        Return:
+          Future: future resolved with exitcode
+
+        """
+        from .aio import wait
+        return wait(self, loop)
+
+    @property
+    def timings(self):
+        """Durations of startup phases in seconds.
+
+        Available if container was created with timings=True.
+        Parent phases: clone, update_map, prestart, handshake.
+        Child phases: child_clone, child_handshake, bootstrap,
+        placement, preup, daemonize, chroot, chdir, chtty, preexec.
+        Child sends its timings just before the target runs,
+        so first access waits for it. Timings of every
+        container are recorded in timing.histograms
+        when it is reaped.
+
+        Return:
+          OrderedDict: phase name and duration
+            or None if timings are not measured
+
+        """
+        if self._timings is None and self.timed and self._popen:
+            self._timings = self._popen.timings()
+        return self._timings
+
+    def lap(self, name):
+        """Save duration of finished phase in child.
+
+        Args:
+          name (str): name of phase
+
+        """
+        timer = getattr(self, '_timer', None)
+        if timer is not None:
+            timer.lap(name)
+
+    def send_timings(self):
+        """Send timings of child to parent."""
+        timer = getattr(self, '_timer', None)
+        if timer is not None:
+            self._timer = None
+            os.write(self._timings_fd, timer.dumps().encode())
+            os.close(self._timings_fd)
+
+    def send_result(self, value=None, exc_info=None):
+        """Send result of target to parent once.
+
+        Args:
+          value (object): return value of target
+          exc_info (tuple): sys.exc_info() if
+            exception was raised
+
+        """
+        if self.channel is not None:
+            self.channel.send(value, exc_info)
+
+    def result(self, timeout=None):
+        """Return value of target.
+
+        Available if container was created with result=True.
+        Waits for exit of container, large buffers of result
+        are mapped from memory file without copying.
+
+        Args:
+          timeout (float): seconds to wait,
+            default is None: wait for exit
+
+        Return:
+          object: return value of target
+
+        Raises:
+          Exception: exception raised by target,
+            its traceback attribute is formatted
+            traceback from the child
+          result.ContainerError: container exited
+            without result, exception can not be pickled
+            or is not Exception, like SystemExit
+          multiprocessing.TimeoutError: container is alive
+          ValueError: container is not created with result=True
+
+        """
+        if self.channel is None:
+            raise ValueError('Container is not created with result=True')
+        self.join(timeout)
+        if self.exitcode is None:
+            from multiprocessing import TimeoutError
+            raise TimeoutError('Container is alive')
+        return self.channel.receive()
+
+    def resolve_join(self, join):
+        """Return saved namespaces to join.
+
+        Args:
+          join (str, dict): name of saved namespaces
+            or dict of namespace and name
+
+        Return:
+          dict: namespace and name
+
+        Raises:
+          ValueError: namespaces are not saved
+
+        """
+        from .registry import NamespaceRegistry
+        registry = NamespaceRegistry(self.kwargs['state_dir'])
+        if not isinstance(join, dict):
+            join = dict.fromkeys(registry.namespaces(join), join)
+            if not join:
+                raise ValueError('Namespaces %s are not saved' %
+                                 self.kwargs['join'])
+        for ns, name in join.items():
+            if ns not in na:
+                raise ValueError('Unknown namespace %s' % ns)
+            if ns not in registry.namespaces(name):
+                raise ValueError('Namespace %s of %s is not saved' %
+                                 (ns, name))
+        return join
+
+    def open_joined(self):
+        """Open files of saved namespaces of join.
+
+        Return:
+          list: namespace and file descriptor
+            in order of entering
+
+        """
+        from .registry import NamespaceRegistry
+        registry = NamespaceRegistry(self.kwargs['state_dir'])
+        join = self.kwargs['join']
+        fds = []
+        try:
+            for name in sorted(set(join.values())):
+                fds.extend(registry.open(
+                    name, *[ns for ns in join if join[ns] == name]))
+        except:
+            for ns, fd in fds:
+                os.close(fd)
+            raise
+        order = list(na)
+        return sorted(fds, key=lambda item: order.index(item[0]))
+
+    def close_joined(self):
+        """Close files of saved namespaces."""
+        fds, self.joined = self.joined, None
+        for ns, fd in fds or ():
+            os.close(fd)
+
     def runup(self):
         """Main wrapper over target function.
 
         Execution order:
           0.1) new ns and sigmask (Clone)
           0.2) set uid, gid (Clone)
-          1) self.preup (mount, etc)
+          0.3) self.prestart in parent (Clone)
+          0.4) enter saved namespaces of join
+          0.5) self.placement (cpus, sched, nice, ioprio)
+          0.6) self.mount (mount plan, overlay)
+          1) self.preup
           4) self.daemonize
           5) self.chroot
           6) self.chdir
           7) self.chtty ?vagga before ns
           8) self.postup - in finally block
           9) self.exceptup - in except block
+          9.1) self.reaper if init
+          9.2) self.loopback
           10) self.preexec (networking, etc)
           11) execute self.target
           12) self.postexec - in finally block
@@ -237,30 +634,132 @@ class Container(Process):
           selinux
 
         """
+        self.lap('bootstrap')
+        if self.joined:
+            from .registry import enter
+            enter(self.joined)
+            self.close_joined()
+            self.lap('join')
+        if self.placement is not None:
+            self.placement.apply()
+            self.lap('placement')
         try:
+            self.mount()
             self.preup()
+            self.lap('preup')
             self.daemonize()
+            self.lap('daemonize')
             self.chroot()
+            self.lap('chroot')
             self.chdir()
+            self.lap('chdir')
             self.chtty()
+            self.lap('chtty')
         except:
+            self.send_result(exc_info=sys.exc_info())
             self.exceptup()
             raise
         finally:
             self.postup()
+        if self.kwargs['init']:
+            self.reaper()
         try:
+            self.loopback()
             self.preexec()
-            return_value = self.kwargs['target'](
+            self.lap('preexec')
+            self.send_timings()
+            value = self.kwargs['target'](
                 *self.kwargs['args'],
                 **self.kwargs['kwargs']
-            ) or 0
+            )
+            self.send_result(value)
+            return_value = value or 0
         except:
+            self.send_result(exc_info=sys.exc_info())
             self.exceptexec()
             raise
         finally:
             self.postexec()
         return return_value
 
+    def reaper(self):
+        """Fork target process and become its init.
+
+        Returns only in forked process, that executes
+        preexec and target. Current process reaps
+        children and exits with exit code of target.
+
+        Raises:
+          SystemExit: in init process
+
+        """
+        from .reaper import Reaper
+        reaper = Reaper(subreaper=not self.clone_flags & cl.CLONE_NEWPID)
+        pid = os.fork()
+        if pid == 0:
+            reaper.child()
+            return
+        sys.exit(reaper.run(pid))
+
+    def prestart(self, pid):
+        """Prepare namespaces of the child from parent.
+
+        Called by Clone in parent after UID and GID maps
+        are written and before the child is released.
+        Child is killed if exception is raised.
+        Loopback of exec containers is brought up here,
+        parent should be privileged for it.
+
+        Child is added into new cgroup named by its pid
+        if cgroup argument is set, live and final stats
+        are available with self.cgroup.stat.
+        New namespaces are saved under name of save.
+
+        Args:
+          pid (int): pid of the child
+
+        """
+        limits = self.kwargs['cgroup']
+        if limits not in (None, False):
+            from .cgroup import Cgroup
+            cgroup = Cgroup('pyspaces-%d' % pid, self.kwargs['cgroup_root'],
+                            limits if isinstance(limits, dict) else None)
+            try:
+                cgroup.create()
+                cgroup.add(pid)
+            except:
+                cgroup.remove()
+                raise
+            self.cgroup = cgroup
+        if self.exec_plan is not None and self.placement is not None:
+            # memory policy can be set only by the process itself
+            self.placement.apply(pid, memory=False)
+        if self.exec_plan is not None and self.kwargs['loopback']:
+            from .netlink import loopback_up
+            loopback_up(pid, self.proc)
+        if self.kwargs['save']:
+            from .registry import NamespaceRegistry
+            registry = NamespaceRegistry(self.kwargs['state_dir'])
+            nspaces = [ns for ns in na if self.clone_flags & na[ns]['flag']]
+            registry.save(self.kwargs['save'], pid, *nspaces, proc=self.proc)
+
+    def mount(self):
+        """Execute mount plan.
+
+        Errors of optional entries are saved
+        into self.mount_errors.
+
+        Required:
+          self.kwargs['mounts']
+
+        Raises:
+          MountError: required entry failed
+
+        """
+        if self.kwargs['mounts']:
+            from .mount import apply
+            self.mount_errors = apply(self.kwargs['mounts'])
+
     def preup(self):
         """Dummy function."""
         pass
@@ -309,37 +808,39 @@ class Container(Process):
     def chtty(self):
         """Change stdin, stdout, stderr.
 
+        Path is opened for reading as stdin and
+        created or appended as stdout and stderr,
+        its descriptor is closed after dup2.
+
         Required:
           self.kwargs['stdin']
           self.kwargs['stdout']
           self.kwargs['stderr']
 
         """
-        stdin = self.kwargs['stdin']
-        if stdin not in (None, False):
-            if type(stdin) is str and os.path.exists(stdin):
-                stdin = file(stdin, 'r')
-                stdin = stdin.fileno()
-            os.dup2(stdin, 0)
-            os.dup2(stdin, sys.stdin.fileno())
-
-        stdout = self.kwargs['stdout']
-        if stdout not in (None, False):
-            if type(stdout) is str and os.path.exists(stdout):
-                stdout = file(stdout, 'r')
-                stdout = stdout.fileno()
-            os.dup2(stdout, 0)
-            sys.stdout.flush()
-            os.dup2(stdout, sys.stdout.fileno())
-
-        stderr = self.kwargs['stderr']
-        if stderr not in (None, False):
-            if type(stderr) is str and os.path.exists(stderr):
-                stderr = file(stderr, 'r')
-                stderr = stderr.fileno()
-            os.dup2(stderr, 0)
-            sys.stderr.flush()
-            os.dup2(stderr, sys.stderr.fileno())
+        append = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+        for fd, name, stream, flags in (
+                (0, 'stdin', sys.stdin, os.O_RDONLY),
+                (1, 'stdout', sys.stdout, append),
+                (2, 'stderr', sys.stderr, append)):
+            value = self.kwargs[name]
+            if value in (None, False):
+                continue
+            opened = isinstance(value, str)
+            if opened:
+                value = os.open(value, flags, 0o666)
+            elif hasattr(value, 'fileno'):
+                value = value.fileno()
+            if stream is not None and fd:
+                stream.flush()
+            if value != fd:
+                os.dup2(value, fd)
+            targets = [fd]
+            if stream is not None and stream.fileno() != fd:
+                os.dup2(value, stream.fileno())
+                targets.append(stream.fileno())
+            if opened and value not in targets:
+                os.close(value)
 
     def postup(self):
         """Dummy function."""
@@ -349,6 +850,17 @@ class Container(Process):
         """Dummy function."""
         pass
 
+    def loopback(self):
+        """Bring up loopback link if it is required.
+
+        Required:
+          self.kwargs['loopback']
+
+        """
+        if self.kwargs['loopback']:
+            from .netlink import loopback_up
+            loopback_up()
+
     def preexec(self):
         """Dummy function."""
         pass
@@ -463,7 +975,60 @@ class Inject(Process):
         pkwargs['target'] = self.setns
         Process.__init__(self, *pargs, **pkwargs)
 
-    def setns(self, target_pid, target, args=(), kwargs={}, nspaces=[], proc='/proc'):
+    def start(self):
+        """Resolve namespaces and start process.
+
+        Namespaces that differ from current ones are
+        resolved and pidfd of target or its namespace
+        files are opened before fork, so child inherits
+        opened file descriptors and enters namespaces
+        with one setns call if kernel supports it.
+        Parent closes them after fork.
+
+        """
+        proc = self._kwargs['proc']
+        target_pid = self._kwargs['target_pid']
+        entries = resolve(target_pid, proc, *self._kwargs['nspaces'])
+        self._kwargs['entries'] = entries
+        self._cache = NamespaceCache()
+        try:
+            if entries and has_pidfd_setns():
+                self._cache.pidfd(target_pid)
+            else:
+                for ns, path in entries:
+                    self._cache.open(path)
+            Process.start(self)
+        finally:
+            cache, self._cache = self._cache, None
+            cache.clear()
+
+    def __aenter__(self):
+        return self.start_async()
+
+    def __aexit__(self, exc_type, exc_value, traceback):
+        from .aio import aexit
+        return aexit(self, exc_type)
+
+    def start_async(self, loop=None):
+        """Start process in asyncio event loop.
+
+        See `Container.start_async`.
+
+        """
+        from .aio import start
+        return start(self, loop)
+
+    def wait(self, loop=None):
+        """Wait for process in asyncio event loop.
+
+        See `Container.wait`.
+
+        """
+        from .aio import wait
+        return wait(self, loop)
+
+    def setns(self, target_pid, target, args=(), kwargs={}, nspaces=[],
+              proc='/proc', entries=None):
         """Change namespaces and execute target.
 
         Args:
@@ -477,6 +1042,8 @@ class Inject(Process):
           nspaces (list): list of namespaces for setns
           proc (str): root directory of proc fs,
             default is '/proc'
+          entries (list): namespaces resolved before
+            fork, see setns.resolve, default is None
           all (bool): set all 6 namespaces,
             default is False
           newuts, uts (bool or str): enter uts namespace,
@@ -505,5 +1072,177 @@ class Inject(Process):
             default is None
 
         """
-        with setns(target_pid, self.pid, proc, *nspaces):
-            return target(*args, **kwargs)
+        if entries is None:
+            entries = resolve(target_pid, proc, *nspaces)
+        # process exits after target, namespaces are not restored
+        enter(entries, target_pid, proc, getattr(self, '_cache', None))
+        return target(*args, **kwargs)
+
+class InjectWorker(Inject):
+    """Class wrapper over `pyspaces.Inject`.
+
+    Create persistent process in namespaces of another
+    one and execute many callable objects in it.
+    Namespaces are entered only once, each call costs
+    one round trip over a pipe.
+
+    The worker exits when the target process exits
+    or when it is closed.
+
+    """
+    def __init__(self, target_pid, proc='/proc', *pargs, **pkwargs):
+        """Create pipe and execute Inject.__init__
+
+        Args:
+          target_pid (str or int): pid of target process,
+            used for executing setns
+          proc (str): root directory of proc fs,
+            default is '/proc'
+          *pargs (list): arguments for Inject.__init__
+          **pkwargs (dict): arguments for Inject.__init__
+
+        """
+        self.conn, self._child_conn = Pipe()
+        self._lock = threading.Lock()
+        Inject.__init__(self, target_pid, self.serve,
+                        (self._child_conn,), {}, proc,
+                        *pargs, **pkwargs)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self):
+        """Start worker and close child end of the pipe."""
+        Inject.start(self)
+        self._child_conn.close()
+
+    def serve(self, conn):
+        """Execute received calls until end of work.
+
+        Receive lists of (callable, args, kwargs)
+        tuples and send back lists of (success, value)
+        tuples, where value is return value or raised
+        exception. Exit on None, on closed pipe or
+        when the target process exits.
+
+        Args:
+          conn (Connection): child end of the pipe
+
+        """
+        try:
+            from multiprocessing.connection import wait
+        except ImportError:
+            # python 2
+            wait = None
+        self.conn.close()
+        target_pid = int(self._kwargs['target_pid'])
+        try:
+            pidfd = os.pidfd_open(target_pid) if wait else None
+        except (AttributeError, OSError):
+            pidfd = None
+        try:
+            while True:
+                if pidfd is not None:
+                    ready = wait([conn, pidfd])
+                    if conn not in ready:
+                        break
+                elif not conn.poll(1.0):
+                    try:
+                        os.kill(target_pid, 0)
+                    except OSError as e:
+                        if e.errno != errno.EPERM:
+                            break
+                    continue
+                try:
+                    calls = conn.recv()
+                except EOFError:
+                    break
+                if calls is None:
+                    break
+                results = []
+                for target, args, kwargs in calls:
+                    try:
+                        results.append((True, target(*args, **kwargs)))
+                    except Exception as e:
+                        results.append((False, e))
+                conn.send(results)
+        finally:
+            if pidfd is not None:
+                os.close(pidfd)
+            conn.close()
+
+    def batch(self, calls, return_exceptions=False):
+        """Execute many callable objects in one round trip.
+
+        Args:
+          calls (list): list of (callable, args, kwargs)
+            tuples, args and kwargs can be omitted
+          return_exceptions (bool): return raised exceptions
+            as results instead of raising first of them,
+            default is False
+
+        Return:
+          list: return values of calls
+
+        Raises:
+          RuntimeError: worker is not alive
+          any exception raised by a call
+
+        """
+        # fill omitted args and kwargs
+        calls = [tuple(c) + ((), {})[len(c) - 1:] for c in calls]
+        with self._lock:
+            try:
+                self.conn.send(calls)
+                results = self.conn.recv()
+            except (EOFError, IOError, OSError):
+                raise RuntimeError('Inject worker is not alive')
+        values = []
+        for success, value in results:
+            if not success and not return_exceptions:
+                raise value
+            values.append(value)
+        return values
+
+    def call(self, target, *args, **kwargs):
+        """Execute callable object in namespaces of target process.
+
+        Args:
+          target (callable object): picklable callable object
+          *args (list): args for target
+          **kwargs (dict): kwargs for target
+
+        Return:
+          Return value of target
+
+        Raises:
+          RuntimeError: worker is not alive
+          any exception raised by target
+
+        """
+        return self.batch([(target, args, kwargs)])[0]
+
+    def __aexit__(self, exc_type, exc_value, traceback):
+        from .aio import aexit
+        self.stop()
+        return aexit(self, exc_type)
+
+    def stop(self):
+        """Send stop message to worker and close the pipe."""
+        with self._lock:
+            if self.conn.closed:
+                return
+            try:
+                self.conn.send(None)
+            except (IOError, OSError):
+                pass
+            self.conn.close()
+
+    def close(self):
+        """Stop worker and wait for it."""
+        self.stop()
+        self.join()
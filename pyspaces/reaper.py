@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""This is part of [pyspaces](https://github.com/Friz-zy/pyspaces)
+
+License: MIT or BSD or Apache 2.0
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Minimal init of containers: first process of the container
+forks the target into its own process group, forwards
+termination signals to that group and reaps all orphaned
+descendants until the target exits.
+
+    Container(target=f, newpid=True, newns=True, init=True)
+
+"""
+
+
+import os
+import errno
+import struct
+from signal import (SIGCHLD, SIGHUP, SIGINT, SIGQUIT, SIGTERM,
+                    SIGUSR1, SIGUSR2, SIGWINCH)
+from .libc import libc, get_errno, byref, c_ulong, sizeof
+
+forwarded = (SIGHUP, SIGINT, SIGQUIT, SIGTERM, SIGUSR1, SIGUSR2, SIGWINCH)
+"""Signals forwarded to process group of target"""
+
+PR_SET_CHILD_SUBREAPER = 36
+SFD_CLOEXEC = 0o2000000
+SIG_BLOCK = 0
+SIG_SETMASK = 2
+
+SIGINFO_SIZE = 128
+"""Size of struct signalfd_siginfo"""
+
+sigset_t = c_ulong * (1024 // (8 * sizeof(c_ulong)))
+
+
+def check(result):
+    """Raise OSError with errno if result of libc call is -1."""
+    if result == -1:
+        e = get_errno()
+        raise OSError(e, os.strerror(e))
+    return result
+
+def sigset(signals):
+    """Return sigset_t with signals."""
+    mask = sigset_t()
+    libc.sigemptyset(byref(mask))
+    for sig in signals:
+        libc.sigaddset(byref(mask), int(sig))
+    return mask
+
+def exit_code(status):
+    """Return exit code of wait status.
+
+    Code of process killed by signal
+    is 128 + signal like in shells.
+
+    """
+    if os.WIFSIGNALED(status):
+        return 128 + os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+def wait_any():
+    """Reap one exited child.
+
+    Return:
+      tuple: pid and exit code of child,
+        (0, None) if no one has exited
+
+    """
+    try:
+        if hasattr(os, 'waitid'):
+            info = os.waitid(os.P_ALL, 0, os.WEXITED | os.WNOHANG)
+            if info is None or not info.si_pid:
+                return 0, None
+            if info.si_code == os.CLD_EXITED:
+                return info.si_pid, info.si_status
+            return info.si_pid, 128 + info.si_status
+        pid, status = os.waitpid(-1, os.WNOHANG)
+    except OSError as e:
+        if e.errno != errno.ECHILD:
+            raise
+        return 0, None
+    return pid, exit_code(status) if pid else None
+
+
+class Reaper(object):
+    """Init process of container."""
+    def __init__(self, subreaper=False, signals=forwarded):
+        """Block signals and open signalfd.
+
+        Should be created before fork of target.
+
+        Args:
+          subreaper (bool): become child subreaper,
+            orphans of target are reparented to the
+            current process instead of init of its
+            pid namespace, default is False
+          signals (tuple): signals forwarded to
+            target, default is `forwarded`
+
+        Raises:
+          OSError: prctl or signalfd failed
+
+        """
+        self.signals = tuple(signals)
+        if subreaper:
+            check(libc.prctl(PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0))
+        mask = sigset(self.signals + (SIGCHLD,))
+        self.saved = sigset_t()
+        check(libc.sigprocmask(SIG_BLOCK, byref(mask), byref(self.saved)))
+        self.fd = check(libc.signalfd(-1, byref(mask), SFD_CLOEXEC))
+
+    def child(self):
+        """Prepare forked target process.
+
+        Close signalfd, restore signal mask and
+        move target into its own process group.
+
+        """
+        os.close(self.fd)
+        libc.sigprocmask(SIG_SETMASK, byref(self.saved), None)
+        os.setpgid(0, 0)
+
+    def run(self, pid):
+        """Forward signals and reap children until target exits.
+
+        Args:
+          pid (int): pid of target process
+
+        Return:
+          int: exit code of target
+
+        """
+        try:
+            os.setpgid(pid, pid)
+        except OSError:
+            # target has already done it or exec'd
+            pass
+        code = None
+        try:
+            while code is None:
+                signo, = struct.unpack_from('=I', os.read(self.fd,
+                                                          SIGINFO_SIZE))
+                if signo == SIGCHLD:
+                    code = self.reap(pid)
+                else:
+                    try:
+                        os.killpg(pid, signo)
+                    except OSError:
+                        pass
+        finally:
+            os.close(self.fd)
+        return code
+
+    def reap(self, pid):
+        """Reap all exited children.
+
+        Several SIGCHLD are merged into one,
+        so every zombie is collected.
+
+        Return:
+          int: exit code of target or None
+            if it is still running
+
+        """
+        code = None
+        while True:
+            child, status = wait_any()
+            if not child:
+                return code
+            if child == pid:
+                code = status
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""This is part of [pyspaces](https://github.com/Friz-zy/pyspaces)
+
+License: MIT or BSD or Apache 2.0
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Named namespaces that outlive their process: namespace
+files of process are bind mounted under state directory,
+like `ip netns` does, and joined later by name.
+
+    Container(target=f, newnet=True, loopback=True, save='web').start()
+    Container(target=g, all=True, join={'net': 'web'}).start()
+
+    with NamespaceRegistry().setns('web'):
+        ...
+
+"""
+
+
+import os
+import errno
+from contextlib import contextmanager
+from .libc import libc, get_errno
+from .args_aliases import na
+from .setns import fdtmp, setns, same_namespace
+
+STATE_DIR = '/run/pyspaces/ns'
+"""Default directory of named namespaces"""
+
+
+def is_mountpoint(path, proc='/proc'):
+    """Return True if path is mount point.
+
+    Unlike os.path.ismount it sees bind mounts
+    of directory of the same filesystem.
+
+    """
+    path = os.path.realpath(path)
+    with open(proc + '/self/mountinfo') as f:
+        for line in f:
+            point = line.split()[4]
+            # spaces and alike are escaped as octal
+            if '\\' in point:
+                point = point.encode().decode('unicode_escape')
+            if point == path:
+                return True
+    return False
+
+
+class NamespaceRegistry(object):
+    """Named namespaces saved under state directory.
+
+    Namespaces of name are files {root}/{name}/{ns}
+    with bind mounted namespace files of process.
+    They stay alive until they are removed, even
+    when no process is left in them.
+
+    """
+    def __init__(self, root=None):
+        """Set state directory.
+
+        Args:
+          root (str): state directory,
+            default is STATE_DIR
+
+        """
+        self.root = STATE_DIR if root is None else root
+
+    def __repr__(self):
+        return '<NamespaceRegistry %s>' % self.root
+
+    def __contains__(self, name):
+        return bool(self.namespaces(name))
+
+    def path(self, name, ns):
+        """Return path of namespace ns of name."""
+        if not name or '/' in name or name in ('.', '..'):
+            raise ValueError('Invalid name of namespaces: %r' % name)
+        return os.path.join(self.root, name, ns)
+
+    def prepare(self):
+        """Create state directory as private mount point.
+
+        Mount namespace file can not be bind mounted
+        where mounts propagate into that namespace.
+
+        Raises:
+          MountError: mount(2) failed
+
+        """
+        from .mount import bind, propagation
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root, 0o755)
+        if not is_mountpoint(self.root):
+            bind(self.root, recursive=False).apply()
+        propagation(self.root, 'private', recursive=False).apply()
+
+    def save(self, name, pid, *nspaces, **kwargs):
+        """Bind mount namespaces of process under name.
+
+        Args:
+          name (str): name of namespaces
+          pid (str or int): pid of process
+          *nspaces (list): names of namespaces like
+            'net' or 'mnt', default is namespaces
+            of pid that differ from namespaces
+            of current process
+          proc (str): root directory of proc fs,
+            default is '/proc'
+
+        Return:
+          dict: namespace and its path
+
+        Raises:
+          OSError: namespace of name is saved already
+          MountError: mount(2) failed, namespaces
+            saved by this call are removed
+
+        """
+        from .mount import bind
+        proc = kwargs.get('proc', '/proc')
+        if not nspaces or 'all' in nspaces:
+            nspaces = [ns for ns in na if self.differs(pid, ns, proc)]
+        self.prepare()
+        directory = os.path.join(self.root, name)
+        if not os.path.isdir(directory):
+            os.mkdir(directory, 0o755)
+        saved = {}
+        try:
+            for ns in na:
+                if ns not in nspaces:
+                    continue
+                path = self.path(name, ns)
+                if os.path.ismount(path):
+                    raise OSError(errno.EEXIST, '%s: %s' %
+                                  (path, os.strerror(errno.EEXIST)))
+                open(path, 'a').close()
+                saved[ns] = path
+                bind(fdtmp.format(proc, pid, ns), path,
+                     recursive=False).apply()
+        except:
+            for ns in saved:
+                self.release(saved[ns])
+            self.cleanup(name)
+            raise
+        if not saved:
+            self.cleanup(name)
+        return saved
+
+    @staticmethod
+    def differs(pid, ns, proc='/proc'):
+        """Return True if namespace of pid is not current one."""
+        return not same_namespace(fdtmp.format(proc, pid, ns), ns, proc)
+
+    def namespaces(self, name):
+        """Return saved namespaces of name.
+
+        Return:
+          dict: namespace and its path,
+            in order of entering
+
+        """
+        result = {}
+        for ns in na:
+            path = self.path(name, ns)
+            if os.path.ismount(path):
+                result[ns] = path
+        return result
+
+    def names(self):
+        """Return sorted names of saved namespaces."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if name in self)
+
+    def open(self, name, *nspaces):
+        """Open namespace files of name.
+
+        Args:
+          name (str): name of namespaces
+          *nspaces (list): names of namespaces,
+            default is all saved namespaces
+
+        Return:
+          list: namespace and file descriptor
+            in order of entering
+
+        Raises:
+          KeyError: namespace is not saved
+
+        """
+        saved = self.namespaces(name)
+        for ns in nspaces:
+            if ns not in saved:
+                raise KeyError('Namespace %s of %s is not saved' % (ns, name))
+        fds = []
+        try:
+            for ns in na:
+                if ns in saved and (not nspaces or ns in nspaces):
+                    fds.append((ns, os.open(saved[ns], os.O_RDONLY)))
+        except:
+            for ns, fd in fds:
+                os.close(fd)
+            raise
+        return fds
+
+    @contextmanager
+    def setns(self, name, *nspaces, **kwargs):
+        """Enter saved namespaces of name and restore current ones.
+
+        Args:
+          name (str): name of namespaces
+          *nspaces (list): names of namespaces,
+            default is all saved namespaces
+          **kwargs (dict): arguments for setns.setns
+
+        """
+        saved = self.namespaces(name)
+        for ns in nspaces or saved:
+            if ns not in saved:
+                raise KeyError('Namespace %s of %s is not saved' % (ns, name))
+            kwargs[ns] = saved[ns]
+        with setns(0, 0, kwargs.pop('proc', '/proc'), **kwargs):
+            yield
+
+    def release(self, path):
+        """Unmount and remove namespace file."""
+        from .mount import MountError, umount
+        try:
+            umount(path).apply()
+        except MountError as e:
+            if e.errno not in (errno.EINVAL, errno.ENOENT):
+                raise
+        try:
+            os.unlink(path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+    def cleanup(self, name):
+        """Remove directory of name if it is empty."""
+        try:
+            os.rmdir(os.path.join(self.root, name))
+        except OSError as e:
+            if e.errno not in (errno.ENOENT, errno.ENOTEMPTY):
+                raise
+
+    def remove(self, name, *nspaces):
+        """Remove saved namespaces of name.
+
+        Namespace is destroyed when no process
+        and no other mount holds it.
+
+        Args:
+          name (str): name of namespaces
+          *nspaces (list): names of namespaces,
+            default is all saved namespaces
+
+        Raises:
+          KeyError: nothing is saved under name
+
+        """
+        saved = self.namespaces(name)
+        if not saved:
+            raise KeyError('Namespaces %s are not saved' % name)
+        for ns in saved:
+            if not nspaces or ns in nspaces:
+                self.release(saved[ns])
+        self.cleanup(name)
+
+
+def enter(fds):
+    """Join opened namespaces without restoring.
+
+    Args:
+      fds (list): namespace and file descriptor
+        like NamespaceRegistry.open returns
+
+    Raises:
+      OSError: setns(2) failed
+
+    """
+    for ns, fd in fds:
+        if libc.setns(fd, na[ns]['flag']) == -1:
+            e = get_errno()
+            raise OSError(e, 'setns %s: %s' % (ns, os.strerror(e)))
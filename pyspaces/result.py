@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""This is part of [pyspaces](https://github.com/Friz-zy/pyspaces)
+
+License: MIT or BSD or Apache 2.0
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Result channel of containers: return value or exception of
+target is pickled into anonymous memory file created before
+clone, so it works across user namespaces and after chroot.
+With pickle protocol 5 buffers of bytearray, numpy arrays and
+alike are written out-of-band, parent maps the file and numpy
+arrays are unpickled as read-only views of it without copying.
+
+    c = Container(target=f, result=True)
+    c.start()
+    value = c.result()
+
+"""
+
+
+import os
+import sys
+import mmap
+import pickle
+import struct
+import tempfile
+import traceback
+
+HEADER = struct.Struct('=QQ')
+"""Length of pickle and number of out-of-band buffers"""
+
+LENGTH = struct.Struct('=Q')
+
+ALIGN = 64
+"""Alignment of out-of-band buffers in file"""
+
+PROTOCOL = max(pickle.HIGHEST_PROTOCOL, 2)
+
+MFD_CLOEXEC = 1
+
+OK = 0
+ERROR = 1
+
+
+class ContainerError(Exception):
+    """Exception of target that can not be pickled.
+
+    Attributes:
+      traceback (str): formatted traceback from child
+
+    """
+    def __init__(self, message, traceback=''):
+        Exception.__init__(self, message)
+        self.traceback = traceback
+
+
+def memfd(name='pyspaces-result'):
+    """Return descriptor of anonymous memory file.
+
+    Unlinked temporary file is used
+    if memfd_create is not available.
+
+    """
+    if hasattr(os, 'memfd_create'):
+        return os.memfd_create(name, MFD_CLOEXEC)
+    try:
+        from .libc import libc
+        fd = libc.memfd_create(name.encode(), MFD_CLOEXEC)
+        if fd >= 0:
+            return fd
+    except AttributeError:
+        pass
+    f = tempfile.TemporaryFile()
+    fd = os.dup(f.fileno())
+    f.close()
+    return fd
+
+def write_all(fd, data):
+    """Write whole buffer into descriptor."""
+    view = memoryview(data).cast('B') if hasattr(memoryview, 'cast') \
+        else memoryview(data)
+    while len(view):
+        view = view[os.write(fd, view):]
+
+
+class Channel(object):
+    """One result passed from child to parent."""
+    def __init__(self):
+        self.fd = memfd()
+        self.received = False
+        self.value = None
+        self.error = None
+        self.map = None
+
+    def close(self):
+        """Close file, mapped buffers stay valid."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def send(self, value=None, exc_info=None):
+        """Write result into file, called in child once.
+
+        Args:
+          value (object): return value of target
+          exc_info (tuple): sys.exc_info() if target raised
+
+        """
+        if self.fd is None:
+            return
+        fd, self.fd = self.fd, None
+        buffers = []
+        if exc_info is None:
+            status, payload = OK, value
+        else:
+            text = ''.join(traceback.format_exception(*exc_info))
+            error = exc_info[1]
+            # SystemExit and alike must not end the parent
+            if not isinstance(error, Exception):
+                error = ContainerError('Target raised %r' % error, text)
+            status, payload = ERROR, (error, text)
+        try:
+            data = self.dumps((status, payload), buffers)
+        except Exception as e:
+            buffers = []
+            if status == OK:
+                text = ''.join(traceback.format_exception(*sys.exc_info()))
+                message = 'Can not pickle result: %r' % e
+            else:
+                message = repr(exc_info[1])
+            data = self.dumps(
+                (ERROR, (ContainerError(message, text), text)), buffers)
+        write_all(fd, HEADER.pack(len(data), len(buffers)))
+        write_all(fd, data)
+        offset = HEADER.size + len(data)
+        for buf in buffers:
+            raw = buf.raw()
+            # buffers are aligned for arrays mapped by parent
+            pad = -(offset + LENGTH.size) % ALIGN
+            write_all(fd, LENGTH.pack(len(raw)) + b'\0' * pad)
+            write_all(fd, raw)
+            offset += LENGTH.size + pad + len(raw)
+        os.close(fd)
+
+    @staticmethod
+    def dumps(obj, buffers):
+        """Pickle obj, out-of-band buffers are appended to list."""
+        if PROTOCOL >= 5:
+            return pickle.dumps(obj, PROTOCOL, buffer_callback=buffers.append)
+        return pickle.dumps(obj, PROTOCOL)
+
+    def receive(self):
+        """Read result written by child.
+
+        Return:
+          object: return value of target
+
+        Raises:
+          Exception: exception raised by target with
+            traceback attribute, or ContainerError
+            if target did not send result or raised
+            exception that is not Exception
+
+        """
+        if not self.received:
+            self.received = True
+            try:
+                self.load()
+            finally:
+                self.close()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+    def load(self):
+        """Map file and unpickle result."""
+        size = os.fstat(self.fd).st_size
+        if size < HEADER.size:
+            self.error = ContainerError('Container did not send result')
+            return
+        self.map = mmap.mmap(self.fd, size, prot=mmap.PROT_READ)
+        view = memoryview(self.map)
+        length, count = HEADER.unpack_from(self.map, 0)
+        offset = HEADER.size
+        data = view[offset:offset + length]
+        offset += length
+        buffers = []
+        for i in range(count):
+            n, = LENGTH.unpack_from(self.map, offset)
+            offset += LENGTH.size
+            offset += -offset % ALIGN
+            buffers.append(view[offset:offset + n])
+            offset += n
+        if buffers:
+            status, payload = pickle.loads(data, buffers=buffers)
+        else:
+            status, payload = pickle.loads(bytes(data))
+        if status == OK:
+            self.value = payload
+        else:
+            error, text = payload
+            try:
+                error.traceback = text
+            except AttributeError:
+                pass
+            self.error = error
@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""This is part of [pyspaces](https://github.com/Friz-zy/pyspaces)
+
+License: MIT or BSD or Apache 2.0
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Placement of containers: CPU affinity, NUMA node binding,
+scheduling policy, nice and I/O priority, and helpers that
+split and spread CPUs between containers.
+
+    fast, slow = isolate(2)
+    for cpus in spread(8, slow):
+        Container(target=f, cpus=cpus, sched='batch', nice=10).start()
+    Container(target=g, cpus=fast).start()
+
+"""
+
+
+import os
+import time
+import platform
+from .libc import libc, get_errno, byref, c_int, c_ulong, sizeof
+
+SCHED_OTHER = 0
+SCHED_FIFO = 1
+SCHED_RR = 2
+SCHED_BATCH = 3
+SCHED_IDLE = 5
+
+policies = {
+    'other': SCHED_OTHER,
+    'fifo': SCHED_FIFO,
+    'rr': SCHED_RR,
+    'batch': SCHED_BATCH,
+    'idle': SCHED_IDLE,
+}
+"""Names of scheduling policies"""
+
+IOPRIO_CLASS_RT = 1
+IOPRIO_CLASS_BE = 2
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_WHO_PROCESS = 1
+
+ioprio_classes = {
+    'rt': IOPRIO_CLASS_RT,
+    'be': IOPRIO_CLASS_BE,
+    'idle': IOPRIO_CLASS_IDLE,
+}
+"""Names of I/O scheduling classes"""
+
+PRIO_PROCESS = 0
+MPOL_BIND = 2
+
+# syscall numbers differ between architectures,
+# I/O priority and NUMA binding are not supported
+# on other ones
+SYS_ioprio_set, SYS_set_mempolicy = {
+    'x86_64': (251, 238),
+    'i386': (289, 276),
+    'i686': (289, 276),
+    'aarch64': (30, 237),
+    'armv7l': (314, 321),
+    'ppc64': (273, 261),
+    'ppc64le': (273, 261),
+    's390x': (282, 270),
+}.get(platform.machine(), (None, None))
+
+SYSFS = '/sys/devices/system'
+"""Root of CPU and NUMA topology in sysfs"""
+
+
+def check(result):
+    """Raise OSError with errno if result of libc call is -1."""
+    if result == -1:
+        e = get_errno()
+        raise OSError(e, os.strerror(e))
+    return result
+
+def parse_cpulist(value):
+    """Parse list like '0-3,8,10-11' into sorted list of ints."""
+    if isinstance(value, int):
+        return [value]
+    if not isinstance(value, str):
+        return sorted(set(int(v) for v in value))
+    result = set()
+    for part in value.strip().split(','):
+        if not part:
+            continue
+        start, _, end = part.partition('-')
+        result.update(range(int(start), int(end or start) + 1))
+    return sorted(result)
+
+def read_cpulist(path):
+    """Return cpulist from sysfs file or [] if it does not exist."""
+    try:
+        with open(path) as f:
+            return parse_cpulist(f.read())
+    except IOError:
+        return []
+
+def online_cpus():
+    """Return CPUs available for current process."""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    mask = (c_ulong * 16)()
+    # glibc returns 0, not size of mask like the syscall
+    check(libc.sched_getaffinity(0, sizeof(mask), mask))
+    bits = sizeof(c_ulong) * 8
+    return [i for i in range(len(mask) * bits)
+            if mask[i // bits] >> (i % bits) & 1]
+
+def numa_nodes(sysfs=SYSFS):
+    """Return online NUMA nodes, [0] without NUMA."""
+    return read_cpulist(sysfs + '/node/online') or [0]
+
+def node_cpus(node, sysfs=SYSFS):
+    """Return CPUs of NUMA node."""
+    return read_cpulist('%s/node/node%d/cpulist' % (sysfs, node))
+
+def core_siblings(cpu, sysfs=SYSFS):
+    """Return hyperthreads of physical core of cpu."""
+    path = '%s/cpu/cpu%d/topology/thread_siblings_list' % (sysfs, cpu)
+    return read_cpulist(path) or [cpu]
+
+def cpu_load(interval=0.1, proc='/proc'):
+    """Return busy fraction of every CPU over interval.
+
+    Args:
+      interval (float): seconds between samples of
+        /proc/stat, default is 0.1
+      proc (str): root directory of proc fs,
+        default is '/proc'
+
+    Return:
+      dict: cpu and load from 0.0 to 1.0
+
+    """
+    def sample():
+        times = {}
+        with open(proc + '/stat') as f:
+            for line in f:
+                if line.startswith('cpu') and line[3].isdigit():
+                    fields = line.split()
+                    values = [int(v) for v in fields[1:]]
+                    # idle and iowait
+                    times[int(fields[0][3:])] = (sum(values),
+                                                 sum(values[3:5]))
+        return times
+
+    first = sample()
+    time.sleep(interval)
+    load = {}
+    for cpu, (total, idle) in sample().items():
+        total0, idle0 = first.get(cpu, (0, 0))
+        delta = total - total0
+        load[cpu] = 1.0 - float(idle - idle0) / delta if delta else 0.0
+    return load
+
+def isolate(count, cpus=None, sysfs=SYSFS):
+    """Split CPUs into latency-sensitive and batch sets.
+
+    Whole physical cores are taken, so latency-sensitive
+    containers do not share cores and their hyperthreads
+    with batch ones.
+
+    Args:
+      count (int): physical cores for latency-sensitive
+        containers, taken from the end of cpus
+      cpus (list): CPUs to split, default is online_cpus()
+
+    Return:
+      tuple: lists of latency and batch CPUs
+
+    Raises:
+      ValueError: batch set would be empty
+
+    """
+    cpus = online_cpus() if cpus is None else parse_cpulist(cpus)
+    cores = []
+    seen = set()
+    for cpu in cpus:
+        if cpu not in seen:
+            core = [c for c in core_siblings(cpu, sysfs) if c in cpus]
+            seen.update(core)
+            cores.append(core)
+    if count >= len(cores):
+        raise ValueError('%d cores of %d leave no CPUs for batch' %
+                         (count, len(cores)))
+    split = len(cores) - count
+    latency = sorted(c for core in cores[split:] for c in core)
+    batch = sorted(c for core in cores[:split] for c in core)
+    return latency, batch
+
+def spread(count, cpus=None, by='cpu', load=None, sysfs=SYSFS):
+    """Assign CPUs to batch of containers.
+
+    Args:
+      count (int): number of containers
+      cpus (list): CPUs to use, default is online_cpus()
+      by (str): unit of placement: 'cpu' or 'node',
+        containers of 'node' may use all its CPUs
+      load (dict): cpu and current load like cpu_load()
+        returns, containers are placed into least loaded
+        units, default is None: round-robin
+
+    Return:
+      list: CPUs of every container
+
+    """
+    cpus = online_cpus() if cpus is None else parse_cpulist(cpus)
+    if by == 'node':
+        units = []
+        for node in numa_nodes(sysfs):
+            unit = [c for c in node_cpus(node, sysfs) if c in cpus]
+            if unit:
+                units.append(unit)
+        units = units or [cpus]
+    elif by == 'cpu':
+        units = [[c] for c in cpus]
+    else:
+        raise ValueError('Unknown unit of placement: %s' % by)
+    if load is None:
+        return [units[i % len(units)] for i in range(count)]
+    # load of unit in CPUs, every container counts as one busy CPU
+    busy = [sum(load.get(c, 0.0) for c in unit) for unit in units]
+    result = []
+    for i in range(count):
+        index = min(range(len(units)),
+                    key=lambda u: (busy[u] / len(units[u]), u))
+        busy[index] += 1.0
+        result.append(units[index])
+    return result
+
+
+class Placement(object):
+    """CPU, memory and scheduling settings of process."""
+    def __init__(self, cpus=None, numa=None, sched=None, priority=0,
+                 nice=None, ioprio=None, sysfs=SYSFS):
+        """Set placement.
+
+        Args:
+          cpus (list, str): CPUs like [0, 1] or '0-3,8'
+          numa (list, str, int): NUMA nodes, CPUs are limited
+            to CPUs of nodes and memory is bound to nodes
+          sched (str, int): policy: 'other', 'batch',
+            'idle', 'fifo' or 'rr'
+          priority (int): static priority of 'fifo'
+            and 'rr', default is 0
+          nice (int): nice value
+          ioprio (str, tuple): I/O class 'idle' or
+            class and level like ('be', 7) or ('rt', 0)
+
+        Raises:
+          ValueError: unknown policy or class, no CPUs left,
+            priority is not in 1..99 for 'fifo' and 'rr'
+            or is set for other policy, numa or ioprio
+            is not supported on this architecture
+
+        """
+        self.cpus = None if cpus is None else parse_cpulist(cpus)
+        self.numa = None if numa is None else parse_cpulist(numa)
+        if self.numa is not None:
+            if SYS_set_mempolicy is None:
+                raise ValueError('NUMA binding is not supported on %s' %
+                                 platform.machine())
+            nodes = set()
+            for node in self.numa:
+                nodes.update(node_cpus(node, sysfs))
+            if self.cpus is None:
+                self.cpus = sorted(nodes)
+            elif nodes:
+                self.cpus = [c for c in self.cpus if c in nodes]
+        if self.cpus == []:
+            raise ValueError('No CPUs for placement')
+        if isinstance(sched, str):
+            if sched not in policies:
+                raise ValueError('Unknown scheduling policy: %s' % sched)
+            sched = policies[sched]
+        if sched in (SCHED_FIFO, SCHED_RR):
+            if not 1 <= priority <= 99:
+                raise ValueError('Priority of real-time policy should be'
+                                 ' in 1..99, not %s' % priority)
+        elif priority:
+            raise ValueError('Priority is supported only by real-time'
+                             ' policies fifo and rr')
+        self.sched = sched
+        self.priority = priority
+        self.nice = nice
+        if ioprio is not None:
+            if SYS_ioprio_set is None:
+                raise ValueError('I/O priority is not supported on %s' %
+                                 platform.machine())
+            if isinstance(ioprio, str):
+                ioprio = (ioprio, 0)
+            cls, level = ioprio
+            if cls not in ioprio_classes:
+                raise ValueError('Unknown I/O class: %s' % cls)
+            ioprio = ioprio_classes[cls] << IOPRIO_CLASS_SHIFT | level
+        self.ioprio = ioprio
+
+    def __repr__(self):
+        return '<Placement cpus=%s numa=%s sched=%s nice=%s ioprio=%s>' % (
+            self.cpus, self.numa, self.sched, self.nice, self.ioprio)
+
+    @staticmethod
+    def mask(values):
+        """Return bit mask of ints as array of unsigned long."""
+        bits = sizeof(c_ulong) * 8
+        mask = (c_ulong * (max(values) // bits + 1))()
+        for v in values:
+            mask[v // bits] |= 1 << (v % bits)
+        return mask
+
+    def apply(self, pid=0, memory=True):
+        """Apply placement to process.
+
+        Args:
+          pid (int): pid of process, default is 0: current
+          memory (bool): bind memory to NUMA nodes, only
+            current thread can be bound, default is True
+
+        Raises:
+          OSError: libc call failed
+
+        """
+        if self.cpus is not None:
+            mask = self.mask(self.cpus)
+            check(libc.sched_setaffinity(pid, sizeof(mask), mask))
+        if self.numa is not None and memory:
+            mask = self.mask(self.numa)
+            check(libc.syscall(SYS_set_mempolicy, MPOL_BIND, mask,
+                               c_ulong(len(mask) * sizeof(c_ulong) * 8 + 1)))
+        if self.sched is not None:
+            param = c_int(self.priority)
+            check(libc.sched_setscheduler(pid, self.sched, byref(param)))
+        if self.nice is not None:
+            check(libc.setpriority(PRIO_PROCESS, pid, self.nice))
+        if self.ioprio is not None:
+            check(libc.syscall(SYS_ioprio_set, IOPRIO_WHO_PROCESS,
+                               pid, self.ioprio))
@@ -8,18 +8,366 @@ Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
 """ 
 
 
+import os
 import errno
+import select
+import threading
 from os import getpid
 from os.path import exists
 from .libc import libc, get_errno
-from .args_aliases import na, pop_all
+from .args_aliases import na, pop, pop_all
 from contextlib import contextmanager
 
 
+#'{proc}/{pid}/ns/{ns}'
+fdtmp = '{0}/{1}/ns/{2}'
+
+SYS_pidfd_open = 434
+
+_pidfd_setns = None
+
+
+def pidfd_open(pid):
+    """Return pidfd of process.
+
+    Raises:
+      OSError: process does not exist or
+        kernel does not support pidfd
+
+    """
+    if hasattr(os, 'pidfd_open'):
+        return os.pidfd_open(int(pid))
+    fd = libc.syscall(SYS_pidfd_open, int(pid), 0)
+    if fd == -1:
+        e = get_errno()
+        raise OSError(e, os.strerror(e))
+    return fd
+
+def has_pidfd_setns():
+    """Check if kernel supports setns with pidfd.
+
+    Kernel is probed only once: setns of own
+    pidfd into own uts namespace changes nothing,
+    it fails with EINVAL if pidfd is not supported
+    by setns and with EPERM without privileges.
+
+    Return:
+      bool: True if setns accepts pidfd
+
+    """
+    global _pidfd_setns
+    if _pidfd_setns is None:
+        try:
+            fd = pidfd_open(getpid())
+        except OSError:
+            _pidfd_setns = False
+        else:
+            try:
+                _pidfd_setns = (libc.setns(fd, na['uts']['flag']) == 0 or
+                                get_errno() == errno.EPERM)
+            finally:
+                os.close(fd)
+    return _pidfd_setns
+
+def same_namespace(path, ns, proc='/proc'):
+    """Return True if current process is in namespace of file."""
+    st = os.stat(path)
+    own = os.stat(fdtmp.format(proc, 'self', ns))
+    return (st.st_dev, st.st_ino) == (own.st_dev, own.st_ino)
+
+def resolve(target_pid, proc='/proc', *args, **kwargs):
+    """Return namespaces to enter.
+
+    Arguments are the same as namespaces of setns.
+    Namespaces of current process are skipped:
+    entering them changes nothing, but may fail
+    without capabilities in them, e.g. after
+    new user namespace.
+
+    Return:
+      list: namespace and path of its file
+        in order of entering
+
+    """
+    args = list(args)
+    # all as default
+    if ((len(args) == 0 and len(kwargs) == 0) or
+       ('all' in args or ('all' in kwargs and kwargs['all']))):
+        all_ns = True
+    else:
+        all_ns = False
+    entries = []
+    for ns in na:
+        value = pop_all(na[ns]['aliases'], args, kwargs, None)
+        if type(value) is str and exists(value):
+            path = value
+        elif value or (all_ns and value is None):
+            path = fdtmp.format(proc, target_pid, ns)
+        else:
+            continue
+        if not same_namespace(path, ns, proc):
+            entries.append((ns, path))
+    return entries
+
+def enter(entries, target_pid=None, proc='/proc', cache=None):
+    """Enter namespaces without restoring.
+
+    Namespaces of target_pid are entered with one
+    setns call on its pidfd if kernel supports it,
+    other ones with setns call per namespace file.
+
+    Args:
+      entries (list): namespace and path, see resolve
+      target_pid (str or int): pid of process
+        of namespace files, default is None
+      proc (str): root directory of proc fs,
+        default is '/proc'
+      cache (NamespaceCache): cache of namespace files
+        and pidfds, default is None: files are opened
+        for this call only
+
+    Raises:
+      ValueError: setns of namespace file failed
+
+    """
+    if cache is None:
+        cache = NamespaceCache()
+        try:
+            return enter(entries, target_pid, proc, cache)
+        finally:
+            cache.clear()
+    flags = 0
+    for ns, path in entries:
+        flags |= na[ns]['flag']
+    if (flags and target_pid and has_pidfd_setns() and
+            all(path == fdtmp.format(proc, target_pid, ns)
+                for ns, path in entries)):
+        try:
+            fd = cache.pidfd(target_pid)
+        except OSError:
+            fd = None
+        if fd is not None:
+            if libc.setns(fd, flags) == 0:
+                return
+            # setns of pidfd is atomic, nothing is entered,
+            # errors of files are more informative
+            cache.discard_pidfd(target_pid)
+    for ns, path in entries:
+        fd = cache.open(path)
+        if libc.setns(fd, na[ns]['flag']) == -1:
+            raise ValueError("Namespace file %s has invalid type %s" %
+                             (path, na[ns]['flag']))
+
+
+class NamespaceCache(object):
+    """Cache of opened namespace files.
+
+    Keeps file descriptors of namespace files open
+    between setns calls. Every entry is checked by
+    device and inode of the namespace file, so it
+    goes stale when the target process dies or its
+    pid is reused by process in other namespace.
+
+    Opened files keep namespaces alive, so entries
+    of exited targets are closed by `prune`, which
+    runs when count of entries reaches `limit`.
+    Call `clear` when targets are gone together,
+    e.g. after the containers are joined.
+
+    """
+    def __init__(self, limit=64):
+        """Create empty cache.
+
+        Args:
+          limit (int): count of entries after which
+            stale ones are pruned, doubled while
+            live entries exceed its half, default is 64
+
+        """
+        self.limit = self._limit = limit
+        self._fds = {}
+        self._pidfds = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._fds) + len(self._pidfds)
+
+    def open(self, path):
+        """Return opened file descriptor of namespace file.
+
+        Args:
+          path (str): path to namespace file
+
+        Return:
+          int: file descriptor
+
+        Raises:
+          OSError: namespace file does not exist
+
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.discard(path)
+            raise
+        with self._lock:
+            entry = self._fds.get(path)
+            if entry is not None:
+                if entry[1:] == (st.st_dev, st.st_ino):
+                    return entry[0]
+                os.close(entry[0])
+                del self._fds[path]
+            self._grow()
+            fd = os.open(path, os.O_RDONLY)
+            fst = os.fstat(fd)
+            self._fds[path] = (fd, fst.st_dev, fst.st_ino)
+            return fd
+
+    def get(self, pid, ns, proc='/proc'):
+        """Return opened file descriptor of pid namespace.
+
+        Args:
+          pid (str or int): pid of process
+          ns (str): name of namespace: 'user', 'ipc',
+            'uts', 'net', 'pid' or 'mnt'
+          proc (str): root directory of proc fs,
+            default is '/proc'
+
+        Return:
+          int: file descriptor
+
+        Raises:
+          OSError: process does not exist
+
+        """
+        return self.open(fdtmp.format(proc, pid, ns))
+
+    def preload(self, pid, proc='/proc', *nspaces):
+        """Open namespaces files of pid.
+
+        Useful before fork: child processes
+        inherit the opened file descriptors.
+
+        Args:
+          pid (str or int): pid of process
+          proc (str): root directory of proc fs,
+            default is '/proc'
+          *nspaces (list): names of namespaces,
+            default is all namespaces
+
+        """
+        if not nspaces or 'all' in nspaces:
+            nspaces = na
+        for ns in nspaces:
+            if ns in na:
+                self.get(pid, ns, proc)
+
+    def pidfd(self, pid):
+        """Return cached pidfd of process.
+
+        Pidfd of exited process never refers to other
+        one, setns with it fails and it is discarded.
+
+        Args:
+          pid (str or int): pid of process
+
+        Raises:
+          OSError: process does not exist
+
+        """
+        pid = int(pid)
+        with self._lock:
+            fd = self._pidfds.get(pid)
+            if fd is None:
+                self._grow()
+                fd = self._pidfds[pid] = pidfd_open(pid)
+            return fd
+
+    def discard_pidfd(self, pid):
+        """Close cached pidfd of pid if any."""
+        with self._lock:
+            fd = self._pidfds.pop(int(pid), None)
+        if fd is not None:
+            os.close(fd)
+
+    def discard(self, path):
+        """Close cached file descriptor of path if any."""
+        with self._lock:
+            entry = self._fds.pop(path, None)
+        if entry is not None:
+            os.close(entry[0])
+
+    def _grow(self):
+        """Prune stale entries if cache is full.
+
+        Called with the lock held before adding entry.
+
+        """
+        if len(self) < self._limit:
+            return
+        self._prune()
+        self._limit = max(self.limit, 2 * len(self))
+
+    def _prune(self):
+        """Close stale entries, called with the lock held."""
+        for path, (fd, dev, ino) in list(self._fds.items()):
+            try:
+                st = os.stat(path)
+                if (st.st_dev, st.st_ino) == (dev, ino):
+                    continue
+            except OSError:
+                pass
+            os.close(fd)
+            del self._fds[path]
+        poller = select.poll()
+        for fd in self._pidfds.values():
+            poller.register(fd, select.POLLIN)
+        exited = set(fd for fd, event in poller.poll(0))
+        for pid, fd in list(self._pidfds.items()):
+            if fd in exited:
+                os.close(fd)
+                del self._pidfds[pid]
+
+    def prune(self):
+        """Close file descriptors of exited targets.
+
+        Namespace file goes stale when its path does not
+        exist or refers to other namespace, pidfd when
+        its process has exited.
+
+        """
+        with self._lock:
+            self._prune()
+            self._limit = max(self.limit, 2 * len(self))
+
+    def clear(self):
+        """Close all cached file descriptors.
+
+        Should be called when cached targets have
+        exited and the cache is not needed anymore.
+
+        """
+        with self._lock:
+            for fd, dev, ino in self._fds.values():
+                os.close(fd)
+            self._fds.clear()
+            for fd in self._pidfds.values():
+                os.close(fd)
+            self._pidfds.clear()
+
+namespaces = NamespaceCache()
+"""Shared cache of namespace files, passed as cache argument"""
+
+
 @contextmanager
 def setns(target_pid, parent_pid=0, proc='/proc', *args, **kwargs):
     """Change current namespaces to pid namespaces.
 
+    Namespaces of target_pid are entered with one setns
+    call on its pidfd on kernels since 5.8 and restored
+    the same way from pidfd of parent_pid if it is
+    other process, see `enter`.
+
     Changes:
       pid -> target_pid since v1.4
       add parent_pid since v.1.4
@@ -31,6 +379,13 @@ def setns(target_pid, parent_pid=0, proc='/proc', *args, **kwargs):
         default is '/proc'
       *args (list): list of namespaces
       **kwargs (dict): dict of namespaces
+      cache (NamespaceCache): cache of namespace files,
+        default is None: files are opened for this call
+        and closed on exit
+      restore (bool): restore namespaces on exit,
+        default is True
+      entries (list): namespaces resolved by `resolve`
+        instead of args and kwargs, default is None
 
     As args or kwargs expected one or many of keys:
       all (bool): set all 6 namespaces,
@@ -64,31 +419,40 @@ def setns(target_pid, parent_pid=0, proc='/proc', *args, **kwargs):
     be used.
 
     """
+    args = list(args)
+    cache = pop('cache', args, kwargs, None)
+    restore = pop('restore', args, kwargs, True)
+    entries = pop('entries', args, kwargs, None)
     parent_pid = parent_pid or getpid()
-    # all as default
-    if ((len(args) == 0 and len(kwargs) == 0) or
-       ('all' in args or ('all' in kwargs and kwargs['all']))):
-        all_ns = True
-    else:
-        all_ns = False
-    #'{proc}/{pid}/ns/{ns}'
-    fdtmp = '{0}/{1}/ns/{2}'
+    if entries is None:
+        entries = resolve(target_pid, proc, *args, **kwargs)
+    flags = 0
+    for ns, path in entries:
+        flags |= na[ns]['flag']
+    # namespaces of parent are opened before entering
+    # new ones, so we can restore them even if parent_pid
+    # is the current process
+    owned = cache is None
+    if owned:
+        cache = NamespaceCache()
+    parent = None
     try:
-        for ns in na:
-            value = pop_all(na[ns]['aliases'], args, kwargs, None)
-            if type(value) is str and exists(value):
-                namespace = value
-            elif value or (all_ns and value is None):
-                namespace = fdtmp.format(proc, target_pid, na[ns]['aliases'][0])
-            if namespace:
-                with open(namespace) as f:
-                    if libc.setns(f.fileno(), na[ns]['flag']) == -1:
-                        raise ValueError("Namespace file %s has invalid type %s" %
-                                        (f.fileno(), na[ns]['flag'])
-                        )
-                break
-        yield
+        if restore and entries:
+            if (int(parent_pid) != getpid() and has_pidfd_setns() and
+                    not flags & na['user']['flag']):
+                parent = cache.pidfd(parent_pid)
+            else:
+                parent = [(ns, cache.get(parent_pid, ns, proc))
+                          for ns, path in entries]
+        try:
+            enter(entries, target_pid, proc, cache)
+            yield
+        finally:
+            if isinstance(parent, list):
+                for ns, fd in parent:
+                    libc.setns(fd, na[ns]['flag'])
+            elif parent is not None:
+                libc.setns(parent, flags)
     finally:
-        for ns in na:
-            with open(fdtmp.format(proc, parent_pid, na[ns]['aliases'][0])) as f:
-                libc.setns(f.fileno(), na[ns]['flag'])
+        if owned:
+            cache.clear()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""This is part of [pyspaces](https://github.com/Friz-zy/pyspaces)
+
+License: MIT or BSD or Apache 2.0
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Exec mode of `Container`: everything the child needs is prepared
+in the parent, so the cloned child only runs a chain of libc
+calls without executing python bytecode: it waits for UID and GID
+maps, changes root, working dir and stdio and calls execve.
+
+"""
+
+
+import os
+import sys
+from functools import partial
+from operator import eq, ne, is_not, methodcaller
+from itertools import takewhile
+from collections import deque
+from .libc import pylibc, c_char_p, create_string_buffer
+try:
+    from itertools import imap
+except ImportError:
+    # python 3
+    imap = map
+
+EXIT_FAILURE = 127
+"""Exit code of child if libc call before exec fails"""
+
+
+def to_bytes(value):
+    """Encode str with filesystem encoding."""
+    if isinstance(value, bytes):
+        return value
+    return value.encode(sys.getfilesystemencoding() or 'utf-8')
+
+def which(name, path=None):
+    """Find executable like execvp does.
+
+    Args:
+      name (str): name or path of executable
+      path (str): search path,
+        default is PATH from environment
+
+    Return:
+      str: path to executable or None
+
+    """
+    if os.sep in name:
+        return name if os.access(name, os.X_OK) else None
+    if path is None:
+        path = os.environ.get('PATH', os.defpath)
+    for directory in path.split(os.pathsep):
+        candidate = os.path.join(directory or os.curdir, name)
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return candidate
+    return None
+
+def checked(steps, code=EXIT_FAILURE):
+    """Return chain that stops on first failed libc call.
+
+    Calls and checks of their results are implemented
+    in C, so the chain runs without python bytecode.
+
+    Args:
+      steps (list): pairs of function without arguments
+        and predicate that is True for its successful result
+      code (int): exit code of child if call fails,
+        default is EXIT_FAILURE
+
+    Return:
+      list: functions without arguments: first one
+        calls steps while they succeed, second one exits
+
+    """
+    call = methodcaller('__call__')
+    funcs = [f for f, ok in steps]
+    checks = [ok for f, ok in steps]
+    results = imap(call, imap(partial, checks, imap(call, funcs)))
+    return [partial(deque, takewhile(bool, results), 0),
+            partial(pylibc._exit, code)]
+
+def cstrings(values):
+    """Return NULL terminated array of C strings."""
+    values = [to_bytes(v) for v in values]
+    return (c_char_p * (len(values) + 1))(*(values + [None]))
+
+
+class ExecPlan(object):
+    """Execution of program in cloned child.
+
+    File descriptors of binary and stdio are opened
+    in the parent before clone and closed after it.
+
+    """
+    def __init__(self, argv, env=None, rootdir=None, workdir=None,
+                 stdin=None, stdout=None, stderr=None):
+        """Set program and its environment.
+
+        Args:
+          argv (list): program with its arguments,
+            program is searched in PATH if it has no slash
+          env (dict): environment of program,
+            default is os.environ
+          rootdir (str): path to new root, program is
+            searched in PATH inside of it after chroot,
+            default is None
+          workdir (str): new working dir, default is None
+          stdin, stdout, stderr (str, int, fo): path, file
+            descriptor or file object for stdio of program,
+            default is None
+
+        Raises:
+          ValueError: argv is empty
+
+        """
+        if not argv:
+            raise ValueError('argv is empty')
+        self.argv = list(argv)
+        self.env = os.environ if env is None else env
+        self.rootdir = rootdir
+        self.workdir = workdir
+        self.stdio = (stdin, stdout, stderr)
+        self.fds = []
+
+    def open(self, value, flags):
+        """Return file descriptor for value of stdio."""
+        if value in (None, False):
+            return None
+        if isinstance(value, int):
+            return value
+        if hasattr(value, 'fileno'):
+            if hasattr(value, 'flush'):
+                value.flush()
+            return value.fileno()
+        fd = os.open(value, flags | getattr(os, 'O_CLOEXEC', 0), 0o666)
+        self.fds.append(fd)
+        return fd
+
+    def entry(self, pipe_fd):
+        """Open files and return chain of libc calls for child.
+
+        Child exits with EXIT_FAILURE if any call fails
+        or if the parent closes the pipe without writing.
+
+        Args:
+          pipe_fd (tuple): handshake pipe of Clone
+
+        Return:
+          list: functions without arguments
+
+        Raises:
+          OSError: can not open binary or stdio files
+
+        """
+        argv = cstrings(self.argv)
+        envp = cstrings('%s=%s' % (k, v) for k, v in self.env.items())
+        self.buffer = create_string_buffer(1)
+        succeeded = partial(ne, -1)
+        chain = [
+            (partial(pylibc.close, pipe_fd[1]), succeeded),
+            # wait until the parent has updated the maps
+            (partial(pylibc.read, pipe_fd[0], self.buffer, 1),
+             partial(eq, 1)),
+            (partial(pylibc.close, pipe_fd[0]), succeeded),
+        ]
+        if self.rootdir:
+            rootdir = to_bytes(self.rootdir)
+            chain.append((partial(pylibc.chdir, rootdir), succeeded))
+            chain.append((partial(pylibc.chroot, rootdir), succeeded))
+        if self.workdir:
+            chain.append((partial(pylibc.chdir, to_bytes(self.workdir)),
+                          succeeded))
+        try:
+            for target, value, flags in zip(
+                    (0, 1, 2), self.stdio,
+                    (os.O_RDONLY, os.O_WRONLY | os.O_CREAT | os.O_APPEND,
+                     os.O_WRONLY | os.O_CREAT | os.O_APPEND)):
+                fd = self.open(value, flags)
+                if fd is not None and fd != target:
+                    chain.append((partial(pylibc.dup2, fd, target), succeeded))
+            if self.rootdir:
+                program = to_bytes(self.argv[0])
+                chain.append((partial(pylibc.execvpe, program, argv, envp),
+                              succeeded))
+            else:
+                path = which(self.argv[0], self.env.get('PATH'))
+                if path is None:
+                    raise OSError(2, 'No such file or directory: %r' %
+                                  self.argv[0])
+                fd = os.open(path, os.O_RDONLY | getattr(os, 'O_CLOEXEC', 0))
+                self.fds.append(fd)
+                # fexecve of script fails on close-on-exec descriptor,
+                # such scripts are executed by path
+                chain.append((partial(pylibc.fexecve, fd, argv, envp),
+                              partial(is_not, None)))
+                chain.append((partial(pylibc.execve, to_bytes(path),
+                                      argv, envp), succeeded))
+        except Exception:
+            self.close()
+            raise
+        # keep arrays alive while child uses them
+        self.arrays = (argv, envp)
+        return checked(chain)
+
+    def close(self):
+        """Close files opened for child."""
+        for fd in self.fds:
+            os.close(fd)
+        self.fds = []
+
+
+def run(argv, wait=True, **kwargs):
+    """Execute program in new namespaces.
+
+    Like subprocess.call, but child is `Container`
+    in exec mode, see `Container` exec_argv argument.
+
+    Args:
+      argv (list): program with its arguments
+      wait (bool): wait for exit of program,
+        default is True
+      **kwargs (dict): arguments for Container.__init__
+
+    Return:
+      int or Container: exit code or started container
+        if wait is False
+
+    """
+    from .process import Container
+    c = Container(exec_argv=argv, **kwargs)
+    c.start()
+    if not wait:
+        return c
+    c.join()
+    return c.exitcode
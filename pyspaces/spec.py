@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""This is part of [pyspaces](https://github.com/Friz-zy/pyspaces)
+
+License: MIT or BSD or Apache 2.0
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+"""
+
+
+import os
+from multiprocessing import Process
+from .process import Container
+from .cloning import arg2map
+from .spawn import ExecPlan
+
+
+class ContainerSpec(object):
+    """Immutable template of containers.
+
+    Arguments are parsed once by `Container.__init__`
+    of template container: clone flags, UID and GID maps,
+    working dir and stdio are resolved up front, so
+    `spawn` only copies them into new container.
+
+    """
+    __slots__ = (
+        'container', 'clone_flags', 'uid_map', 'gid_map', 'proc',
+        'stack_size', 'timed', 'kwargs', 'process_kwargs', 'exec_plan',
+        'placement',
+    )
+
+    def __init__(self, container=Container, **kwargs):
+        """Parse arguments of containers.
+
+        Args:
+          container (class): class of containers,
+            default is Container
+          **kwargs (dict): arguments for Container.__init__
+            except target, args and kwargs
+
+        Raises:
+          ValueError: uid_map or gid_map is IdLease,
+            lease can not be shared by containers
+
+        """
+        for name in ('uid_map', 'gid_map'):
+            if hasattr(kwargs.get(name), 'release'):
+                raise ValueError('%s can not be leased range of ids' % name)
+        template = container(**kwargs)
+        init = object.__setattr__
+        init(self, 'container', container)
+        init(self, 'clone_flags', template.clone_flags)
+        maps = []
+        for value, id in ((template.uid_map, os.getuid()),
+                          (template.gid_map, os.getgid())):
+            if template.map_zero or value is True:
+                value = "0 %d 1" % id
+            elif value is False:
+                value = ""
+            elif value:
+                value = arg2map(value)
+            maps.append(value)
+        uid_map, gid_map = maps
+        init(self, 'uid_map', uid_map)
+        init(self, 'gid_map', gid_map)
+        init(self, 'proc', template.proc)
+        init(self, 'stack_size', template.stack_size)
+        init(self, 'timed', template.timed)
+        init(self, 'exec_plan', template.exec_plan)
+        init(self, 'placement', template.placement)
+        init(self, 'kwargs', dict(template.kwargs))
+        process_kwargs = {}
+        for k in ('name', 'daemon', 'group'):
+            if k in template.kwargs:
+                process_kwargs[k] = template.kwargs[k]
+        init(self, 'process_kwargs', process_kwargs)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('ContainerSpec is immutable')
+
+    def __repr__(self):
+        return '<ContainerSpec %s flags=%#x>' % (
+            self.container.__name__, self.clone_flags)
+
+    def spawn(self, target=None, args=(), kwargs=None, **process_kwargs):
+        """Create new container without parsing of arguments.
+
+        Args:
+          target (callable object): callable object to be
+            invoked by the run() method, not used if spec
+            has exec_argv
+          args (tuple): argument tuple for the target
+            invocation, default is ()
+          kwargs (dict): dict of keyword arguments for
+            the target invocation, default is {}
+          **process_kwargs (dict): name or daemon
+            for Process.__init__
+
+        Return:
+          Container: not started container
+
+        """
+        c = self.container.__new__(self.container)
+        c.args = ()
+        c.kwargs = dict(self.kwargs)
+        c.kwargs['target'] = target
+        c.kwargs['args'] = tuple(args)
+        c.kwargs['kwargs'] = {} if kwargs is None else kwargs
+        c.clone_flags = self.clone_flags
+        c.uid_map = self.uid_map
+        c.gid_map = self.gid_map
+        c.map_zero = False
+        c.proc = self.proc
+        c.stack_size = self.stack_size
+        c.timed = self.timed
+        c.placement = self.placement
+        c.reset()
+        c.exec_plan = None
+        if self.exec_plan is not None:
+            # plan keeps descriptors while it is executed,
+            # every container gets its own one
+            plan = self.exec_plan
+            c.exec_plan = ExecPlan(plan.argv, plan.env, plan.rootdir,
+                                   plan.workdir, *plan.stdio)
+        if process_kwargs:
+            kw = dict(self.process_kwargs, **process_kwargs)
+        else:
+            kw = self.process_kwargs
+        Process.__init__(c, target=c.runup, **kw)
+        return c
+
+    def start(self, target=None, args=(), kwargs=None, **process_kwargs):
+        """Spawn and start new container.
+
+        See `ContainerSpec.spawn`.
+
+        Return:
+          Container: started container
+
+        """
+        c = self.spawn(target, args, kwargs, **process_kwargs)
+        c.start()
+        return c
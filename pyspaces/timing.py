@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""This is part of [pyspaces](https://github.com/Friz-zy/pyspaces)
+
+License: MIT or BSD or Apache 2.0
+Copyright (c) 2014 Filipp Kucheryavy aka Frizzy <filipp.s.frizzy@gmail.com>
+
+Startup latency of containers: phases are timestamped
+with monotonic clock, which is the same in parent and
+in cloned child, and collected into histograms.
+
+"""
+
+
+import time
+import threading
+from collections import OrderedDict
+
+clock = getattr(time, 'monotonic', time.time)
+"""Monotonic clock, time.time on python 2"""
+
+
+class Timer(object):
+    """Durations of consecutive phases."""
+    def __init__(self, start=None):
+        """Start timer.
+
+        Args:
+          start (float): timestamp of start,
+            default is now
+
+        """
+        self.start = clock() if start is None else start
+        self.last = self.start
+        self.phases = OrderedDict()
+
+    def lap(self, name):
+        """Save time since previous lap as phase.
+
+        Args:
+          name (str): name of finished phase
+
+        """
+        now = clock()
+        self.phases[name] = now - self.last
+        self.last = now
+
+    def dumps(self):
+        """Return phases as one line of json."""
+        import json
+        return json.dumps(list(self.phases.items())) + '\n'
+
+    @staticmethod
+    def loads(data):
+        """Return phases dumped by Timer.dumps.
+
+        Args:
+          data (str): line of json
+
+        Return:
+          OrderedDict: phase name and duration in seconds
+
+        """
+        import json
+        return OrderedDict((str(k), v) for k, v in json.loads(data))
+
+
+class Histogram(object):
+    """Log-linear histogram in the spirit of HdrHistogram.
+
+    Values are counted in microseconds. Each power of two
+    is split into 2 ** (bits - 1) buckets, so relative
+    error of reported values is below 2 ** (1 - bits).
+
+    """
+    def __init__(self, bits=7):
+        """Set precision.
+
+        Args:
+          bits (int): bits of precision,
+            default is 7 (less than 1.6% error)
+
+        """
+        self.bits = bits
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def bucket(self, value):
+        """Return key of bucket for value in microseconds."""
+        shift = max(value.bit_length() - self.bits, 0)
+        return shift, value >> shift
+
+    def record(self, seconds):
+        """Count value.
+
+        Args:
+          seconds (float): recorded value
+
+        """
+        value = max(int(seconds * 1e6), 0)
+        key = self.bucket(value)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Add counts of other histogram with the same precision.
+
+        Args:
+          other (Histogram): added histogram
+
+        Raises:
+          ValueError: precision differs
+
+        """
+        if other.bits != self.bits:
+            raise ValueError('Precision %d differs from %d' %
+                             (other.bits, self.bits))
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def buckets(self):
+        """Return non-empty buckets in ascending order.
+
+        Return:
+          list: highest value of bucket in seconds and count
+
+        """
+        return [((((m + 1) << s) - 1) / 1e6, self.counts[(s, m)])
+                for s, m in sorted(self.counts)]
+
+    def percentile(self, p):
+        """Return value at percentile.
+
+        Args:
+          p (float): percentile from 0 to 100
+
+        Return:
+          float: highest value of bucket in seconds
+            or None if histogram is empty
+
+        """
+        if not self.count:
+            return None
+        rank = max(p / 100.0 * self.count, 1)
+        seen = 0
+        for value, count in self.buckets():
+            seen += count
+            if seen >= rank:
+                return min(value, self.max / 1e6)
+        return self.max / 1e6
+
+    def mean(self):
+        """Return mean value in seconds or None."""
+        if not self.count:
+            return None
+        return self.total / 1e6 / self.count
+
+    def reset(self):
+        """Forget all values."""
+        self.counts.clear()
+        self.count = self.total = 0
+        self.min = self.max = None
+
+
+class Histograms(object):
+    """Process-wide histograms of startup phases."""
+    def __init__(self, bits=7):
+        """Set precision of histograms.
+
+        Args:
+          bits (int): bits of precision,
+            default is 7
+
+        """
+        self.bits = bits
+        self.histograms = OrderedDict()
+        self.exporters = []
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        return self.histograms[name]
+
+    def __contains__(self, name):
+        return name in self.histograms
+
+    def __len__(self):
+        return len(self.histograms)
+
+    def record(self, phases):
+        """Record durations of phases of one container.
+
+        Args:
+          phases (dict): phase name and duration in seconds
+
+        """
+        with self._lock:
+            for name, seconds in phases.items():
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = Histogram(self.bits)
+                histogram.record(seconds)
+
+    def add_exporter(self, exporter):
+        """Add function called by export.
+
+        Args:
+          exporter (callable): function that takes
+            dict of phase name and Histogram
+
+        """
+        self.exporters.append(exporter)
+
+    def remove_exporter(self, exporter):
+        """Remove function added by add_exporter."""
+        self.exporters.remove(exporter)
+
+    def export(self, reset=False):
+        """Pass snapshot of histograms to every exporter.
+
+        Args:
+          reset (bool): forget recorded values
+            after export, default is False
+
+        Return:
+          dict: phase name and copy of Histogram
+
+        """
+        with self._lock:
+            snapshot = OrderedDict()
+            for name, histogram in self.histograms.items():
+                snapshot[name] = Histogram(self.bits)
+                snapshot[name].merge(histogram)
+                if reset:
+                    histogram.reset()
+        for exporter in list(self.exporters):
+            exporter(snapshot)
+        return snapshot
+
+    def clear(self):
+        """Remove all histograms."""
+        with self._lock:
+            self.histograms.clear()
+
+
+histograms = Histograms()
+"""Histograms of containers started with timings=True"""
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import sys
+import time
+import signal
+import pytest
+import asyncio
+from pyspaces import Container, Inject, aio
+
+
+def run(coroutine):
+    """Run coroutine in new event loop."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+def test_container_wait():
+    """Check waiting for many containers in event loop"""
+    async def main():
+        containers = [Container(target=sys.exit, args=(i,), newuts=True)
+                      for i in range(10)]
+        for c in containers:
+            await c.start_async()
+        return await asyncio.gather(*[c.wait() for c in containers])
+    assert run(main()) == list(range(10))
+
+def test_container_wait_sigchld(monkeypatch):
+    """Check waiting through SIGCHLD handler without pidfd"""
+    monkeypatch.setattr(aio, 'get_pidfd', lambda process: (None, False))
+    async def main():
+        c = Container(target=sys.exit, args=(5,), newuts=True)
+        await c.start_async()
+        return await c.wait()
+    assert run(main()) == 5
+
+def test_sigchld_handler_restored(monkeypatch):
+    """Check that previous SIGCHLD handler is chained and restored"""
+    monkeypatch.setattr(aio, 'get_pidfd', lambda process: (None, False))
+    calls = []
+    def handler(signum, frame):
+        calls.append(signum)
+    async def main():
+        c = Container(target=sys.exit, args=(5,), newuts=True)
+        await c.start_async()
+        return await c.wait()
+    previous = signal.signal(signal.SIGCHLD, handler)
+    try:
+        assert run(main()) == 5
+        assert signal.getsignal(signal.SIGCHLD) is handler
+    finally:
+        signal.signal(signal.SIGCHLD, previous)
+    assert signal.SIGCHLD in calls
+
+def test_sigchld_loop_handler(monkeypatch):
+    """Check that handler of event loop is not replaced"""
+    monkeypatch.setattr(aio, 'get_pidfd', lambda process: (None, False))
+    c = Container(target=sys.exit, args=(5,), newuts=True)
+    async def main():
+        loop = asyncio.get_event_loop()
+        loop.add_signal_handler(signal.SIGCHLD, os.getpid)
+        await c.start_async()
+        try:
+            with pytest.raises(RuntimeError):
+                c.wait()
+        finally:
+            loop.remove_signal_handler(signal.SIGCHLD)
+        return await c.wait()
+    assert run(main()) == 5
+
+def test_container_cancel():
+    """Check that cancellation kills container"""
+    c = Container(target=time.sleep, args=(10,), newuts=True)
+    async def main():
+        await c.start_async()
+        try:
+            await asyncio.wait_for(c.wait(), 0.1)
+        except asyncio.TimeoutError:
+            pass
+        while c.exitcode is None:
+            await asyncio.sleep(0.01)
+    run(main())
+    assert c.exitcode == -9
+
+def test_async_inject():
+    """Check Inject as asynchronous context manager"""
+    c = Container(target=time.sleep, args=(1,),
+                  uid_map=True, newuser=True
+                  )
+    c.start()
+    i = Inject(c.pid, os._exit, (3,), all=True)
+    async def main():
+        async with i:
+            pass
+    run(main())
+    assert i.exitcode == 3
+    c.kill()
+    c.join()
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import sys
+import pytest
+from pyspaces import Container
+import socket
+from pyspaces.capture import Stream, Reader, Forward
+
+
+def chatty(lines=3):
+    """Write lines into stdout and stderr"""
+    for i in range(lines):
+        sys.stdout.write('out %d\n' % i)
+    sys.stdout.flush()
+    os.write(2, b'err\n')
+
+def test_overflow():
+    """Check that buffer is bounded with every policy"""
+    s = Stream('stdout', 8)
+    s.feed(b'0123456')
+    s.feed(b'789abc')
+    assert s.read() == b'56789abc' and s.dropped == 5
+    s = Stream('stdout', 8, 'newest')
+    s.feed(b'0123456')
+    s.feed(b'789abc')
+    assert s.read() == b'01234567' and s.dropped == 5
+    s = Stream('stdout', 8, 'pause')
+    assert s.feed(b'0123')
+    assert not s.feed(b'4567') and s.paused
+    s.read(2)
+    assert not s.paused
+    with pytest.raises(ValueError):
+        Stream('stdout', 8, 'grow')
+
+def test_lines():
+    """Check lines longer than buffer and the last line"""
+    s = Stream('stdout', 4)
+    s.feed(b'ab\n')
+    assert s.readline() == b'ab\n'
+    s.feed(b'cdef')
+    assert s.readline() == b'cdef'
+    s.feed(b'gh')
+    s.close()
+    assert list(s) == [b'gh']
+    lines = []
+    s = Stream('stdout', 4, on_line=lambda s, l: lines.append(l))
+    s.feed(b'ab\ncd')
+    s.feed(b'efgh\ni')
+    s.close()
+    assert lines == [b'ab\n', b'cdef', b'gh\n', b'i'] and not len(s)
+
+def test_container_capture():
+    """Check captured output of python and exec containers"""
+    c = Container(target=chatty, capture=True)
+    c.start()
+    assert list(c.capture.stdout) == [b'out 0\n', b'out 1\n', b'out 2\n']
+    assert c.capture.stderr.read() == b'err\n'
+    c.join()
+    assert c.exitcode == 0
+    c = Container(exec_argv=['sh', '-c', 'echo out; echo err >&2'],
+                  capture={'size': 16})
+    c.start()
+    c.join()
+    assert c.capture.wait(5)
+    assert c.capture.stdout.read() == b'out\n'
+    assert c.capture.stderr.read() == b'err\n'
+
+def test_stdio_paths(tmpdir):
+    """Check that stdout and stderr paths are created and appended"""
+    out = tmpdir.join('out')
+    err = tmpdir.join('err')
+    err.write('old\n')
+    c = Container(target=chatty, args=(1,), stdout=str(out), stderr=str(err))
+    c.start()
+    c.join()
+    assert c.exitcode == 0
+    assert out.read() == 'out 0\n'
+    assert err.read() == 'old\nerr\n'
+
+def leaked_paths(paths):
+    """Exit with count of descriptors on paths except stdio"""
+    stdio = set([0, 1, 2, sys.stdout.fileno(), sys.stderr.fileno()])
+    count = 0
+    for fd in os.listdir('/proc/self/fd'):
+        if int(fd) in stdio:
+            continue
+        try:
+            count += os.readlink('/proc/self/fd/' + fd) in paths
+        except OSError:
+            # descriptor of listed directory
+            pass
+    sys.exit(count)
+
+def test_stdio_paths_closed(tmpdir):
+    """Check that descriptors of stdio paths are closed after dup2"""
+    out = str(tmpdir.join('out'))
+    err = str(tmpdir.join('err'))
+    c = Container(target=leaked_paths, args=([out, err],), stdout=out,
+                  stderr=err)
+    c.start()
+    c.join()
+    assert c.exitcode == 0
+
+def test_many_bounded():
+    """Check many chatty containers with one reader"""
+    reader = Reader()
+    chunks = []
+    containers = []
+    for i in range(20):
+        c = Container(target=chatty, args=(2000,),
+                      capture={'size': 1024, 'reader': reader})
+        c.start()
+        containers.append(c)
+    for c in containers:
+        c.join()
+        assert c.capture.wait(5)
+        assert len(c.capture.stdout) == 1024
+        assert c.capture.stdout.total == len(''.join(
+            'out %d\n' % i for i in range(2000)))
+        assert c.capture.stdout.readline().endswith(b'\n')
+    assert len(reader) == 0
+
+def test_pause():
+    """Check that paused pipe is read after drain"""
+    c = Container(target=chatty, args=(5000,),
+                  capture={'size': 4096, 'overflow': 'pause'})
+    c.start()
+    data = b''.join(c.capture.stdout.chunks())
+    c.join()
+    assert data.count(b'\n') == 5000 and c.capture.stdout.dropped == 0
+
+def test_forward_rotation(tmpdir):
+    """Check forwarding into rotated file"""
+    log = str(tmpdir.join('log'))
+    forward = Forward(log, max_bytes=4096, backups=2)
+    c = Container(target=chatty, args=(2000,), forward={'stdout': forward})
+    c.start()
+    c.join()
+    assert c.capture.wait(5)
+    total = len(''.join('out %d\n' % i for i in range(2000)))
+    assert forward.bytes == total and forward.copied == 0
+    assert forward.rotations == total // 4096
+    assert sorted(os.listdir(str(tmpdir))) == ['log', 'log.1', 'log.2']
+    assert os.path.getsize(log + '.1') == 4096
+    with open(log) as f:
+        assert f.read().endswith('out 1999\n')
+
+def test_forward_shared_file(tmpdir):
+    """Check that containers forwarding into one file do not overwrite it"""
+    log = str(tmpdir.join('log'))
+    containers = [Container(target=chatty, args=(200,), forward=log)
+                  for i in range(2)]
+    for c in containers:
+        c.start()
+    for c in containers:
+        c.join()
+        assert c.capture.wait(5)
+    assert containers[0].capture.stdout is containers[1].capture.stdout
+    with open(log) as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 402 and lines.count('err') == 2
+
+def test_forward_open_error(tmpdir):
+    """Check that destination is opened before clone"""
+    c = Container(target=chatty, forward=str(tmpdir.join('no', 'log')))
+    with pytest.raises(OSError):
+        c.start()
+    assert c.pid is None
+
+def test_forward_socket(tmpdir):
+    """Check forwarding into socket and into buffer at once"""
+    a, b = socket.socketpair()
+    c = Container(target=chatty, forward={'stdout': a})
+    c.start()
+    c.join()
+    assert c.capture.wait(5)
+    a.close()
+    data = b''
+    while True:
+        chunk = b.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    b.close()
+    assert data == b'out 0\nout 1\nout 2\n'
+    assert c.capture.stdout.bytes == len(data)
+    assert c.capture.stderr.read() == b'err\n'
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import time
+import pytest
+from pyspaces import Container
+from pyspaces.cgroup import Cgroup, format_value
+
+UNIFIED = [p for p in ('/sys/fs/cgroup', '/sys/fs/cgroup/unified')
+           if os.path.exists(os.path.join(p, 'cgroup.procs'))
+           and os.access(p, os.W_OK)]
+
+limits = {
+    'cpu.max': (50000, 100000),
+    'memory.max': 64 * 2 ** 20,
+    'pids.max': 16,
+    'io.max': '8:0 rbps=1048576\n8:16 wbps=max',
+}
+
+
+def fake_root(tmpdir):
+    """Return fake cgroup v2 root"""
+    tmpdir.join('cgroup.controllers').write('cpu io memory pids')
+    tmpdir.join('cgroup.subtree_control').write('memory')
+    return str(tmpdir)
+
+def test_format():
+    """Check values of interface files"""
+    assert format_value(None) == 'max'
+    assert format_value((None, 100000)) == 'max 100000'
+    assert format_value(10) == '10'
+
+def test_fake_tree(tmpdir):
+    """Check limits, controllers and stats in fake tree"""
+    cgroup = Cgroup('box', fake_root(tmpdir), limits)
+    cgroup.create()
+    box = tmpdir.join('box')
+    assert tmpdir.join('cgroup.subtree_control').read() == '+cpu +io +pids'
+    assert box.join('cpu.max').read() == '50000 100000'
+    assert box.join('memory.max').read() == str(64 * 2 ** 20)
+    assert box.join('io.max').read() == '8:0 rbps=10485768:16 wbps=max'
+    box.join('cpu.stat').write('usage_usec 10\nuser_usec 7\n')
+    assert cgroup.stat() == {'usage_usec': 10, 'user_usec': 7}
+    assert cgroup.stat('memory.stat') == {}
+    for name in box.listdir():
+        name.remove()
+    assert cgroup.remove()
+    assert not box.check()
+    # final stats are saved before removal
+    assert cgroup.final == {'cpu.stat': {}, 'memory.stat': {}}
+
+def test_container_fake_tree(tmpdir):
+    """Check that child is added before the target runs"""
+    root = fake_root(tmpdir)
+
+    def target():
+        path = os.path.join(root, 'pyspaces-%d' % os.getpid(), 'cgroup.procs')
+        assert open(path).read() == str(os.getpid())
+
+    c = Container(target=target, cgroup={'pids.max': 4}, cgroup_root=root)
+    c.start()
+    assert c.cgroup.path == os.path.join(root, 'pyspaces-%d' % c.pid)
+    c.join()
+    assert c.exitcode == 0
+    assert tmpdir.join('pyspaces-%d' % c.pid, 'pids.max').read() == '4'
+
+@pytest.mark.skipif(not UNIFIED, reason='requires writable cgroup v2')
+def test_container_stats():
+    """Check live and final stats of real cgroup"""
+    def target():
+        end = time.time() + 0.1
+        while time.time() < end:
+            pass
+        time.sleep(0.2)
+
+    c = Container(target=target, cgroup=True, cgroup_root=UNIFIED[-1])
+    c.start()
+    assert c.cgroup.pids() == [c.pid]
+    c.join()
+    assert c.exitcode == 0
+    assert not os.path.exists(c.cgroup.path)
+    assert c.cgroup.stat()['usage_usec'] >= 50000
+
+
+if __name__ == '__main__':
+    pytest.main()
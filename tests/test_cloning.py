@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import sys
+import mmap
+import time
+import pytest
+from pyspaces import Container, cloning
+from pyspaces.cloning import StackPool
+
+
+def test_stack_pool():
+    """Check reusing of stacks and guard page"""
+    pool = StackPool(limit=1)
+    stack = pool.acquire(1000)
+    assert stack.size == mmap.PAGESIZE
+    guard = '%x-%x ---p' % (stack.address, stack.address + mmap.PAGESIZE)
+    with open('/proc/self/maps') as f:
+        assert guard in f.read()
+    pool.release(stack)
+    assert pool.acquire(mmap.PAGESIZE) is stack
+    other = pool.acquire(mmap.PAGESIZE)
+    pool.release(stack)
+    pool.release(other)
+    assert other.address is None
+    pool.clear()
+    assert stack.address is None
+
+def test_stack_size_container():
+    """Check container with custom stack size"""
+    c = Container(target=sys.exit, args=(3,), stack_size=256 * 1024)
+    c.start()
+    c.join()
+    assert c.exitcode == 3
+
+@pytest.mark.skipif(not cloning.has_clone3(), reason='clone3 is not supported')
+def test_clone_pidfd():
+    """Check pidfd of child created with CLONE_PIDFD"""
+    c = Container(target=time.sleep, args=(10,), newuts=True)
+    c.start()
+    assert c.sentinel == c._popen.pidfd
+    c.kill()
+    c.join()
+    assert c.exitcode == -9
+    c.close()
+    assert c._popen is None
+
+def test_clone_fallback(monkeypatch):
+    """Check clone without pidfd when clone3 is not supported"""
+    monkeypatch.setattr(cloning, '_clone3', False)
+    c = Container(target=sys.exit, args=(3,), newuts=True)
+    c.start()
+    assert c._popen.pidfd is None
+    c.join()
+    assert c.exitcode == 3
+
+def test_clone_detached():
+    """Check that CLONE_DETACHED child is created without pidfd"""
+    c = Container(target=sys.exit, args=(3,), detached=True)
+    c.start()
+    assert c._popen.pidfd is None
+    c.join()
+    assert c.exitcode == 3
+
+class FailingPrestart(Container):
+    def prestart(self, pid):
+        self.child_pid = pid
+        raise RuntimeError('prestart failed')
+
+def test_prestart_failure():
+    """Check that child is reaped and released if prestart fails"""
+    fds = len(os.listdir('/proc/self/fd'))
+    for i in range(3):
+        c = FailingPrestart(target=sys.exit, args=(0,), newuts=True)
+        with pytest.raises(RuntimeError):
+            c.start()
+        assert not os.path.exists('/proc/%d' % c.child_pid)
+    assert len(os.listdir('/proc/self/fd')) == fds
+
+
+if __name__ == '__main__':
+    pytest.main()
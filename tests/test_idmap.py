@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import time
+import pytest
+from pyspaces import Container, IdAllocator
+from pyspaces.cloning import arg2map
+from pyspaces.idmap import read_subid
+
+
+def test_arg2map():
+    """Check rendering of UID and GID maps"""
+    assert arg2map(1000) == '0 1000 1'
+    assert arg2map('0 1000 1') == '0 1000 1'
+    assert arg2map('1000,1001') == '0 1000 1\n1 1001 1'
+    assert arg2map([1000, 1001]) == '0 1000 1\n1 1001 1'
+    assert arg2map(['0 1000 1', '1 1001 1']) == '0 1000 1\n1 1001 1'
+
+def test_read_subid(tmpdir):
+    """Check reading of subordinate ids file"""
+    path = tmpdir.join('subuid')
+    path.write('# comment\nroot:100000:65536\n0:300000:65536\nuser:200000:65536\n')
+    assert read_subid('root', str(path)) == [(100000, 65536), (300000, 65536)]
+    allocator = IdAllocator.from_subid('user', str(path), block=1000)
+    assert (allocator.start, allocator.size) == (200000, 65)
+    with pytest.raises(ValueError):
+        IdAllocator.from_subid('nobody', str(path))
+
+def test_allocator():
+    """Check that leases do not overlap and are reused"""
+    allocator = IdAllocator(100000, 3000, block=1000)
+    leases = [allocator.lease() for i in range(3)]
+    assert [l.start for l in leases] == [100000, 101000, 102000]
+    assert leases[1].map == '0 101000 1000'
+    with pytest.raises(RuntimeError):
+        allocator.lease()
+    leases[1].release()
+    leases[1].release()
+    assert len(allocator) == 2
+    assert allocator.lease().start == 101000
+
+def test_lease_container():
+    """Check that lease is released when container is joined"""
+    allocator = IdAllocator(100000, 65536 * 2)
+    lease = allocator.lease()
+    c = Container(target=time.sleep, args=(0,), newuser=True,
+                  uid_map=lease, gid_map=lease)
+    c.start()
+    with open('/proc/%s/uid_map' % c.pid) as f:
+        assert f.read().split() == ['0', '100000', '65536']
+    c.join()
+    assert lease.released
+    assert len(allocator) == 0
+
+
+if __name__ == '__main__':
+    pytest.main()
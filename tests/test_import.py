@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import sys
+import subprocess
+import pytest
+import pyspaces
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def imported(statement):
+    """Return modules imported by statement in fresh interpreter"""
+    code = '%s\nimport sys\nprint(" ".join(sys.modules))' % statement
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    output = subprocess.check_output([sys.executable, '-c', code], env=env)
+    return set(output.decode().split())
+
+def test_lazy_package():
+    """Check that import of package does not import heavy modules"""
+    modules = imported('import pyspaces')
+    assert 'pyspaces.process' not in modules
+    assert 'multiprocessing' not in modules
+    assert 'ctypes' not in modules
+
+def test_light_setns_and_cli():
+    """Check that setns and cli do not import multiprocessing"""
+    for statement in ('from pyspaces import setns', 'import pyspaces.cli'):
+        modules = imported(statement)
+        assert 'multiprocessing' not in modules
+        assert 'pyspaces.cloning' not in modules
+        assert 'inspect' not in modules
+
+def test_lazy_names():
+    """Check that lazy names are resolved to the same objects"""
+    from pyspaces.process import Container
+    from pyspaces.setns import setns
+    import pyspaces.setns
+    assert pyspaces.Container is Container
+    assert pyspaces.setns is setns
+    assert 'Container' in dir(pyspaces)
+    with pytest.raises(AttributeError):
+        pyspaces.missing
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import time
+import pytest
+from pyspaces import Container, InjectWorker
+
+
+def test_inject_worker():
+    """Check many calls in one injected worker"""
+    c = Container(target=time.sleep, args=(1,),
+                  uid_map=True, newuser=True
+                  )
+    c.start()
+    ns = os.readlink('/proc/%s/ns/user' % c.pid)
+    with InjectWorker(c.pid, all=True) as w:
+        pid = w.call(os.getpid)
+        assert w.call(os.readlink, '/proc/self/ns/user') == ns
+        assert w.batch([(os.getpid,), (divmod, (7, 2))]) == [pid, (3, 1)]
+        with pytest.raises(ZeroDivisionError):
+            w.call(divmod, 1, 0)
+        result = w.batch([(divmod, (1, 0))], return_exceptions=True)
+        assert isinstance(result[0], ZeroDivisionError)
+    assert w.exitcode == 0
+    c.join()
+
+def test_inject_worker_target_exit():
+    """Check that worker exits with target process"""
+    c = Container(target=time.sleep, args=(0.1,),
+                  uid_map=True, newuser=True
+                  )
+    c.start()
+    w = InjectWorker(c.pid, all=True)
+    w.start()
+    c.join()
+    w.join(5)
+    assert w.exitcode == 0
+    with pytest.raises(RuntimeError):
+        w.call(os.getpid)
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import sys
+import time
+import pytest
+from pyspaces import launch_many, ilaunch_many
+
+
+def test_launch_many():
+    """Check that containers are returned in order of specs"""
+    specs = [{'target': sys.exit, 'args': (i,), 'newuts': True}
+             for i in range(20)]
+    containers = launch_many(specs, parallelism=4)
+    for c in containers:
+        c.join()
+    assert [c.exitcode for c in containers] == list(range(20))
+
+def test_ilaunch_many():
+    """Check that all containers are yielded"""
+    specs = [{'target': sys.exit, 'args': (i,)} for i in range(10)]
+    containers = list(ilaunch_many(specs, parallelism=3))
+    for c in containers:
+        c.join()
+    assert sorted(c.exitcode for c in containers) == list(range(10))
+
+def test_launch_many_error():
+    """Check that started containers are killed on error"""
+    specs = [{'target': time.sleep, 'args': (10,)} for i in range(5)]
+    specs.append({'target': time.sleep, 'args': (10,),
+                  'newuser': True, 'uid_map': 'invalid map'})
+    with pytest.raises(IOError):
+        launch_many(specs, parallelism=2)
+
+
+if __name__ == '__main__':
+    pytest.main()
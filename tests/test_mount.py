@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import sys
+import errno
+import pytest
+from pyspaces import Container
+from pyspaces.mount import (parse_options, proc, tmpfs, bind,
+                            propagation, umount, Mount,
+                            MS_RDONLY, MS_NOSUID, MS_BIND, MS_REC,
+                            MS_PRIVATE)
+
+
+def contained(target, mounts, **kwargs):
+    """Return exit code of container with mount plan"""
+    c = Container(target=target, newuser=True, newns=True, newpid=True,
+                  map_zero=True, mounts=mounts, **kwargs)
+    c.start()
+    c.join()
+    return c.exitcode
+
+def test_options():
+    """Check split of options into flags and data"""
+    assert parse_options('ro,nosuid,size=1m,mode=755') == (
+        MS_RDONLY | MS_NOSUID, 'size=1m,mode=755')
+    assert parse_options('rw,defaults') == (0, None)
+    assert bind('/a', '/b').flags == MS_BIND | MS_REC
+    assert propagation().flags == MS_PRIVATE | MS_REC
+    assert tmpfs('/tmp', size='1m', mode=0o700).data == 'size=1m,mode=700'
+
+def test_plan(tmpdir):
+    """Check proc, tmpfs, read-only bind and umount"""
+    ro = tmpdir.mkdir('ro')
+    ro.join('file').write('data')
+    tmp = str(tmpdir.mkdir('tmp'))
+
+    def target():
+        # only init of new pid namespace in new proc
+        pids = [p for p in os.listdir('/proc') if p.isdigit()]
+        assert pids == ['1']
+        st = os.statvfs(tmp)
+        assert st.f_blocks * st.f_frsize == 1024 * 1024
+        assert open(str(ro.join('file'))).read() == 'data'
+        with pytest.raises(OSError) as e:
+            open(str(ro.join('new')), 'w')
+        assert e.value.errno == errno.EROFS
+        assert not os.listdir(str(tmpdir.join('gone')))
+
+    gone = tmpdir.mkdir('gone')
+    assert contained(target, [
+        propagation('/', 'private'),
+        proc('/proc'),
+        tmpfs(tmp, size='1m'),
+        bind(str(ro), readonly=True),
+        tmpfs(str(gone)),
+        umount(str(gone)),
+    ]) == 0
+    assert not ro.join('new').check()
+
+def test_readonly_bind_locked_flags(tmpdir):
+    """Check read-only bind of mount with flags locked in user namespace"""
+    locked = str(tmpdir.mkdir('locked'))
+
+    def inner():
+        with pytest.raises(OSError) as e:
+            open(os.path.join(locked, 'new'), 'w')
+        assert e.value.errno == errno.EROFS
+
+    def outer():
+        sys.exit(contained(inner, [bind(locked, readonly=True)]))
+
+    c = Container(target=outer, newns=True, mounts=[
+        propagation('/', 'private'),
+        tmpfs(locked, options='nosuid,nodev,noexec'),
+    ])
+    c.start()
+    c.join()
+    assert c.exitcode == 0
+
+class OwnPreup(Container):
+    def preup(self):
+        self.preup_called = True
+
+def test_plan_with_own_preup(tmpdir):
+    """Check that overridden preup does not skip mount plan"""
+    tmp = str(tmpdir.mkdir('tmp'))
+
+    def target():
+        assert c.preup_called
+        st = os.statvfs(tmp)
+        assert st.f_blocks * st.f_frsize == 1024 * 1024
+
+    c = OwnPreup(target=target, newuser=True, newns=True, map_zero=True,
+                 mounts=[propagation('/', 'private'), tmpfs(tmp, size='1m')])
+    c.start()
+    c.join()
+    assert c.exitcode == 0
+
+def test_errors(tmpdir):
+    """Check errors of required and optional entries"""
+    missing = str(tmpdir.join('missing'))
+
+    def target():
+        e, = c.mount_errors
+        assert e.index == 1 and e.errno == errno.ENOENT
+        assert missing in str(e)
+
+    c = Container(target=target, newuser=True, newns=True, map_zero=True,
+                  mounts=[propagation(),
+                          Mount(missing, 'tmpfs', 'tmpfs', optional=True)])
+    c.start()
+    c.join()
+    assert c.exitcode == 0
+    assert contained(lambda: None, [propagation(), tmpfs(missing)]) == 1
+    with pytest.raises(ValueError):
+        Container(exec_argv=['true'], mounts=[proc()])
+
+
+if __name__ == '__main__':
+    pytest.main()
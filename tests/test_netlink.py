@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import sys
+import socket
+import pytest
+from pyspaces import Container, RtNetlink
+from pyspaces.netlink import attr, parse_attrs, parse_address, NetlinkError
+
+PING = ("import socket\n"
+        "s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)\n"
+        "s.sendto(b'ping', ('127.0.0.1', 9))\n")
+
+root = pytest.mark.skipif(os.geteuid() != 0, reason='requires root')
+
+
+def ping():
+    """Send datagram to loopback, fails if lo is down"""
+    exec(PING)
+
+def test_attrs():
+    """Check packing and parsing of attributes"""
+    data = attr(3, 'eth0') + attr(4, 1500) + attr(1, b'\1\2\3\4\5')
+    assert len(data) % 4 == 0
+    attrs = parse_attrs(data)
+    assert attrs[3] == b'eth0\0'
+    assert attrs[4] == b'\xdc\x05\0\0'
+    assert attrs[1] == b'\1\2\3\4\5'
+    assert parse_address('10.0.0.1/24') == (
+        socket.AF_INET, b'\n\0\0\1', 24)
+    assert parse_address('fd00::1')[::2] == (socket.AF_INET6, 128)
+
+def test_loopback():
+    """Check loopback of new network namespace"""
+    c = Container(target=ping, newnet=True, newuser=True,
+                  map_zero=True)
+    c.start()
+    c.join()
+    assert c.exitcode != 0
+    c = Container(target=ping, newnet=True, newuser=True,
+                  map_zero=True, loopback=True)
+    c.start()
+    c.join()
+    assert c.exitcode == 0
+
+@root
+def test_exec_loopback():
+    """Check loopback brought up by parent for exec container"""
+    c = Container(exec_argv=[sys.executable, '-c', PING],
+                  newnet=True, loopback=True)
+    c.start()
+    c.join()
+    assert c.exitcode == 0
+
+@root
+def test_veth():
+    """Check veth pair with addresses in prestart"""
+    name = 'pyspaces%d' % (os.getpid() % 10000)
+
+    class Net(Container):
+        def prestart(self, pid):
+            with RtNetlink() as nl, nl.batch():
+                nl.add_veth(name, 'eth0', peer_netns=pid)
+                nl.add_address(name, '10.231.0.1/24')
+                nl.link_up(name)
+            with RtNetlink(pid) as nl, nl.batch():
+                nl.add_address('eth0', '10.231.0.2/24')
+                nl.link_up('eth0')
+                nl.add_route(gateway='10.231.0.1')
+
+    def target():
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.connect(('10.231.0.9', 9))
+        assert s.getsockname()[0] == '10.231.0.2'
+
+    c = Net(target=target, newnet=True)
+    try:
+        c.start()
+        c.join()
+        assert c.exitcode == 0
+    finally:
+        # pair is removed with namespace of the child
+        try:
+            with RtNetlink() as nl:
+                nl.delete_link(name)
+        except NetlinkError:
+            pass
+
+def test_error():
+    """Check error of kernel for missing link"""
+    with RtNetlink() as nl:
+        with pytest.raises(NetlinkError):
+            nl.index('pyspaces-missing')
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import pytest
+from pyspaces import Container, Chroot
+from pyspaces.mount import Overlay
+
+
+def write():
+    """Change overlay root"""
+    assert open('/file').read() == 'lower'
+    with open('/file', 'w') as f:
+        f.write('upper')
+    with open('/new', 'w') as f:
+        f.write('new')
+
+def test_tmpfs_upper(tmpdir):
+    """Check that changes on tmpfs upper are thrown away"""
+    lower = tmpdir.mkdir('lower')
+    lower.join('file').write('lower')
+    root = str(tmpdir.mkdir('root'))
+
+    def target():
+        write()
+        st = os.statvfs('/')
+        assert st.f_blocks * st.f_frsize == 1024 * 1024
+
+    overlay = Overlay(str(lower), size='1m')
+    for i in range(2):
+        c = Chroot(root, target, overlay=overlay, map_zero=True)
+        c.start()
+        c.join()
+        assert c.exitcode == 0
+    assert overlay.target is None
+    assert lower.join('file').read() == 'lower'
+    assert sorted(os.listdir(str(lower))) == ['file']
+    assert os.listdir(root) == []
+
+def test_upper(tmpdir):
+    """Check stack of lower dirs and persistent upper"""
+    top = tmpdir.mkdir('top')
+    top.join('file').write('lower')
+    bottom = tmpdir.mkdir('bottom')
+    bottom.join('file').write('bottom')
+    bottom.join('base').write('base')
+    upper = tmpdir.mkdir('upper')
+    work = tmpdir.mkdir('work')
+
+    def target():
+        write()
+        assert open('/base').read() == 'base'
+
+    c = Chroot(str(tmpdir.mkdir('root')), target, map_zero=True,
+               overlay=Overlay([str(top), str(bottom)],
+                               str(upper), str(work)))
+    c.start()
+    c.join()
+    assert c.exitcode == 0
+    assert upper.join('file').read() == 'upper'
+    assert upper.join('new').read() == 'new'
+    assert top.join('file').read() == 'lower'
+
+def test_arguments(tmpdir):
+    """Check invalid overlay arguments"""
+    with pytest.raises(ValueError):
+        Overlay('/', upper=str(tmpdir))
+    with pytest.raises(ValueError):
+        Container(overlay='/', newns=True)
+    with pytest.raises(ValueError):
+        Container(overlay='/', rootdir=str(tmpdir))
+
+
+if __name__ == '__main__':
+    pytest.main()
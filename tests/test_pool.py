@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import sys
+import time
+import pytest
+from pyspaces import ContainerPool, NamespacePool
+from pyspaces.pool import memory_pressure, WorkerLostError
+
+
+def test_pool_submit():
+    """Check that parked containers execute targets"""
+    with ContainerPool(2, newuts=True) as pool:
+        while len(pool) < 2:
+            time.sleep(0.01)
+        containers = [pool.submit(sys.exit, (i,)) for i in range(4)]
+        for c in containers:
+            c.join()
+        assert [c.exitcode for c in containers] == [0, 1, 2, 3]
+
+def test_pool_close():
+    """Check that idle containers are retired on close"""
+    pool = ContainerPool(2, newuts=True)
+    while len(pool) < 2:
+        time.sleep(0.01)
+    parked = [c for c, w in pool._parked]
+    pool.close()
+    pool.join()
+    assert len(pool) == 0
+    assert [c.exitcode for c in parked] == [0, 0]
+    with pytest.raises(ValueError):
+        pool.submit(os.getpid)
+
+def test_memory_pressure(tmpdir):
+    """Check that PSI stall and used memory are separate"""
+    tmpdir.join('meminfo').write(
+        'MemTotal: 1000 kB\nMemFree: 100 kB\nMemAvailable: 400 kB\n')
+    assert memory_pressure(str(tmpdir)) == (None, 60.0)
+    tmpdir.mkdir('pressure').join('memory').write(
+        'some avg10=5.00 avg60=1.00 avg300=0.00 total=1\n'
+        'full avg10=2.00 avg60=0.00 avg300=0.00 total=1\n')
+    assert memory_pressure(str(tmpdir)) == (5.0, 60.0)
+
+def square(x):
+    return x * x
+
+def fail(x):
+    raise ValueError(x)
+
+def test_namespace_pool_map():
+    """Check that map and imap_unordered return all results"""
+    with NamespacePool(2, newuts=True) as pool:
+        assert pool.map(square, range(50)) == [x * x for x in range(50)]
+        assert pool.map(square, [], 4) == []
+        result = pool.imap_unordered(square, range(20), 3)
+        assert sorted(result) == [x * x for x in range(20)]
+        assert list(pool.imap(square, range(10))) == \
+            [x * x for x in range(10)]
+        assert pool.starmap(pow, [(2, 3), (3, 2)]) == [8, 9]
+
+def test_namespace_pool_apply_error():
+    """Check that exceptions of tasks are raised by get"""
+    with NamespacePool(1, newuts=True) as pool:
+        result = pool.apply_async(fail, (7,))
+        with pytest.raises(ValueError):
+            result.get(10)
+        assert not result.successful()
+        assert pool.apply(square, (3,)) == 9
+        with pytest.raises(ValueError):
+            pool.map(fail, range(4))
+
+def test_namespace_pool_workers_share_namespaces():
+    """Check that tasks are executed in namespaces of workers"""
+    with NamespacePool(2, newpid=True, newuts=True) as pool:
+        pids = set(pool.starmap(os.getpid, [()] * 20, 1))
+        assert pids <= set([1])
+
+def test_namespace_pool_big_chunks():
+    """Check that big chunks and results do not block the pipes"""
+    data = [b'x' * 4096] * 256
+    with NamespacePool(2, newuts=True, prefetch=8) as pool:
+        assert pool.map(bytes, data * 4, 128) == data * 4
+        with pytest.raises(Exception):
+            pool.map(lambda x: x, range(4))
+        assert pool.apply(square, (4,)) == 16
+
+def test_namespace_pool_maxtasksperchild():
+    """Check that workers are replaced after maxtasksperchild"""
+    with NamespacePool(1, newuts=True, maxtasksperchild=2) as pool:
+        pids = pool.starmap(os.getpid, [()] * 6, 1)
+        assert len(set(pids)) == 3
+
+def test_namespace_pool_grow():
+    """Check that pool grows from min_processes under load"""
+    with NamespacePool(3, newuts=True, min_processes=1,
+                       idle_timeout=0.2) as pool:
+        assert len(pool) == 1
+        pool.map(time.sleep, [0.1] * 12, 1)
+        assert len(pool) == 3
+        deadline = time.time() + 5
+        while len(pool) > 1 and time.time() < deadline:
+            time.sleep(0.05)
+        assert len(pool) == 1
+        pool.close()
+        pool.join()
+        assert len(pool) == 0
+
+def test_namespace_pool_callbacks():
+    """Check that callbacks can submit tasks and may raise"""
+    results = []
+    def callback(value):
+        if value < 3:
+            results.append(pool.apply_async(square, (value + 1,), {},
+                                            callback))
+        raise RuntimeError('callback failed')
+    with NamespacePool(1, newuts=True) as pool:
+        pool.apply_async(square, (1,), {}, callback).wait(10)
+        assert pool.map(square, range(4)) == [0, 1, 4, 9]
+        results[0].wait(10)
+        assert results[0].get() == 4
+
+def test_namespace_pool_terminate_queued():
+    """Check that terminate fails tasks waiting in queue"""
+    pool = NamespacePool(1, newuts=True, prefetch=1)
+    results = [pool.apply_async(time.sleep, (10,)) for i in range(3)]
+    pool.terminate()
+    for result in results:
+        with pytest.raises(WorkerLostError):
+            result.get(5)
+
+def test_namespace_pool_exit_without_close(tmpdir):
+    """Check that interpreter exits with pool that is not closed"""
+    import subprocess
+    script = tmpdir.join('script.py')
+    script.write('from pyspaces import NamespacePool\n'
+                 'pool = NamespacePool(2, newpid=True, newuts=True)\n'
+                 'assert pool.map(abs, [-1, -2]) == [1, 2]\n')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    p = subprocess.Popen([sys.executable, str(script)], env=env)
+    start = time.time()
+    while p.poll() is None and time.time() - start < 15:
+        time.sleep(0.05)
+    if p.poll() is None:
+        p.kill()
+        p.wait()
+    assert p.returncode == 0
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import sys
+import time
+import pytest
+from pyspaces import Container
+from pyspaces.mount import proc, propagation
+
+
+def orphans(count):
+    """Leave orphaned children and count zombies among processes"""
+    for i in range(count):
+        if os.fork() == 0:
+            if os.fork() == 0:
+                os._exit(0)
+            os._exit(0)
+        os.wait()
+    time.sleep(0.2)
+    zombies = 0
+    for pid in os.listdir('/proc'):
+        if pid.isdigit():
+            try:
+                with open('/proc/%s/stat' % pid) as f:
+                    state = f.read().rsplit(')', 1)[1].split()[0]
+            except IOError:
+                continue
+            zombies += state == 'Z'
+    sys.exit(zombies)
+
+def parent_of_orphan(path):
+    """Write parent of orphaned grandchild into file"""
+    if os.fork() == 0:
+        if os.fork() == 0:
+            time.sleep(0.1)
+            with open(path, 'w') as f:
+                f.write(str(os.getppid()))
+            os._exit(0)
+        os._exit(0)
+    os.wait()
+    time.sleep(0.3)
+
+
+def test_reap_orphans():
+    """Check that init reaps orphaned descendants"""
+    c = Container(target=orphans, args=(10,), newpid=True, newns=True,
+                  mounts=[propagation('/', 'private'), proc('/proc')],
+                  init=True)
+    c.start()
+    c.join()
+    assert c.exitcode == 0
+
+def test_exit_code():
+    """Check that exit code of target is exit code of container"""
+    c = Container(target=sys.exit, args=(3,), newpid=True, init=True)
+    c.start()
+    c.join()
+    assert c.exitcode == 3
+
+def test_forward_signal():
+    """Check that termination signals are forwarded to target"""
+    c = Container(target=time.sleep, args=(10,), newpid=True, init=True)
+    c.start()
+    time.sleep(0.2)
+    start = time.time()
+    c.terminate()
+    c.join(5)
+    assert time.time() - start < 5
+    assert c.exitcode == 128 + 15
+
+def test_subreaper(tmpdir):
+    """Check that container without newpid adopts orphans"""
+    path = str(tmpdir.join('ppid'))
+    c = Container(target=parent_of_orphan, args=(path,), newuts=True,
+                  init=True)
+    c.start()
+    c.join()
+    assert c.exitcode == 0
+    assert int(open(path).read()) == c.pid
+
+def test_init_with_exec():
+    """Check that init is not supported by exec containers"""
+    with pytest.raises(ValueError):
+        Container(exec_argv=['true'], newpid=True, init=True)
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import socket
+import pytest
+from pyspaces import Container, NamespaceRegistry
+from pyspaces.mount import umount
+
+
+def uts_inode(path):
+    """Write inode of uts namespace into file"""
+    with open(path, 'w') as f:
+        f.write(str(os.stat('/proc/self/ns/uts').st_ino))
+
+def set_hostname(name):
+    socket.sethostname(name)
+
+def write_hostname(path):
+    with open(path, 'w') as f:
+        f.write(socket.gethostname())
+
+
+@pytest.fixture
+def registry(tmpdir):
+    registry = NamespaceRegistry(str(tmpdir.join('ns')))
+    yield registry
+    for name in registry.names():
+        registry.remove(name)
+    umount(registry.root).apply()
+
+
+def test_save_outlives_process(registry, tmpdir):
+    """Check that saved namespaces stay after exit and are joined"""
+    c = Container(target=set_hostname, args=('saved',), newuts=True,
+                  newipc=True, save='box', state_dir=registry.root)
+    c.start()
+    c.join()
+    assert c.exitcode == 0
+    assert registry.names() == ['box']
+    assert sorted(registry.namespaces('box')) == ['ipc', 'uts']
+    path = str(tmpdir.join('hostname'))
+    c = Container(target=write_hostname, args=(path,), join='box',
+                  state_dir=registry.root)
+    assert not c.clone_flags
+    c.start()
+    c.join()
+    assert c.exitcode == 0
+    assert open(path).read() == 'saved'
+
+def test_join_replaces_new_namespace(registry, tmpdir):
+    """Check that joined namespace is not created with all"""
+    r, w = os.pipe()
+    parked = Container(target=os.read, args=(r, 1), newuts=True)
+    parked.start()
+    registry.save('parked', parked.pid, 'uts')
+    os.write(w, b'x')
+    parked.join()
+    os.close(r)
+    os.close(w)
+    inode = os.stat(registry.path('parked', 'uts')).st_ino
+    path = str(tmpdir.join('inode'))
+    c = Container(target=uts_inode, args=(path,), all=True, newuser=False,
+                  join={'uts': 'parked'}, state_dir=registry.root)
+    c.start()
+    c.join()
+    assert c.exitcode == 0
+    assert int(open(path).read()) == inode
+
+def test_registry_setns(registry):
+    """Check that current process enters saved namespace and returns"""
+    c = Container(target=set_hostname, args=('inside',), newuts=True,
+                  save='host', state_dir=registry.root)
+    c.start()
+    c.join()
+    own = socket.gethostname()
+    with registry.setns('host'):
+        assert socket.gethostname() == 'inside'
+    assert socket.gethostname() == own
+
+def test_remove(registry):
+    """Check that removed namespaces can not be joined"""
+    c = Container(target=os.getpid, newnet=True, save='net',
+                  state_dir=registry.root)
+    c.start()
+    c.join()
+    with pytest.raises(OSError):
+        registry.save('net', os.getpid(), 'net')
+    registry.remove('net')
+    assert registry.names() == []
+    assert not os.path.exists(registry.path('net', 'net'))
+    with pytest.raises(KeyError):
+        registry.remove('net')
+    with pytest.raises(ValueError):
+        Container(target=os.getpid, join='net', state_dir=registry.root)
+    with pytest.raises(ValueError):
+        registry.path('../net', 'net')
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import pytest
+from pyspaces import Container, Chroot
+from pyspaces.result import ContainerError
+
+
+class Failure(Exception):
+    pass
+
+
+def large(n):
+    """Return large out-of-band buffer"""
+    return {'data': bytearray(b'x' * n), 'pid': os.getpid()}
+
+def fail():
+    raise Failure('boom')
+
+def test_value():
+    """Check return value with out-of-band buffer"""
+    c = Container(target=large, args=(10 ** 6,), result=True)
+    c.start()
+    value = c.result()
+    assert c.exitcode == 0
+    assert value['pid'] == c.pid
+    assert len(value['data']) == 10 ** 6 and value['data'][-1:] == b'x'
+    assert c.result() is value
+
+def test_namespaces(tmpdir):
+    """Check result across user namespace and after chroot"""
+    c = Chroot(str(tmpdir), os.getcwd, map_zero=True, newpid=True,
+               result=True)
+    c.start()
+    assert c.result() == '/'
+
+def test_exception():
+    """Check exception of target and of missing result"""
+    c = Container(target=fail, result=True)
+    c.start()
+    with pytest.raises(Failure) as e:
+        c.result()
+    assert c.exitcode == 1
+    assert 'boom' in e.value.traceback
+    c = Container(target=lambda: (lambda: None), result=True)
+    c.start()
+    with pytest.raises(ContainerError):
+        c.result()
+    c = Container(target=os._exit, args=(3,), result=True)
+    c.start()
+    with pytest.raises(ContainerError):
+        c.result()
+    assert c.exitcode == 3
+    with pytest.raises(ValueError):
+        Container(target=fail).result()
+
+def leave(code):
+    raise SystemExit(code)
+
+def test_system_exit():
+    """Check that SystemExit of target does not end parent"""
+    c = Container(target=leave, args=(3,), result=True)
+    c.start()
+    with pytest.raises(ContainerError) as e:
+        c.result()
+    assert c.exitcode == 3
+    assert 'SystemExit' in str(e.value)
+    with pytest.raises(ValueError):
+        Container(target=leave, args=(0,), result=True, daemonize=True)
+
+
+if __name__ == '__main__':
+    pytest.main()
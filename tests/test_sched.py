@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import sys
+import pytest
+from pyspaces import Container
+from pyspaces import sched
+from pyspaces.sched import (Placement, parse_cpulist, isolate, spread,
+                            online_cpus, SCHED_BATCH, IOPRIO_CLASS_BE)
+
+
+def fake_sysfs(tmpdir):
+    """Return sysfs of 2 nodes with 2 cores of 2 threads"""
+    for cpu in range(8):
+        core = cpu % 4
+        topology = tmpdir.join('cpu', 'cpu%d' % cpu, 'topology')
+        topology.ensure(dir=True)
+        topology.join('thread_siblings_list').write(
+            '%d,%d\n' % (core, core + 4))
+    tmpdir.join('node').ensure(dir=True)
+    tmpdir.join('node', 'online').write('0-1\n')
+    for node, cpus in ((0, '0-1,4-5'), (1, '2-3,6-7')):
+        tmpdir.join('node', 'node%d' % node).ensure(dir=True)
+        tmpdir.join('node', 'node%d' % node, 'cpulist').write(cpus + '\n')
+    return str(tmpdir)
+
+def test_cpulist():
+    """Check parsing of cpulist"""
+    assert parse_cpulist('0-3,8,10-11\n') == [0, 1, 2, 3, 8, 10, 11]
+    assert parse_cpulist([3, 1, 1]) == [1, 3]
+    assert parse_cpulist(2) == [2]
+
+def test_isolate(tmpdir):
+    """Check that latency and batch sets do not share cores"""
+    sysfs = fake_sysfs(tmpdir)
+    latency, batch = isolate(1, range(8), sysfs)
+    assert latency == [3, 7]
+    assert batch == [0, 1, 2, 4, 5, 6]
+    with pytest.raises(ValueError):
+        isolate(4, range(8), sysfs)
+
+def test_spread(tmpdir):
+    """Check round-robin and load based placement"""
+    sysfs = fake_sysfs(tmpdir)
+    assert spread(3, [0, 1]) == [[0], [1], [0]]
+    assert spread(3, range(8), 'node', sysfs=sysfs) == [
+        [0, 1, 4, 5], [2, 3, 6, 7], [0, 1, 4, 5]]
+    load = {0: 1.0, 1: 0.5, 2: 0.0}
+    assert spread(3, [0, 1, 2], load=load) == [[2], [1], [0]]
+    load = dict((c, 1.0) for c in (0, 1, 4, 5))
+    assert spread(2, range(8), 'node', load, sysfs) == [
+        [2, 3, 6, 7], [2, 3, 6, 7]]
+
+def test_unknown_machine(monkeypatch, tmpdir):
+    """Check that syscalls without known numbers are refused"""
+    monkeypatch.setattr(sched, 'SYS_ioprio_set', None)
+    monkeypatch.setattr(sched, 'SYS_set_mempolicy', None)
+    with pytest.raises(ValueError):
+        Placement(ioprio='idle')
+    with pytest.raises(ValueError):
+        Placement(numa=0, sysfs=fake_sysfs(tmpdir))
+    assert Placement(cpus=0, nice=5).cpus == [0]
+
+def test_online_cpus(monkeypatch):
+    """Check CPUs of current process with and without os module"""
+    cpus = online_cpus()
+    assert cpus and cpus == sorted(os.sched_getaffinity(0))
+    monkeypatch.delattr(sched.os, 'sched_getaffinity')
+    assert online_cpus() == cpus
+
+def test_default_cpus():
+    """Check isolate and spread of online CPUs"""
+    cpus = online_cpus()
+    latency, batch = isolate(0)
+    assert latency == [] and batch == cpus
+    with pytest.raises(ValueError):
+        isolate(len(cpus))
+    assert spread(3) == [[cpus[i % len(cpus)]] for i in range(3)]
+
+def test_placement(tmpdir):
+    """Check values of placement"""
+    p = Placement(cpus='0-7', numa=1, sched='batch', ioprio=('be', 7),
+                  sysfs=fake_sysfs(tmpdir))
+    assert p.cpus == [2, 3, 6, 7]
+    assert p.sched == SCHED_BATCH
+    assert p.ioprio == IOPRIO_CLASS_BE << 13 | 7
+    with pytest.raises(ValueError):
+        Placement(sched='fast')
+    with pytest.raises(ValueError):
+        Placement(ioprio='fast')
+    assert Placement(sched='rr', priority=99).priority == 99
+    for kwargs in ({'sched': 'fifo'}, {'sched': 'rr', 'priority': 100},
+                   {'sched': 'batch', 'priority': 10}):
+        with pytest.raises(ValueError):
+            Placement(**kwargs)
+
+def test_container_placement():
+    """Check placement applied in child and by parent in exec mode"""
+    cpu = min(os.sched_getaffinity(0))
+
+    def target():
+        assert os.sched_getaffinity(0) == set([cpu])
+        assert os.sched_getscheduler(0) == os.SCHED_BATCH
+        assert os.getpriority(os.PRIO_PROCESS, 0) == 5
+        with open('/proc/self/numa_maps') as f:
+            assert 'bind:0' in f.read()
+
+    c = Container(target=target, cpus=[cpu], numa=0, sched='batch',
+                  nice=5, ioprio='idle', timings=True)
+    c.start()
+    c.join()
+    assert c.exitcode == 0
+    assert 'placement' in c.timings
+
+    code = ('import os, sys\n'
+            'sys.exit(os.sched_getscheduler(0) != os.SCHED_IDLE or '
+            'os.sched_getaffinity(0) != set([%d]))' % cpu)
+    c = Container(exec_argv=[sys.executable, '-c', code],
+                  cpus=[cpu], sched='idle')
+    c.start()
+    c.join()
+    assert c.exitcode == 0
+
+@pytest.mark.skipif(os.geteuid() != 0, reason='requires CAP_SYS_NICE')
+def test_container_realtime():
+    """Check real-time policy with priority"""
+    def target():
+        assert os.sched_getscheduler(0) == os.SCHED_FIFO
+        assert os.sched_getparam(0).sched_priority == 10
+
+    c = Container(target=target, sched='fifo', priority=10)
+    c.start()
+    c.join()
+    assert c.exitcode == 0
+    with pytest.raises(ValueError):
+        Container(target=target, sched='rr')
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import sys
+import time
+import pytest
+from pyspaces import Container, Inject, setns
+from pyspaces.setns import NamespaceCache, resolve
+
+
+def test_cache_reuse():
+    """Check that namespace files are opened once"""
+    cache = NamespaceCache()
+    fd = cache.get(os.getpid(), 'uts')
+    assert cache.get(os.getpid(), 'uts') == fd
+    assert cache.get('self', 'net') != fd
+    assert len(cache) == 2
+    cache.clear()
+    assert len(cache) == 0
+
+def test_cache_stale(tmpdir):
+    """Check that entry goes stale when inode of file changes"""
+    cache = NamespaceCache()
+    path = str(tmpdir.join('ns'))
+    open(path, 'w').close()
+    ino = os.fstat(cache.open(path)).st_ino
+    os.unlink(path)
+    open(path + '.new', 'w').close()
+    os.rename(path + '.new', path)
+    fd = cache.open(path)
+    assert os.fstat(fd).st_ino == os.stat(path).st_ino != ino
+    assert len(cache) == 1
+    cache.clear()
+
+def test_cache_dead_process():
+    """Check that namespace of exited process can not be opened"""
+    cache = NamespaceCache()
+    c = Container(target=time.sleep, args=(0.1,), newuts=True)
+    c.start()
+    fd = cache.get(c.pid, 'uts')
+    assert os.fstat(fd).st_ino != os.stat('/proc/self/ns/uts').st_ino
+    c.join()
+    with pytest.raises(OSError):
+        cache.get(c.pid, 'uts')
+    assert len(cache) == 0
+
+def test_cache_prune():
+    """Check that entries of exited targets are closed"""
+    cache = NamespaceCache(limit=4)
+    c = Container(target=time.sleep, args=(60,), newuts=True)
+    c.start()
+    cache.get(c.pid, 'uts')
+    cache.get(c.pid, 'net')
+    cache.pidfd(c.pid)
+    cache.get('self', 'uts')
+    c.terminate()
+    c.join()
+    assert len(cache) == 4
+    cache.get('self', 'net')
+    assert len(cache) == 2
+    cache.prune()
+    assert len(cache) == 2
+    cache.clear()
+
+
+def test_setns_enters_all_requested():
+    """Check that every requested namespace is entered and restored"""
+    r, w = os.pipe()
+    c = Container(target=os.read, args=(r, 1), newuts=True, newnet=True)
+    c.start()
+    own = [os.stat('/proc/self/ns/%s' % ns).st_ino for ns in ('uts', 'net')]
+    cache = NamespaceCache()
+    try:
+        with setns(c.pid, 0, '/proc', 'uts', 'net', cache=cache):
+            inside = [os.stat('/proc/self/ns/%s' % ns).st_ino
+                      for ns in ('uts', 'net')]
+        assert inside == [os.stat('/proc/%d/ns/%s' % (c.pid, ns)).st_ino
+                          for ns in ('uts', 'net')]
+        assert [os.stat('/proc/self/ns/%s' % ns).st_ino
+                for ns in ('uts', 'net')] == own
+    finally:
+        os.write(w, b'x')
+        c.join()
+        cache.clear()
+
+def test_setns_closes_files():
+    """Check that setns without cache closes its files on exit"""
+    c = Container(target=time.sleep, args=(1,), newuts=True)
+    c.start()
+    fds = len(os.listdir('/proc/self/fd'))
+    try:
+        with setns(c.pid, 0, '/proc', 'uts'):
+            pass
+        with setns(c.pid, os.getppid(), '/proc', 'uts'):
+            pass
+        assert len(os.listdir('/proc/self/fd')) == fds
+    finally:
+        c.terminate()
+        c.join()
+
+def test_resolve_skips_current():
+    """Check that namespaces of current process are not entered"""
+    c = Container(target=time.sleep, args=(0.1,), newuts=True)
+    c.start()
+    assert [ns for ns, path in resolve(c.pid)] == ['uts']
+    assert resolve(c.pid, '/proc', 'ipc', 'net') == []
+    c.join()
+
+def test_inject_pidfd():
+    """Check that Inject enters namespaces and closes its pidfd"""
+    c = Container(target=time.sleep, args=(1,), newuts=True, newipc=True)
+    c.start()
+    fds = len(os.listdir('/proc/self/fd'))
+    i = Inject(c.pid, sys.exit, (0,), all=True)
+    i.start()
+    i.join()
+    assert i.exitcode == 0
+    i.close()
+    fd = os.open('/proc/%d/ns/uts' % c.pid, os.O_RDONLY)
+    ino = os.fstat(fd).st_ino
+    os.close(fd)
+    i = Inject(c.pid, lambda: sys.exit(
+        os.stat('/proc/self/ns/uts').st_ino != ino), uts=True)
+    i.start()
+    i.join()
+    assert i.exitcode == 0
+    i.close()
+    from pyspaces.setns import namespaces
+    assert c.pid not in namespaces._pidfds
+    assert len(os.listdir('/proc/self/fd')) == fds
+    c.terminate()
+    c.join()
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import pytest
+from pyspaces import Container, Chroot, run
+from pyspaces.spawn import which, EXIT_FAILURE
+
+
+def test_run():
+    """Check exit codes of executed programs"""
+    assert run(['true']) == 0
+    assert run(['sh', '-c', 'exit 7'], newuts=True) == 7
+
+def test_exec_environment(tmpdir):
+    """Check environment, working dir and stdout of program"""
+    out = str(tmpdir.join('out'))
+    c = Container(exec_argv=['sh', '-c', 'pwd; echo $FOO'],
+                  exec_env={'FOO': 'bar', 'PATH': os.defpath},
+                  workdir=str(tmpdir), stdout=out)
+    c.start()
+    c.join()
+    assert c.exitcode == 0
+    with open(out) as f:
+        assert f.read().split() == [str(tmpdir), 'bar']
+
+def test_exec_chroot(tmpdir):
+    """Check program found in PATH after chroot"""
+    out = str(tmpdir.join('out'))
+    c = Chroot('/', None, exec_argv=['sh', '-c', 'hostname test; hostname'],
+               map_zero=True, newuts=True, stdout=out)
+    c.start()
+    c.join()
+    assert c.exitcode == 0
+    with open(out) as f:
+        assert f.read() == 'test\n'
+
+def test_exec_bad_rootdir(tmpdir):
+    """Check that program is not executed if chroot fails"""
+    out = str(tmpdir.join('out'))
+    c = Chroot('/nonexistent-root', None, exec_argv=['sh', '-c', 'ls /'],
+               map_zero=True, stdout=out)
+    c.start()
+    c.join()
+    assert c.exitcode == EXIT_FAILURE
+    assert not os.path.getsize(out)
+
+def test_exec_bad_workdir(tmpdir):
+    """Check that program is not executed if chdir fails"""
+    out = str(tmpdir.join('out'))
+    c = Container(exec_argv=['sh', '-c', 'pwd'], workdir='/nonexistent-dir',
+                  stdout=out)
+    c.start()
+    c.join()
+    assert c.exitcode == EXIT_FAILURE
+    assert not os.path.getsize(out)
+
+def test_exec_not_found():
+    """Check that missing program raises in parent"""
+    fds = len(os.listdir('/proc/self/fd'))
+    with pytest.raises(OSError):
+        run(['pyspaces-missing-program'])
+    assert len(os.listdir('/proc/self/fd')) == fds
+    assert which('sh').endswith('/sh')
+    assert which('pyspaces-missing-program') is None
+
+
+if __name__ == '__main__':
+    pytest.main()
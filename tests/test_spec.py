@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import sys
+import pytest
+from pyspaces import Container, ContainerSpec, IdAllocator
+
+
+def test_spec_flags():
+    """Check that spec resolves the same flags and maps as Container"""
+    kwargs = dict(newuts=True, newuser=True, map_zero=True, workdir='/')
+    spec = ContainerSpec(**kwargs)
+    c = Container(target=sys.exit, **kwargs)
+    s = spec.spawn(sys.exit)
+    assert s.clone_flags == c.clone_flags
+    assert s.uid_map == '0 %d 1' % os.getuid()
+    assert s.gid_map == '0 %d 1' % os.getgid()
+    for k in ('workdir', 'rootdir', 'stdin', 'stdout', 'daemonize'):
+        assert s.kwargs[k] == c.kwargs[k]
+
+def test_spec_spawn():
+    """Check containers spawned from one spec"""
+    spec = ContainerSpec(newuts=True, newuser=True, uid_map='0 %d 1' % os.getuid())
+    containers = [spec.start(sys.exit, (i,)) for i in range(5)]
+    for c in containers:
+        c.join()
+    assert [c.exitcode for c in containers] == list(range(5))
+    assert len(set(c.name for c in containers)) == 5
+
+def test_spec_state_not_shared():
+    """Check that spawned containers get their own result channels"""
+    spec = ContainerSpec(newuts=True, result=True)
+    a, b = spec.start(int, ('1',)), spec.start(int, ('2',))
+    assert a.channel is not b.channel
+    assert (a.result(), b.result()) == (1, 2)
+
+def test_spec_exec():
+    """Check spec in exec mode"""
+    spec = ContainerSpec(exec_argv=['sh', '-c', 'exit 4'], newuts=True)
+    a, b = spec.start(), spec.start()
+    a.join()
+    b.join()
+    assert a.exitcode == b.exitcode == 4
+    assert a.exec_plan is not b.exec_plan
+
+def test_spec_immutable():
+    """Check that spec can not be changed or share leases"""
+    spec = ContainerSpec(newuts=True)
+    with pytest.raises(AttributeError):
+        spec.clone_flags = 0
+    with pytest.raises(AttributeError):
+        spec.other = 1
+    lease = IdAllocator(100000, 65536).lease()
+    with pytest.raises(ValueError):
+        ContainerSpec(newuser=True, uid_map=lease)
+
+
+if __name__ == '__main__':
+    pytest.main()
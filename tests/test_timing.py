@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import sys
+import pytest
+from pyspaces import Container
+from pyspaces.timing import Timer, Histogram, Histograms, histograms
+
+
+def test_histogram():
+    """Check percentiles and merge of histogram"""
+    h = Histogram()
+    for i in range(1, 1001):
+        h.record(i / 1e3)
+    assert h.count == 1000
+    assert h.min == 1000 and h.max == 1000000
+    assert abs(h.percentile(50) - 0.5) < 0.5 * 0.016
+    assert abs(h.percentile(99) - 0.99) < 0.99 * 0.016
+    assert h.percentile(100) == 1.0
+    assert abs(h.mean() - 0.5005) < 1e-9
+    other = Histogram()
+    other.record(2.0)
+    h.merge(other)
+    assert h.count == 1001 and h.max == 2000000
+    with pytest.raises(ValueError):
+        h.merge(Histogram(bits=5))
+    h.reset()
+    assert h.percentile(50) is None
+
+def test_timer_dumps():
+    """Check that timer phases are sent as one line"""
+    t = Timer()
+    t.lap('a')
+    t.lap('b')
+    data = t.dumps()
+    assert data.endswith('\n') and data.count('\n') == 1
+    assert list(Timer.loads(data).items()) == list(t.phases.items())
+
+def test_export():
+    """Check that exporters get snapshot of histograms"""
+    hs = Histograms()
+    exported = []
+    hs.add_exporter(exported.append)
+    hs.record({'clone': 0.001, 'handshake': 0.002})
+    hs.record({'clone': 0.003})
+    snapshot = hs.export(reset=True)
+    assert exported == [snapshot]
+    assert snapshot['clone'].count == 2
+    assert hs['clone'].count == 0
+    hs.remove_exporter(exported.append)
+    hs.export()
+    assert len(exported) == 1
+
+def test_container_timings():
+    """Check timings of parent and child phases"""
+    histograms.clear()
+    c = Container(target=sys.exit, args=(3,), newuts=True, timings=True)
+    c.start()
+    timings = c.timings
+    c.join()
+    assert c.exitcode == 3
+    assert list(timings) == [
+        'clone', 'update_map', 'prestart', 'handshake',
+        'child_clone', 'child_handshake', 'bootstrap',
+        'preup', 'daemonize', 'chroot', 'chdir', 'chtty', 'preexec',
+    ]
+    assert all(v >= 0 for v in timings.values())
+    assert c.timings is timings
+    assert histograms['clone'].count == 1
+
+def test_timings_recorded_on_join():
+    """Check that timings are recorded without reading them"""
+    histograms.clear()
+    c = Container(target=sys.exit, args=(0,), newuts=True, timings=True)
+    c.start()
+    c.join()
+    assert histograms['clone'].count == 1
+    assert histograms['preexec'].count == 1
+    c.timings
+    c.join()
+    assert histograms['clone'].count == 1
+
+def test_container_without_timings():
+    """Check that timings are not measured by default"""
+    c = Container(target=sys.exit, args=(0,))
+    c.start()
+    c.join()
+    assert c.timings is None
+    assert c._popen.timings_fd is None
+
+
+if __name__ == '__main__':
+    pytest.main()